@@ -4,34 +4,123 @@ import uvicorn
 
 from hdb.config import load_config
 from hdb.etl import load_csvs_to_duckdb
-from hdb.train import train_model
-from hdb.report import generate_bto_report
 
 app = typer.Typer(help="HDB BTO pricing pipeline")
 
 
 @app.command()
-def etl():
-	"""Load CSVs into DuckDB and build features."""
-	load_csvs_to_duckdb()
-	typer.echo("ETL completed.")
+def etl(
+	engine: str = typer.Option(None, help="Ingestion engine: duckdb, pandas or streaming. Defaults to etl.engine in config.yaml."),
+	full: bool = typer.Option(False, help="Ignore the file manifest and reload every CSV."),
+	workers: int = typer.Option(None, help="Parse files in N worker processes. Defaults to etl.workers."),
+	chunk_rows: int = typer.Option(None, help="Rows per chunk for the streaming engine. Defaults to etl.chunk_rows."),
+):
+	"""Load new or changed CSVs into DuckDB and update features."""
+	stats = load_csvs_to_duckdb(engine=engine, full=full, workers=workers, chunk_rows=chunk_rows)
+	typer.echo(f"ETL completed: {stats}")
 
 
 @app.command()
-def train():
+def train(
+	sweep: bool = typer.Option(False, help="Sweep tree count/depth/leaf size and keep the smallest model within training.sweep_mae_tolerance."),
+):
 	"""Train model and save metrics."""
-	path, metrics = train_model()
+	from hdb.train import sweep_models, train_model
+
+	path, metrics = sweep_models() if sweep else train_model()
 	typer.echo(f"Model saved: {path}")
-	typer.echo(metrics)
+	if sweep:
+		typer.echo(f"Selected {metrics['params']}; full sweep table in {load_config().paths.metrics_path}")
+	typer.echo({k: v for k, v in metrics.items() if k != "sweep"})
+	if load_config().serving.price_grid_enabled:
+		# a grid from the previous model is ignored by the API, so rebuild it now
+		precompute()
+
+
+@app.command()
+def precompute():
+	"""Score every town x flat type x storey grid point with the current model for lookup at request time."""
+	from hdb.price_grid import precompute_price_grid
+
+	cfg = load_config()
+	grid = precompute_price_grid()
+	typer.echo(f"Price grid saved: {cfg.paths.price_grid_path} ({len(grid)} prices)")
+
+
+@app.command()
+def export_lake():
+	"""Write the clean and feature tables to the Parquet lake (year=/town= partitions) if it is behind the database."""
+	from hdb.lake import sync_lake
+
+	cfg = load_config()
+	meta = sync_lake(cfg.paths.duckdb_path, cfg)
+	typer.echo(f"Parquet lake at {cfg.paths.lake_dir}: snapshot {meta['snapshot']} ({', '.join(meta['tables'])})")
+
+
+@app.command()
+def compile():
+	"""Export the trained pipeline to the array-backed forest used for fast scoring."""
+	import joblib
+	from hdb.compiled import compile_pipeline, save_compiled
+	from hdb.monitoring import file_hash
+
+	cfg = load_config()
+	pipeline = joblib.load(cfg.paths.model_path)
+	compiled = compile_pipeline(pipeline, source_sha256=file_hash(cfg.paths.model_path))
+	save_compiled(compiled, cfg.paths.compiled_model_path)
+	typer.echo(f"Compiled forest saved: {cfg.paths.compiled_model_path} ({compiled.n_trees} trees)")
+
+
+@app.command()
+def bench(rows: str = typer.Option("1,10,100,1000", help="Comma-separated batch sizes."), repeats: int = 20):
+	"""Compare sklearn pipeline vs compiled forest prediction latency."""
+	import json
+	from hdb.bench import bench_predictors
+
+	sizes = [int(r) for r in rows.split(",")]
+	typer.echo(json.dumps(bench_predictors(sizes, repeats=repeats), indent=2))
 
 
 @app.command()
-def serve(host: str = None, port: int = None):
+def bench_models(
+	model_types: str = typer.Option(
+		"RandomForestRegressor,HistGradientBoostingRegressor", help="Comma-separated training.model_type values."
+	),
+):
+	"""Compare training time, accuracy and serving cost across model types on the same split."""
+	import json
+	from hdb.train import compare_model_types
+
+	typer.echo(json.dumps(compare_model_types([m.strip() for m in model_types.split(",")]), indent=2))
+
+
+@app.command()
+def bench_etl(
+	engines: str = typer.Option("pandas,duckdb", help="Comma-separated ETL engines to compare."),
+	csv_glob: str = typer.Option(None, help="CSV files to ingest. Defaults to etl.csv_glob."),
+	workers: str = typer.Option("1", help="Comma-separated worker counts to compare."),
+):
+	"""Compare raw-table ingestion wall time and peak RSS across engines and worker counts."""
+	import glob
+	import json
+	from hdb.bench import bench_ingest
+
+	paths = sorted(glob.glob(csv_glob)) if csv_glob else None
+	typer.echo(json.dumps(bench_ingest([e.strip() for e in engines.split(",")], paths, [int(w) for w in workers.split(",")]), indent=2))
+
+
+@app.command()
+def serve(
+	host: str = None,
+	port: int = None,
+	workers: int = typer.Option(None, help="Worker processes. Defaults to api.workers."),
+):
 	"""Start FastAPI server."""
 	cfg = load_config()
 	host = host or cfg.api.host
 	port = port or cfg.api.port
-	uvicorn.run("hdb.serve:app", host=host, port=port, reload=False)
+	workers = workers or cfg.api.workers
+	uvicorn.run("hdb.serve:app", host=host, port=port, workers=workers, reload=False)
 
 
 @app.command()
@@ -43,8 +132,13 @@ def report(
 	high_floor: float = typer.Option(25, help="High floor midpoint."),
 	limit: int = typer.Option(5, help="If no towns provided, number of towns to auto-select."),
 	output: str = typer.Option("artifacts/bto_report.md", help="Output Markdown path."),
+	interval: bool = typer.Option(False, "--interval", help="Add each band's range across the forest's trees."),
+	all_towns: bool = typer.Option(False, "--all-towns", help="Every town x flat type with transactions; ignores --owns/--flat-types."),
+	formats: str = typer.Option("md", help="Comma-separated outputs next to --output: md, csv, parquet."),
 ):
 	"""Generate a Markdown report with BTO recommendations and price analysis."""
+	from hdb.report import generate_bto_report
+
 	town_list = [t.strip() for t in owns.split(",")] if owns else None
 	ft_list = [t.strip() for t in flat_types.split(",")]
 	md = generate_bto_report(
@@ -55,6 +149,9 @@ def report(
 		high_floor=high_floor,
 		limit_if_recommend=limit,
 		output_path=output,
+		interval=interval,
+		all_towns=all_towns,
+		formats=[f.strip() for f in formats.split(",") if f.strip()],
 	)
 	typer.echo(f"Report generated at {output}")
 
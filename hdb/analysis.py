@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .compiled import predict_interval
+from .price_grid import PriceGrid, grid_frame, predict_with_grid
+from .pricing import income_needed
+
+
+@dataclass
+class BandAnalysis:
+	"""BTO prices for every (town, flat_type) pair at every floor band.
+
+	Arrays are (pairs, bands): the model rows are laid out pair-major, so the
+	pivot to one row per pair is a reshape rather than a groupby.
+	"""
+
+	pairs: List[Tuple[str, str]]
+	bands: List[str]
+	floors: np.ndarray  # storey_mid per band
+	areas: np.ndarray  # floor_area_sqm per pair
+	resale: np.ndarray
+	bto: np.ndarray
+	income: np.ndarray
+	bto_range: Optional[np.ndarray] = None  # (pairs, bands, 2) low/high, interval mode only
+
+	def frame(self) -> pd.DataFrame:
+		"""Long table, one row per pair x band, for CSV/Parquet output."""
+		n_pairs, n_bands = self.bto.shape
+		out = pd.DataFrame({
+			"town": np.repeat([p[0] for p in self.pairs], n_bands),
+			"flat_type": np.repeat([p[1] for p in self.pairs], n_bands),
+			"band": np.tile(self.bands, n_pairs),
+			"storey_mid": np.tile(self.floors, n_pairs),
+			"floor_area_sqm": np.repeat(self.areas, n_bands),
+			"predicted_resale_price": self.resale.ravel(),
+			"bto_price": self.bto.ravel(),
+			"income": self.income.ravel(),
+		})
+		if self.bto_range is not None:
+			out["bto_price_low"] = self.bto_range[..., 0].ravel()
+			out["bto_price_high"] = self.bto_range[..., 1].ravel()
+		return out
+
+	def records(self) -> List[Dict[str, Any]]:
+		"""One dict per pair, in the /bto_analysis response layout."""
+		bto, income = self.bto.tolist(), self.income.tolist()
+		ranges = self.bto_range.tolist() if self.bto_range is not None else None
+		out = []
+		for i, (town, ft) in enumerate(self.pairs):
+			item = {
+				"town": town,
+				"flat_type": ft,
+				"bto_prices": dict(zip(self.bands, bto[i])),
+				"income": dict(zip(self.bands, income[i])),
+				"explanation": None,
+			}
+			if ranges is not None:
+				item["bto_price_ranges"] = dict(zip(self.bands, ranges[i]))
+			out.append(item)
+		return out
+
+
+def analyze_bands(
+	pipeline: Any,
+	pairs: Sequence[Tuple[str, str, float]],
+	floors: Dict[str, float],
+	discount_rate: float,
+	grid: Optional[PriceGrid] = None,
+	interval_quantiles: Optional[Tuple[float, float]] = None,
+) -> BandAnalysis:
+	"""Score every (town, flat_type, area) pair at every floor in ``floors`` with one predict call.
+
+	With ``interval_quantiles`` the forest mean and range come from one pass over the
+	trees (the grid only holds means, so it is not consulted).
+	"""
+	bands = list(floors)
+	shape = (len(pairs), len(bands))
+	storeys = np.asarray([floors[b] for b in bands], dtype=np.float64)
+	df = grid_frame(list(pairs), storeys)
+	bto_range = None
+	if interval_quantiles is not None:
+		est = predict_interval(pipeline, df, interval_quantiles)
+		resale = est[:, 0].reshape(shape)
+		bto_range = est[:, 1:3].reshape(shape + (2,)) * (1 - discount_rate)
+	else:
+		resale = np.asarray(predict_with_grid(pipeline, df, grid), dtype=np.float64).reshape(shape)
+	bto = resale * (1 - discount_rate)
+	return BandAnalysis(
+		pairs=[(town, ft) for town, ft, _ in pairs],
+		bands=bands,
+		floors=storeys,
+		areas=np.asarray([float(a) for _, _, a in pairs], dtype=np.float64),
+		resale=resale,
+		bto=bto,
+		income=income_needed(bto),
+		bto_range=bto_range,
+	)
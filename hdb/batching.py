@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .utils import get_logger
+
+
+logger = get_logger("batching")
+
+
+class BatchStats:
+	"""Power-of-two histogram of batch sizes plus queue-wait totals."""
+
+	def __init__(self, max_batch_size: int):
+		self._lock = threading.Lock()
+		self.buckets: List[int] = []
+		b = 1
+		while b < max_batch_size:
+			self.buckets.append(b)
+			b *= 2
+		self.buckets.append(max_batch_size)
+		self.reset()
+
+	def reset(self) -> None:
+		with self._lock:
+			self.counts = [0] * len(self.buckets)
+			self.batches = 0
+			self.rows = 0
+			self.wait_ms_total = 0.0
+
+	def observe(self, size: int, wait_ms: float) -> None:
+		idx = next(i for i, b in enumerate(self.buckets) if size <= b)
+		with self._lock:
+			self.counts[idx] += 1
+			self.batches += 1
+			self.rows += size
+			self.wait_ms_total += wait_ms
+
+	def snapshot(self) -> Dict[str, Any]:
+		with self._lock:
+			return {
+				"batches": self.batches,
+				"rows": self.rows,
+				"mean_batch_size": self.rows / self.batches if self.batches else 0.0,
+				"mean_wait_ms": self.wait_ms_total / self.batches if self.batches else 0.0,
+				"histogram": {f"le_{b}": c for b, c in zip(self.buckets, self.counts)},
+			}
+
+
+class MicroBatcher:
+	"""Coalesces concurrent single-row predictions into one vectorized call.
+
+	Callers ``await submit(row)``. A background task takes the first queued row,
+	waits up to ``max_wait_ms`` for more (or until ``max_batch_size`` rows are
+	queued), runs ``predict_fn`` once on the whole frame in a worker thread and
+	resolves each caller's future with its own prediction.
+	"""
+
+	def __init__(
+		self,
+		predict_fn: Callable[[pd.DataFrame], np.ndarray],
+		max_batch_size: int = 64,
+		max_wait_ms: float = 2.0,
+	):
+		self.predict_fn = predict_fn
+		self.max_batch_size = max(1, int(max_batch_size))
+		self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+		self.stats = BatchStats(self.max_batch_size)
+		self._queue: Optional[asyncio.Queue] = None
+		self._task: Optional[asyncio.Task] = None
+		self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+	def _ensure_started(self) -> asyncio.Queue:
+		loop = asyncio.get_running_loop()
+		if self._task is None or self._task.done() or self._loop is not loop:
+			self._loop = loop
+			self._queue = asyncio.Queue()
+			self._task = loop.create_task(self._run())
+		return self._queue
+
+	async def submit(self, row: Dict[str, Any]) -> Any:
+		queue = self._ensure_started()
+		fut = asyncio.get_running_loop().create_future()
+		await queue.put((row, fut, time.perf_counter()))
+		return await fut
+
+	async def _collect(self) -> List[Tuple[Dict[str, Any], asyncio.Future, float]]:
+		queue = self._queue
+		batch = [await queue.get()]
+		deadline = time.perf_counter() + self.max_wait_s
+		while len(batch) < self.max_batch_size:
+			remaining = deadline - time.perf_counter()
+			if remaining <= 0:
+				# still drain anything already queued without waiting
+				while len(batch) < self.max_batch_size and not queue.empty():
+					batch.append(queue.get_nowait())
+				break
+			try:
+				batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+			except asyncio.TimeoutError:
+				break
+		return batch
+
+	async def _run(self) -> None:
+		loop = asyncio.get_running_loop()
+		while True:
+			batch = await self._collect()
+			started = time.perf_counter()
+			self.stats.observe(len(batch), (started - min(b[2] for b in batch)) * 1000.0)
+			df = pd.DataFrame([b[0] for b in batch])
+			try:
+				preds = await loop.run_in_executor(None, self.predict_fn, df)
+			except Exception as e:
+				logger.exception("Batched predict failed")
+				for _, fut, _ in batch:
+					if not fut.done():
+						fut.set_exception(e)
+				continue
+			for (_, fut, _), p in zip(batch, preds):
+				if not fut.done():
+					# a predict_fn returning several values per row (e.g. mean and interval) gets a tuple
+					fut.set_result(float(p) if np.ndim(p) == 0 else tuple(float(v) for v in p))
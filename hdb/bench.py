@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from .compiled import compile_pipeline, load_compiled, save_compiled
+from .config import load_config
+from .features import load_training_dataframe
+
+
+def _time_call(fn: Callable[[], object], repeats: int) -> Dict[str, float]:
+	fn()  # warm-up
+	samples = []
+	for _ in range(repeats):
+		t0 = time.perf_counter()
+		fn()
+		samples.append((time.perf_counter() - t0) * 1000.0)
+	arr = np.asarray(samples)
+	return {"p50_ms": float(np.percentile(arr, 50)), "p99_ms": float(np.percentile(arr, 99))}
+
+
+def _sample_rows(n: int, seed: int = 0) -> pd.DataFrame:
+	cfg = load_config()
+	df = load_training_dataframe()
+	df = df.drop(columns=[cfg.training.target])
+	return df.sample(n=n, replace=n > len(df), random_state=seed).reset_index(drop=True)
+
+
+def bench_predictors(batch_sizes: List[int], repeats: int = 20) -> Dict:
+	"""Latency of sklearn ``Pipeline.predict`` vs ``CompiledForest.predict`` on real feature rows."""
+	cfg = load_config()
+	pipeline = joblib.load(cfg.paths.model_path)
+	compiled = compile_pipeline(pipeline)
+	rows = _sample_rows(max(batch_sizes))
+	out: Dict = {"n_trees": compiled.n_trees, "max_depth": compiled.max_depth, "results": []}
+	for n in batch_sizes:
+		df = rows.iloc[:n]
+		ref = pipeline.predict(df)
+		got = compiled.predict(df)
+		sk = _time_call(lambda: pipeline.predict(df), repeats)
+		cf = _time_call(lambda: compiled.predict(df), repeats)
+		out["results"].append({
+			"rows": n,
+			"sklearn": sk,
+			"compiled": cf,
+			"speedup_p50": sk["p50_ms"] / cf["p50_ms"] if cf["p50_ms"] else None,
+			"max_abs_diff": float(np.max(np.abs(ref - got))),
+		})
+	return out
+
+
+def serving_cost(pipeline, rows: pd.DataFrame, workdir: str, repeats: int = 30) -> Dict:
+	"""Artifact size, load time, single-row latency and batch throughput of a fitted pipeline.
+
+	Measured on the predictor the API would use: the compiled forest when the
+	model can be compiled, else the sklearn pipeline.
+	"""
+	pipe_path = os.path.join(workdir, "pipeline.joblib")
+	joblib.dump(pipeline, pipe_path)
+	t0 = time.perf_counter()
+	joblib.load(pipe_path)
+	out: Dict = {
+		"artifact_bytes": os.path.getsize(pipe_path),
+		"load_ms": (time.perf_counter() - t0) * 1000.0,
+		"predictor": "sklearn_pipeline",
+	}
+	predictor = pipeline
+	try:
+		compiled_path = save_compiled(compile_pipeline(pipeline), os.path.join(workdir, "compiled.joblib"))
+	except (TypeError, ValueError):  # not a compilable forest
+		compiled_path = None
+	if compiled_path is not None:
+		t0 = time.perf_counter()
+		predictor = load_compiled(compiled_path)
+		out.update({
+			"compiled_bytes": os.path.getsize(compiled_path),
+			"compiled_load_ms": (time.perf_counter() - t0) * 1000.0,
+			"predictor": "compiled_forest",
+		})
+	out["serving_bytes"] = out.get("compiled_bytes", out["artifact_bytes"])
+	one = rows.iloc[:1]
+	if predictor is not pipeline:
+		out["sklearn_single_row_p50_ms"] = _time_call(lambda: pipeline.predict(one), repeats)["p50_ms"]
+	single = _time_call(lambda: predictor.predict(one), repeats)
+	batch = _time_call(lambda: predictor.predict(rows), max(3, repeats // 10))
+	out.update({
+		"single_row_p50_ms": single["p50_ms"],
+		"single_row_p99_ms": single["p99_ms"],
+		"batch_rows": len(rows),
+		"batch_rows_per_s": len(rows) / (batch["p50_ms"] / 1000.0) if batch["p50_ms"] else None,
+	})
+	return out
+
+
+_INGEST_CHILD = """
+import glob, json, resource, sys, time
+import duckdb
+from hdb.config import load_config
+from hdb.etl import _create_raw_table, ingest_csvs
+args = json.loads(sys.argv[1])
+cfg = load_config()
+conn = duckdb.connect(args["duckdb_path"])
+_create_raw_table(conn, cfg.paths.raw_table)
+paths = args.get("csv_paths") or sorted(glob.glob(cfg.etl.csv_glob))
+t0 = time.perf_counter()
+rows = sum(ingest_csvs(conn, cfg.paths.raw_table, paths, args["engine"], args.get("workers", 1), cfg.etl.chunk_rows).values())
+wall = time.perf_counter() - t0
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print("BENCH " + json.dumps({"files": len(paths), "rows": rows, "wall_s": wall, "peak_rss_mb": rss_kb / 1024.0}))
+"""
+
+
+def _run_child(script: str, args: Dict) -> Dict:
+	proc = subprocess.run(
+		[sys.executable, "-c", script, json.dumps(args)],
+		capture_output=True,
+		text=True,
+		check=True,
+		env={**os.environ, "PYTHONPATH": os.getcwd()},
+	)
+	line = [ln for ln in proc.stdout.splitlines() if ln.startswith("BENCH ")][-1]
+	return json.loads(line[len("BENCH "):])
+
+
+def bench_ingest(engines: List[str], csv_paths: List[str] | None = None, workers: List[int] | None = None) -> List[Dict]:
+	"""Wall time and peak RSS of loading the raw table per engine and worker count, each in a fresh process and scratch database."""
+	results = []
+	for engine in engines:
+		for n_workers in workers or [1]:
+			with tempfile.TemporaryDirectory() as tmp:
+				args = {
+					"engine": engine,
+					"duckdb_path": os.path.join(tmp, "bench.duckdb"),
+					"csv_paths": csv_paths,
+					"workers": n_workers,
+				}
+				results.append({"engine": engine, "workers": n_workers, **_run_child(_INGEST_CHILD, args)})
+	return results
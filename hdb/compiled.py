@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.pipeline import Pipeline
+
+from .utils import get_logger
+
+
+logger = get_logger("compiled")
+
+
+class CompiledForest:
+	"""Array-backed copy of a fitted preprocess + RandomForest pipeline.
+
+	Holds the one-hot category->index maps, the scaler mean/scale vectors and the
+	nodes of every tree flattened into shared arrays (child indices are global).
+	``predict`` walks all trees for all rows at once with NumPy fancy indexing,
+	which avoids the fixed per-call cost of Pipeline/ColumnTransformer and the
+	joblib dispatch of ``RandomForestRegressor.predict``.
+	"""
+
+	def __init__(self, arrays: Dict[str, Any]):
+		self.arrays = arrays
+		self.categorical: List[str] = list(arrays["categorical"])
+		self.numeric: List[str] = list(arrays["numeric"])
+		self.categories: List[np.ndarray] = [arrays[f"categories_{i}"] for i in range(len(self.categorical))]
+		# np.asarray drops the np.memmap subclass (no copy) so indexing stays on the plain ndarray path
+		self.mean: np.ndarray = np.asarray(arrays["mean"])
+		self.scale: np.ndarray = np.asarray(arrays["scale"])
+		self.feature: np.ndarray = np.asarray(arrays["feature"])
+		self.threshold: np.ndarray = np.asarray(arrays["threshold"])
+		self.left: np.ndarray = np.asarray(arrays["left"])
+		self.right: np.ndarray = np.asarray(arrays["right"])
+		self.value: np.ndarray = np.asarray(arrays["value"])
+		self.roots: np.ndarray = np.asarray(arrays["roots"])
+		self.max_depth = int(arrays["max_depth"])
+		self.source_sha256: Optional[str] = arrays.get("source_sha256")
+		self._offsets = np.cumsum([0] + [len(c) for c in self.categories])
+		self.n_features = int(self._offsets[-1]) + len(self.numeric)
+		self._cat_index = [{v: i for i, v in enumerate(c.tolist())} for c in self.categories]
+
+	@property
+	def n_trees(self) -> int:
+		return len(self.roots)
+
+	def transform(self, df: pd.DataFrame) -> np.ndarray:
+		"""Dense float32 design matrix laid out exactly like the ColumnTransformer output."""
+		n = len(df)
+		X = np.zeros((n, self.n_features), dtype=np.float32)
+		rows = np.arange(n)
+		for j, col in enumerate(self.categorical):
+			lookup = self._cat_index[j]
+			codes = np.fromiter((lookup.get(v, -1) for v in df[col].tolist()), dtype=np.int64, count=n)
+			hit = codes >= 0
+			X[rows[hit], self._offsets[j] + codes[hit]] = 1.0
+		num = df[self.numeric].to_numpy(dtype=np.float64)
+		# same operation order as StandardScaler.transform, then the float32 cast the trees apply
+		X[:, self._offsets[-1]:] = ((num - self.mean) / self.scale).astype(np.float32)
+		return X
+
+	def leaf_values(self, X: np.ndarray) -> np.ndarray:
+		"""Per-tree predictions, shape (n_rows, n_trees)."""
+		n = X.shape[0]
+		node = np.broadcast_to(self.roots, (n, self.n_trees)).copy()
+		rows = np.arange(n)[:, None]
+		for _ in range(self.max_depth):
+			feat = self.feature[node]
+			internal = feat >= 0
+			if not internal.any():
+				break
+			go_left = X[rows, np.where(internal, feat, 0)] <= self.threshold[node]
+			node = np.where(internal, np.where(go_left, self.left[node], self.right[node]), node)
+		return self.value[node]
+
+	def predict(self, df: pd.DataFrame) -> np.ndarray:
+		return self.leaf_values(self.transform(df)).mean(axis=1)
+
+	def predict_interval(self, df: pd.DataFrame, quantiles: Sequence[float]) -> np.ndarray:
+		"""(n_rows, 1 + len(quantiles)): the forest mean, then each quantile of the per-tree
+		predictions, all from the same tree walk as ``predict``."""
+		return _mean_and_quantiles(self.leaf_values(self.transform(df)), quantiles)
+
+
+def _mean_and_quantiles(per_tree: np.ndarray, quantiles: Sequence[float]) -> np.ndarray:
+	out = np.empty((per_tree.shape[0], 1 + len(quantiles)))
+	out[:, 0] = per_tree.mean(axis=1)
+	if not len(quantiles):
+		return out
+	# np.quantile's default (linear) method, but one partial sort for all quantiles and no
+	# per-call dispatch overhead, which dominates for the single rows /predict scores
+	pos = np.asarray(quantiles, dtype=np.float64) * (per_tree.shape[1] - 1)
+	lo = np.floor(pos).astype(np.int64)
+	hi = np.minimum(lo + 1, per_tree.shape[1] - 1)
+	part = np.partition(per_tree, np.unique(np.concatenate([lo, hi])), axis=1)
+	frac = pos - lo
+	out[:, 1:] = part[:, lo] * (1.0 - frac) + part[:, hi] * frac
+	return out
+
+
+def supports_interval(model: Any) -> bool:
+	"""Whether ``predict_interval`` can take a per-tree distribution from ``model``."""
+	if isinstance(model, CompiledForest):
+		return True
+	return isinstance(model, Pipeline) and isinstance(model.named_steps.get("model"), RandomForestRegressor)
+
+
+def predict_interval(model: Any, df: pd.DataFrame, quantiles: Sequence[float]) -> np.ndarray:
+	"""Mean and per-tree quantiles for a compiled forest or a preprocess + RandomForest pipeline.
+
+	Raises TypeError for models without a per-tree distribution (e.g. gradient boosting).
+	"""
+	if isinstance(model, CompiledForest):
+		return model.predict_interval(df, quantiles)
+	forest = model.named_steps.get("model") if isinstance(model, Pipeline) else None
+	if not supports_interval(model):
+		raise TypeError(f"{type(forest or model).__name__} has no per-tree predictions to take an interval from")
+	X = model.named_steps["preprocess"].transform(df)
+	per_tree = np.column_stack([est.predict(X, check_input=True) for est in forest.estimators_])
+	return _mean_and_quantiles(per_tree, quantiles)
+
+
+def compile_pipeline(pipeline: Pipeline, source_sha256: Optional[str] = None) -> CompiledForest:
+	preprocess = pipeline.named_steps["preprocess"]
+	model = pipeline.named_steps["model"]
+	if not isinstance(model, RandomForestRegressor):
+		raise TypeError(f"Only RandomForestRegressor can be compiled, got {type(model).__name__}")
+	columns = {name: cols for name, _, cols in preprocess.transformers_}
+	ohe = preprocess.named_transformers_["cat"]
+	scaler = preprocess.named_transformers_["num"]
+	if getattr(ohe, "drop_idx_", None) is not None:
+		raise ValueError("OneHotEncoder with drop= is not supported")
+
+	features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+	offset = 0
+	max_depth = 0
+	for est in model.estimators_:
+		t = est.tree_
+		leaf = t.children_left < 0
+		roots.append(offset)
+		features.append(np.where(leaf, -1, t.feature).astype(np.int32))
+		thresholds.append(t.threshold.astype(np.float64))
+		lefts.append(np.where(leaf, -1, t.children_left + offset).astype(np.int32))
+		rights.append(np.where(leaf, -1, t.children_right + offset).astype(np.int32))
+		values.append(t.value.reshape(t.node_count, -1)[:, 0].astype(np.float64))
+		max_depth = max(max_depth, int(t.max_depth))
+		offset += t.node_count
+
+	arrays: Dict[str, Any] = {
+		"categorical": list(columns["cat"]),
+		"numeric": list(columns["num"]),
+		"mean": np.asarray(scaler.mean_, dtype=np.float64) if scaler.with_mean else np.zeros(len(columns["num"])),
+		"scale": np.asarray(scaler.scale_, dtype=np.float64) if scaler.with_std else np.ones(len(columns["num"])),
+		"feature": np.concatenate(features),
+		"threshold": np.concatenate(thresholds),
+		"left": np.concatenate(lefts),
+		"right": np.concatenate(rights),
+		"value": np.concatenate(values),
+		"roots": np.asarray(roots, dtype=np.int64),
+		"max_depth": max_depth,
+		"source_sha256": source_sha256,
+	}
+	for i, cats in enumerate(ohe.categories_):
+		arrays[f"categories_{i}"] = np.asarray(cats, dtype=object)
+	return CompiledForest(arrays)
+
+
+def save_compiled(forest: CompiledForest, path: str) -> str:
+	# uncompressed, so the node arrays can be memory-mapped by load_compiled
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	tmp_path = path + ".tmp"
+	joblib.dump(forest.arrays, tmp_path, compress=0)
+	os.replace(tmp_path, path)
+	return path
+
+
+def load_compiled(path: str, mmap: bool = True) -> CompiledForest:
+	"""Load an exported forest. With ``mmap`` the node arrays are mapped read-only
+	from the file, so every process serving the same artifact shares one page-cache copy.
+	"""
+	return CompiledForest(joblib.load(path, mmap_mode="r" if mmap else None))
@@ -1,6 +1,7 @@
+import functools
 import os
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import List, Optional
 
 import yaml
 from dotenv import load_dotenv
@@ -15,6 +16,24 @@ class Paths:
 	features_table: str
 	clean_table: str
 	raw_table: str
+	manifest_table: str = "etl_manifest"
+	stats_table: str = "town_flat_type_stats"
+	activity_table: str = "town_activity_monthly"
+	meta_table: str = "etl_meta"
+	reports_dir: str = "artifacts/reports"
+	lake_dir: str = "data/lake"
+
+	@property
+	def model_path(self) -> str:
+		return os.path.join(self.model_dir, "rf_pipeline.joblib")
+
+	@property
+	def compiled_model_path(self) -> str:
+		return os.path.join(self.model_dir, "rf_compiled.joblib")
+
+	@property
+	def price_grid_path(self) -> str:
+		return os.path.join(self.model_dir, "price_grid.json")
 
 
 @dataclass
@@ -26,12 +45,56 @@ class TrainingConfig:
 	n_estimators: int
 	max_depth: Optional[int]
 	discount_rate: float
+	min_samples_leaf: int = 1
+	# model_type: HistGradientBoostingRegressor
+	hgb_max_iter: int = 300
+	hgb_learning_rate: float = 0.1
+	hgb_max_leaf_nodes: int = 63
+	# `cli.py train --sweep` grid and selection rule
+	sweep_n_estimators: List[int] = field(default_factory=lambda: [50, 100])
+	sweep_max_depth: List[Optional[int]] = field(default_factory=lambda: [10, 12, 16])
+	sweep_min_samples_leaf: List[int] = field(default_factory=lambda: [1, 5])
+	sweep_mae_tolerance: float = 0.02
+	sweep_train_rows: Optional[int] = 200000
 
 
 @dataclass
 class APIConfig:
 	host: str
 	port: int
+	workers: int = 1
+
+
+@dataclass
+class ETLConfig:
+	engine: str = "duckdb"
+	csv_glob: str = "*.csv"
+	workers: int = 1
+	chunk_rows: int = 100000
+	swap_database: bool = True
+	lake_enabled: bool = True
+
+
+@dataclass
+class ServingConfig:
+	model_check_interval_s: float = 5.0
+	use_compiled_forest: bool = True
+	mmap_model: bool = True
+	batching_enabled: bool = True
+	batch_max_size: int = 64
+	batch_max_wait_ms: float = 2.0
+	predict_batch_chunk_rows: int = 5000
+	db_pool_size: int = 40
+	db_check_interval_s: float = 1.0
+	recommend_window_months: int = 36
+	response_cache_enabled: bool = True
+	response_cache_size: int = 256
+	price_grid_enabled: bool = True
+	price_grid_storey_start: float = 1.0
+	price_grid_storey_stop: float = 51.0
+	price_grid_storey_step: float = 1.0
+	interval_low_quantile: float = 0.1
+	interval_high_quantile: float = 0.9
 
 
 @dataclass
@@ -40,6 +103,15 @@ class LLMConfig:
 	model: str
 	max_tokens: int
 	temperature: float
+	base_url: Optional[str] = None
+	timeout_s: float = 20.0
+	deadline_s: float = 3.0
+	max_concurrency: int = 8
+	band_round: float = 1000.0
+	cache_enabled: bool = True
+	cache_path: Optional[str] = None
+	cache_max_entries: int = 1024
+	cache_ttl_s: float = 604800.0
 
 
 @dataclass
@@ -50,6 +122,8 @@ class ProjectConfig:
 	training: TrainingConfig
 	api: APIConfig
 	llm: LLMConfig
+	serving: ServingConfig
+	etl: ETLConfig
 
 
 def load_config(path: str = "config.yaml") -> ProjectConfig:
@@ -61,6 +135,8 @@ def load_config(path: str = "config.yaml") -> ProjectConfig:
 	training = TrainingConfig(**cfg["training"])
 	api = APIConfig(**cfg["api"])
 	llm = LLMConfig(**cfg["llm"])
+	serving = ServingConfig(**(cfg.get("serving") or {}))
+	etl = ETLConfig(**(cfg.get("etl") or {}))
 	project = ProjectConfig(
 		name=cfg["project"]["name"],
 		version=cfg["project"]["version"],
@@ -68,6 +144,8 @@ def load_config(path: str = "config.yaml") -> ProjectConfig:
 		training=training,
 		api=api,
 		llm=llm,
+		serving=serving,
+		etl=etl,
 	)
 	# ensure dirs
 	os.makedirs(os.path.dirname(paths.duckdb_path), exist_ok=True)
@@ -75,3 +153,9 @@ def load_config(path: str = "config.yaml") -> ProjectConfig:
 	os.makedirs(os.path.dirname(paths.metrics_path), exist_ok=True)
 	os.makedirs(paths.logs_dir, exist_ok=True)
 	return project
+
+
+@functools.lru_cache(maxsize=None)
+def get_config(path: str = "config.yaml") -> ProjectConfig:
+	"""Process-wide cached config for hot request paths; ``load_config`` re-reads the file."""
+	return load_config(path)
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+import duckdb
+
+from .config import load_config
+from .utils import get_logger
+
+
+logger = get_logger("db")
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+	try:
+		st = os.stat(path)
+	except FileNotFoundError:
+		return None
+	return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+_ALIAS = "hdb"
+
+
+class _Generation:
+	"""One open read-only connection plus its idle cursors."""
+
+	def __init__(self, path: str, size: int):
+		self.signature = file_signature(path)
+		# duckdb.connect(path) hands back the cached instance while an older generation still
+		# has the path open, i.e. the replaced file; attaching in a private instance does not
+		self.conn = duckdb.connect()
+		self.conn.execute(f"ATTACH '{path.replace(chr(39), chr(39) * 2)}' AS {_ALIAS} (READ_ONLY)")
+		self.idle: "queue.LifoQueue[duckdb.DuckDBPyConnection]" = queue.LifoQueue()
+		for _ in range(size):
+			cur = self.conn.cursor()
+			cur.execute(f"USE {_ALIAS}")
+			self.idle.put(cur)
+		self.borrowed = 0
+		self.retired = False
+		self.closed = False
+		self.data_version: Optional[str] = None
+		self.lock = threading.Lock()
+
+	def try_borrow(self) -> bool:
+		"""Count a borrower unless the generation is retired; the check and the count are one step."""
+		with self.lock:
+			if self.retired:
+				return False
+			self.borrowed += 1
+			return True
+
+	def retire(self) -> None:
+		with self.lock:
+			self.retired = True
+		self.close_if_drained()
+
+	def close_if_drained(self) -> None:
+		# the lock is held until closed is set, so no borrower can slip in between
+		with self.lock:
+			if self.closed or not (self.retired and self.borrowed == 0):
+				return
+			self.closed = True
+			while not self.idle.empty():
+				self.idle.get_nowait().close()
+			self.conn.close()
+
+
+class ReadPool:
+	"""Shared read-only DuckDB connection handing out cursors; reopened when ETL swaps in a new file."""
+
+	def __init__(self, path: str, size: int = 40, check_interval_s: float = 1.0, meta_table: str = "etl_meta"):
+		self.path = path
+		self.meta_table = meta_table
+		self.size = max(1, int(size))
+		self.check_interval_s = check_interval_s
+		self._gen: Optional[_Generation] = None
+		self._last_check = 0.0
+		self._lock = threading.Lock()
+
+	def _current(self) -> _Generation:
+		gen = self._gen
+		now = time.monotonic()
+		if gen is not None and now - self._last_check < self.check_interval_s:
+			return gen
+		with self._lock:
+			gen = self._gen
+			self._last_check = now
+			if gen is None or file_signature(self.path) != gen.signature:
+				old, self._gen = gen, _Generation(self.path, self.size)
+				# publish the new generation first so borrowers that lose the race retry onto it
+				if old is not None:
+					logger.info(f"Database {self.path} changed on disk; reopening read pool")
+					old.retire()
+			return self._gen
+
+	@contextmanager
+	def cursor(self) -> Iterator[duckdb.DuckDBPyConnection]:
+		# count waiters too, so a retired generation is never closed under them
+		gen = self._current()
+		while not gen.try_borrow():
+			gen = self._current()
+		cur = gen.idle.get()
+		try:
+			yield cur
+		finally:
+			with gen.lock:
+				gen.borrowed -= 1
+			gen.idle.put(cur)
+			gen.close_if_drained()
+
+	def data_version(self) -> str:
+		"""ETL's data-version stamp for the open database file, read once per file generation."""
+		gen = self._current()
+		if gen.data_version is None:
+			with self.cursor() as cur:
+				try:
+					row = cur.execute(f"SELECT value FROM {self.meta_table} WHERE key = 'data_version'").fetchone()
+				except duckdb.CatalogException:
+					row = None
+			# databases built before the stamp existed fall back to the file signature
+			gen.data_version = row[0] if row else "file:" + ":".join(str(x) for x in gen.signature or ())
+		return gen.data_version
+
+	def close(self) -> None:
+		with self._lock:
+			gen, self._gen = self._gen, None
+			if gen is not None:
+				gen.retire()
+
+
+_pools: Dict[str, ReadPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_read_pool(path: Optional[str] = None) -> ReadPool:
+	key = path or ""
+	pool = _pools.get(key)
+	if pool is None:
+		with _pools_lock:
+			pool = _pools.get(key)
+			if pool is None:
+				cfg = load_config()
+				pool = ReadPool(
+					path or cfg.paths.duckdb_path,
+					size=cfg.serving.db_pool_size,
+					check_interval_s=cfg.serving.db_check_interval_s,
+					meta_table=cfg.paths.meta_table,
+				)
+				_pools[key] = pool
+	return pool
+
+
+def data_version(path: Optional[str] = None) -> str:
+	return get_read_pool(path).data_version()
+
+
+@contextmanager
+def read_cursor(path: Optional[str] = None) -> Iterator[duckdb.DuckDBPyConnection]:
+	with get_read_pool(path).cursor() as cur:
+		yield cur
@@ -1,77 +1,96 @@
 from __future__ import annotations
 
 import glob
+import multiprocessing
 import os
-from typing import List
+import shutil
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 import duckdb
 import pandas as pd
 
 from .config import load_config
-from .utils import get_logger
+from .lake import sync_lake
+from .monitoring import file_hash
+from .utils import get_logger, utc_now_str
 
 
 logger = get_logger("etl")
 
+STANDARD_COLUMNS = [
+	"month",
+	"town",
+	"flat_type",
+	"flat_model",
+	"storey_range",
+	"block",
+	"street_name",
+	"floor_area_sqm",
+	"lease_commence_date",
+	"resale_price",
+]
 
-def detect_schema_and_standardize(df: pd.DataFrame) -> pd.DataFrame:
-	cols = {c.lower().strip().replace(" ", "_") for c in df.columns}
+
+def column_mapping_for(columns: List[str]) -> Dict[str, str]:
+	"""Map a file's header names onto the standard raw-table column names."""
+	cols = {c.lower().strip().replace(" ", "_") for c in columns}
 	# unify common columns across the provided HDB datasets
 	column_mapping = {}
 	if "month" in cols:
-		column_mapping[[c for c in df.columns if c.lower() == "month"][0]] = "month"
+		column_mapping[[c for c in columns if c.lower() == "month"][0]] = "month"
 	if "town" in cols:
-		column_mapping[[c for c in df.columns if c.lower() == "town"][0]] = "town"
+		column_mapping[[c for c in columns if c.lower() == "town"][0]] = "town"
 	if "flat_type" in cols:
-		column_mapping[[c for c in df.columns if c.lower() == "flat_type"][0]] = "flat_type"
+		column_mapping[[c for c in columns if c.lower() == "flat_type"][0]] = "flat_type"
 	if "flat_model" in cols:
-		column_mapping[[c for c in df.columns if c.lower() == "flat_model"][0]] = "flat_model"
+		column_mapping[[c for c in columns if c.lower() == "flat_model"][0]] = "flat_model"
 	# floor related
-	floor_map_keys = [c for c in df.columns if c.lower().replace(" ", "_") in ("storey_range", "floor_range")]
+	floor_map_keys = [c for c in columns if c.lower().replace(" ", "_") in ("storey_range", "floor_range")]
 	if floor_map_keys:
 		column_mapping[floor_map_keys[0]] = "storey_range"
 	# block/street
 	for src, tgt in [("block", "block"), ("street_name", "street_name"), ("street", "street_name")]:
-		match = [c for c in df.columns if c.lower().replace(" ", "_") == src]
+		match = [c for c in columns if c.lower().replace(" ", "_") == src]
 		if match:
 			column_mapping[match[0]] = tgt
 	# area
 	for src in ("floor_area_sqm", "area_sqm"):
-		match = [c for c in df.columns if c.lower().replace(" ", "_") == src]
+		match = [c for c in columns if c.lower().replace(" ", "_") == src]
 		if match:
 			column_mapping[match[0]] = "floor_area_sqm"
 			break
 	# lease/remaining lease
-	lease_match = [c for c in df.columns if c.lower().replace(" ", "_") in ("lease_commence_date", "lease_commence")]
+	lease_match = [c for c in columns if c.lower().replace(" ", "_") in ("lease_commence_date", "lease_commence")]
 	if lease_match:
 		column_mapping[lease_match[0]] = "lease_commence_date"
 	# transaction date and price
 	for src in ("resale_price", "price"):
-		match = [c for c in df.columns if c.lower().replace(" ", "_") == src]
+		match = [c for c in columns if c.lower().replace(" ", "_") == src]
 		if match:
 			column_mapping[match[0]] = "resale_price"
 			break
 
 	for src in ("month", "transaction_month", "date"):
-		match = [c for c in df.columns if c.lower().replace(" ", "_") == src]
+		match = [c for c in columns if c.lower().replace(" ", "_") == src]
 		if match:
 			column_mapping[match[0]] = "month"
 			break
 
+	return column_mapping
+
+
+def detect_schema_and_standardize(df: pd.DataFrame) -> pd.DataFrame:
+	return apply_column_mapping(df, column_mapping_for(list(df.columns)))
+
+
+def apply_column_mapping(df: pd.DataFrame, column_mapping: Dict[str, str]) -> pd.DataFrame:
+	"""Rename to the standard columns, drop the rest and add any missing ones as NA."""
 	df = df.rename(columns=column_mapping)
 	# keep only known columns
-	keep = [
-		"month",
-		"town",
-		"flat_type",
-		"flat_model",
-		"storey_range",
-		"block",
-		"street_name",
-		"floor_area_sqm",
-		"lease_commence_date",
-		"resale_price",
-	]
+	keep = STANDARD_COLUMNS
 	present = [c for c in keep if c in df.columns]
 	out = df[present].copy()
 	for c in keep:
@@ -96,93 +115,524 @@ def parse_storey_midpoint(storey_range: str) -> float:
 		return float("nan")
 
 
-def load_csvs_to_duckdb(csv_paths: List[str] | None = None) -> None:
-	cfg = load_config()
-	conn = duckdb.connect(cfg.paths.duckdb_path)
+RAW_COLUMNS = ["source_file"] + STANDARD_COLUMNS
+ENGINES = ("pandas", "duckdb", "streaming")
+
+
+def source_key(path: str) -> str:
+	"""``source_file`` value for a CSV: its resolved path, so same-named files in different directories stay apart."""
+	return os.path.realpath(path)
+
+
+# one side of a range: optional surrounding whitespace around an unsigned or +signed integer,
+# i.e. exactly what int() accepts for the ASCII inputs we see
+_STOREY_INT_RE = r"^\s*\+?\d+\s*$"
+
+
+def storey_mid_sql(column: str) -> str:
+	"""SQL expression equivalent to ``parse_storey_midpoint`` over a whole column (NULL where it gives NaN)."""
+	norm = (
+		f"replace(replace(replace(upper(regexp_replace({column}, '^\\s+|\\s+$', '', 'g')), "
+		"' TO ', '-'), ' TO', '-'), 'TO ', '-')"
+	)
+	parts = f"string_split({norm}, '-')"
+	low = f"{parts}[1]"
+	high = f"CASE WHEN len({parts}) > 1 THEN {parts}[2] ELSE {parts}[1] END"
+
+	def as_int(side: str) -> str:
+		return f"CAST(regexp_extract({side}, '\\d+') AS BIGINT)"
+
+	return (
+		f"CASE WHEN regexp_matches({low}, '{_STOREY_INT_RE}') AND regexp_matches({high}, '{_STOREY_INT_RE}') "
+		f"THEN ({as_int(low)} + {as_int(high)}) / 2.0 END"
+	)
+
+
+def _create_raw_table(conn: duckdb.DuckDBPyConnection, raw_table: str) -> None:
+	logger.info("Creating raw table if not exists")
+	conn.execute(
+		f"""
+		CREATE TABLE IF NOT EXISTS {raw_table} (
+			source_file TEXT,
+			month TEXT,
+			town TEXT,
+			flat_type TEXT,
+			flat_model TEXT,
+			storey_range TEXT,
+			block TEXT,
+			street_name TEXT,
+			floor_area_sqm DOUBLE,
+			lease_commence_date INTEGER,
+			resale_price DOUBLE
+		);
+		"""
+	)
+
+
+def _clean_types(df: pd.DataFrame) -> pd.DataFrame:
+	if "resale_price" in df.columns:
+		df["resale_price"] = (
+			df["resale_price"].astype(str).str.replace(",", "", regex=False).astype(float)
+		)
+	if "floor_area_sqm" in df.columns:
+		df["floor_area_sqm"] = pd.to_numeric(df["floor_area_sqm"], errors="coerce")
+	if "lease_commence_date" in df.columns:
+		df["lease_commence_date"] = pd.to_numeric(
+			df["lease_commence_date"], errors="coerce"
+		).astype("Int64")
+	return df
+
+
+def _insert_frame(conn: duckdb.DuckDBPyConnection, raw_table: str, df) -> None:
+	# register df and insert with explicit column ordering to avoid misalignment
+	conn.register("df", df)
 	try:
-		logger.info("Creating raw table if not exists")
 		conn.execute(
 			f"""
-			CREATE TABLE IF NOT EXISTS {cfg.paths.raw_table} (
-				source_file TEXT,
-				month TEXT,
-				town TEXT,
-				flat_type TEXT,
-				flat_model TEXT,
-				storey_range TEXT,
-				block TEXT,
-				street_name TEXT,
-				floor_area_sqm DOUBLE,
-				lease_commence_date INTEGER,
-				resale_price DOUBLE
-			);
+			INSERT INTO {raw_table} ({", ".join(RAW_COLUMNS)})
+			SELECT {", ".join(RAW_COLUMNS)}
+			FROM df
 			"""
 		)
+	finally:
+		conn.unregister("df")
+
+
+def _ingest_file_pandas(conn: duckdb.DuckDBPyConnection, raw_table: str, path: str) -> int:
+	df = pd.read_csv(path)
+	df = detect_schema_and_standardize(df)
+	df["source_file"] = source_key(path)
+	df = _clean_types(df)
+	_insert_frame(conn, raw_table, df)
+	return len(df)
+
+
+def _ingest_file_streaming(
+	conn: duckdb.DuckDBPyConnection,
+	raw_table: str,
+	path: str,
+	chunk_rows: int = 100_000,
+) -> int:
+	"""Append one CSV ``chunk_rows`` at a time, so peak memory does not grow with the file."""
+	mapping: Optional[Dict[str, str]] = None
+	source_file = source_key(path)
+	name = os.path.basename(path)
+	total = 0
+	started = time.perf_counter()
+	# all text, so a column's dtype cannot flip between chunks
+	for chunk in pd.read_csv(path, chunksize=chunk_rows, dtype=str, keep_default_na=True):
+		if mapping is None:
+			mapping = column_mapping_for(list(chunk.columns))
+		df = apply_column_mapping(chunk, mapping)
+		df["source_file"] = source_file
+		df = _clean_types(df)
+		_insert_frame(conn, raw_table, df)
+		total += len(df)
+		elapsed = time.perf_counter() - started
+		logger.info(f"{name}: {total:,} rows ({total / elapsed if elapsed else 0:,.0f} rows/s)")
+	return total
+
+
+def _sql_str(value: str) -> str:
+	return "'" + value.replace("'", "''") + "'"
+
+
+def _sql_ident(name: str) -> str:
+	return '"' + name.replace('"', '""') + '"'
+
+
+def _standardized_select(conn: duckdb.DuckDBPyConnection, path: str) -> str:
+	"""SELECT over DuckDB's read_csv that yields RAW_COLUMNS; mapping, casts and cleaning all happen in SQL."""
+	source = f"read_csv({_sql_str(path)}, header = true, all_varchar = true)"
+	header = [d[0] for d in conn.execute(f"SELECT * FROM {source} LIMIT 0").description]
+	mapping = column_mapping_for(header)
+	src_for = {}
+	for src, tgt in mapping.items():
+		src_for[tgt] = src  # later matches win, as with DataFrame.rename
+	exprs = {c: "NULL" for c in STANDARD_COLUMNS}
+	for tgt, src in src_for.items():
+		exprs[tgt] = _sql_ident(src)
+	if "resale_price" in src_for:
+		exprs["resale_price"] = f"TRY_CAST(replace({exprs['resale_price']}, ',', '') AS DOUBLE)"
+	if "floor_area_sqm" in src_for:
+		exprs["floor_area_sqm"] = f"TRY_CAST({exprs['floor_area_sqm']} AS DOUBLE)"
+	if "lease_commence_date" in src_for:
+		exprs["lease_commence_date"] = f"CAST(TRY_CAST({exprs['lease_commence_date']} AS DOUBLE) AS INTEGER)"
+	select = ", ".join(f"{exprs[c]} AS {c}" for c in STANDARD_COLUMNS)
+	return f"SELECT {_sql_str(source_key(path))} AS source_file, {select} FROM {source}"
+
 
-		if csv_paths is None:
-			csv_paths = [p for p in glob.glob("*.csv")]
-		# clear existing to avoid duplicates on reruns
-		conn.execute(f"DELETE FROM {cfg.paths.raw_table}")
-		all_rows = 0
+def _ingest_file_duckdb(conn: duckdb.DuckDBPyConnection, raw_table: str, path: str) -> int:
+	"""Load one CSV with DuckDB's own reader straight into the raw table."""
+	before = conn.execute(f"SELECT COUNT(*) FROM {raw_table}").fetchone()[0]
+	conn.execute(f"INSERT INTO {raw_table} ({', '.join(RAW_COLUMNS)}) {_standardized_select(conn, path)}")
+	return conn.execute(f"SELECT COUNT(*) FROM {raw_table}").fetchone()[0] - before
+
+
+def _read_file_arrow(path: str, engine: str):
+	"""Worker-side parse + standardize of one CSV, returned as an Arrow table in RAW_COLUMNS order."""
+	import pyarrow as pa
+
+	if engine == "duckdb":
+		conn = duckdb.connect()
+		try:
+			table = conn.execute(_standardized_select(conn, path)).arrow()
+		finally:
+			conn.close()
+		# newer DuckDB returns a RecordBatchReader from .arrow()
+		return table.read_all() if hasattr(table, "read_all") else table
+	df = detect_schema_and_standardize(pd.read_csv(path))
+	df["source_file"] = source_key(path)
+	df = _clean_types(df)
+	return pa.Table.from_pandas(df[RAW_COLUMNS], preserve_index=False)
+
+
+def _ingest_parallel(
+	conn: duckdb.DuckDBPyConnection,
+	raw_table: str,
+	csv_paths: List[str],
+	engine: str,
+	workers: int,
+) -> Dict[str, int]:
+	# spawn, not fork: the parent holds an open DuckDB connection and its threads
+	ctx = multiprocessing.get_context("spawn")
+	rows: Dict[str, int] = {}
+	with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+		futures = {path: pool.submit(_read_file_arrow, path, engine) for path in csv_paths}
+		# insert in csv_paths order, not completion order: row order (and so the
+		# training split) must not depend on which worker finishes first
 		for path in csv_paths:
-			logger.info(f"Reading {path}")
-			df = pd.read_csv(path)
-			df = detect_schema_and_standardize(df)
-			df["source_file"] = os.path.basename(path)
-			# clean types
-			if "resale_price" in df.columns:
-				df["resale_price"] = (
-					df["resale_price"].astype(str).str.replace(",", "", regex=False).astype(float)
-				)
-			if "floor_area_sqm" in df.columns:
-				df["floor_area_sqm"] = pd.to_numeric(df["floor_area_sqm"], errors="coerce")
-			if "lease_commence_date" in df.columns:
-				df["lease_commence_date"] = pd.to_numeric(
-					df["lease_commence_date"], errors="coerce"
-				).astype("Int64")
-
-			# register df and insert with explicit column ordering to avoid misalignment
-			conn.register("df", df)
-			conn.execute(
-				f"""
-				INSERT INTO {cfg.paths.raw_table}
-				(source_file, month, town, flat_type, flat_model, storey_range, block, street_name, floor_area_sqm, lease_commence_date, resale_price)
-				SELECT source_file, month, town, flat_type, flat_model, storey_range, block, street_name, floor_area_sqm, lease_commence_date, resale_price
-				FROM df
-				"""
-			)
-			all_rows += len(df)
-		logger.info(f"Inserted {all_rows} raw rows")
-
-		# create clean table
+			table = futures[path].result()
+			# single writer: every file lands through this one connection
+			_insert_frame(conn, raw_table, table)
+			rows[path] = table.num_rows
+			logger.info(f"Loaded {path} ({table.num_rows} rows, parsed in worker)")
+	return rows
+
+
+def ingest_csvs(
+	conn: duckdb.DuckDBPyConnection,
+	raw_table: str,
+	csv_paths: List[str],
+	engine: str,
+	workers: int = 1,
+	chunk_rows: int = 100_000,
+) -> Dict[str, int]:
+	"""Append every CSV to the raw table with the chosen engine; returns rows inserted per path."""
+	if engine not in ENGINES:
+		raise ValueError(f"Unsupported ETL engine {engine!r}; expected one of {ENGINES}")
+	if engine == "streaming":
+		if workers > 1:
+			logger.info("Streaming engine ignores workers; files are read one chunk at a time")
+		return {path: _ingest_file_streaming(conn, raw_table, path, chunk_rows) for path in csv_paths}
+	if workers > 1 and len(csv_paths) > 1:
+		return _ingest_parallel(conn, raw_table, csv_paths, engine, min(workers, len(csv_paths)))
+	ingest = _ingest_file_duckdb if engine == "duckdb" else _ingest_file_pandas
+	rows: Dict[str, int] = {}
+	for path in csv_paths:
+		logger.info(f"Reading {path} ({engine})")
+		rows[path] = ingest(conn, raw_table, path)
+	return rows
+
+
+def _table_columns(conn: duckdb.DuckDBPyConnection, table: str) -> List[str]:
+	rows = conn.execute(
+		"SELECT column_name FROM information_schema.columns WHERE table_name = ? ORDER BY ordinal_position",
+		[table],
+	).fetchall()
+	return [r[0] for r in rows]
+
+
+def _scope_filter(source_files: Optional[List[str]]) -> str:
+	if source_files is None:
+		return ""
+	return "AND source_file IN (" + ", ".join(_sql_str(f) for f in source_files) + ")"
+
+
+def _build_clean_table(conn: duckdb.DuckDBPyConnection, cfg, source_files: Optional[List[str]] = None) -> None:
+	"""(Re)build the clean table, either fully or only for rows from ``source_files``."""
+	select = f"""
+		SELECT
+			*,
+			CAST(strptime(month || '-01', '%Y-%m-%d') AS DATE) AS txn_date,
+			EXTRACT(year FROM CAST(strptime(month || '-01', '%Y-%m-%d') AS DATE)) AS year,
+			EXTRACT(month FROM CAST(strptime(month || '-01', '%Y-%m-%d') AS DATE)) AS month_num
+		FROM {cfg.paths.raw_table}
+		WHERE resale_price IS NOT NULL AND town IS NOT NULL AND flat_type IS NOT NULL
+		{_scope_filter(source_files)}
+	"""
+	if source_files is None:
 		logger.info("Creating clean table")
-		conn.execute(
-			f"""
-			CREATE OR REPLACE TABLE {cfg.paths.clean_table} AS
-			SELECT
-				*,
-				CAST(strptime(month || '-01', '%Y-%m-%d') AS DATE) AS txn_date,
-				EXTRACT(year FROM CAST(strptime(month || '-01', '%Y-%m-%d') AS DATE)) AS year,
-				EXTRACT(month FROM CAST(strptime(month || '-01', '%Y-%m-%d') AS DATE)) AS month_num
-			FROM {cfg.paths.raw_table}
-			WHERE resale_price IS NOT NULL AND town IS NOT NULL AND flat_type IS NOT NULL;
-			"""
-		)
+		conn.execute(f"CREATE OR REPLACE TABLE {cfg.paths.clean_table} AS {select}")
+	else:
+		logger.info(f"Updating clean table for {len(source_files)} file(s)")
+		conn.execute(f"INSERT INTO {cfg.paths.clean_table} {select}")
+
 
-		# add features table by computing storey_mid in pandas and writing back
+def _build_features_table(conn: duckdb.DuckDBPyConnection, cfg, source_files: Optional[List[str]] = None) -> None:
+	"""(Re)build the features table inside DuckDB, with storey_mid computed by ``storey_mid_sql``."""
+	select = f"""
+		SELECT resale_price, town, flat_type, flat_model, floor_area_sqm,
+		       lease_commence_date, year, month_num, source_file,
+		       {storey_mid_sql("storey_range")} AS storey_mid
+		FROM {cfg.paths.clean_table}
+		WHERE resale_price > 10000 AND floor_area_sqm IS NOT NULL
+		{_scope_filter(source_files)}
+	"""
+	if source_files is None:
 		logger.info("Creating features table")
-		feat_df = conn.execute(
-			f"""
-			SELECT resale_price, town, flat_type, flat_model, floor_area_sqm,
-			       lease_commence_date, storey_range, year, month_num
-			FROM {cfg.paths.clean_table}
-			WHERE resale_price > 10000 AND floor_area_sqm IS NOT NULL
-			"""
-		).df()
-		feat_df["storey_mid"] = feat_df["storey_range"].map(parse_storey_midpoint)
-		feat_df = feat_df.drop(columns=["storey_range"])
-		conn.register("feat_df", feat_df)
-		conn.execute(f"CREATE OR REPLACE TABLE {cfg.paths.features_table} AS SELECT * FROM feat_df")
+		conn.execute(f"CREATE OR REPLACE TABLE {cfg.paths.features_table} AS {select}")
+	else:
+		logger.info(f"Updating features table for {len(source_files)} file(s)")
+		conn.execute(f"INSERT INTO {cfg.paths.features_table} BY NAME {select}")
+
+
+def _build_activity_table(conn: duckdb.DuckDBPyConnection, cfg, source_files: Optional[List[str]] = None) -> None:
+	"""Monthly transaction counts per town x flat_type, kept per source_file so it updates incrementally."""
+	select = f"""
+		SELECT town, flat_type, year, month_num, source_file, COUNT(*) AS n
+		FROM {cfg.paths.clean_table}
+		WHERE 1 = 1 {_scope_filter(source_files)}
+		GROUP BY town, flat_type, year, month_num, source_file
+	"""
+	if source_files is None:
+		logger.info("Creating activity rollup table")
+		conn.execute(f"CREATE OR REPLACE TABLE {cfg.paths.activity_table} AS {select}")
+	else:
+		conn.execute(f"INSERT INTO {cfg.paths.activity_table} BY NAME {select}")
+
+
+def _build_stats_table(conn: duckdb.DuckDBPyConnection, cfg) -> None:
+	"""Per town x flat_type lookup used by the API instead of a GROUP BY scan per request."""
+	logger.info("Creating town/flat-type stats table")
+	conn.execute(
+		f"""
+		CREATE OR REPLACE TABLE {cfg.paths.stats_table} AS
+		SELECT
+			town,
+			flat_type,
+			COUNT(*) AS n,
+			median(floor_area_sqm) AS med_area,
+			quantile_cont(resale_price, 0.25) AS price_p25,
+			median(resale_price) AS price_p50,
+			quantile_cont(resale_price, 0.75) AS price_p75,
+			MIN(year) AS min_year,
+			MAX(year) AS max_year
+		FROM {cfg.paths.features_table}
+		GROUP BY town, flat_type
+		"""
+	)
+
+
+def _stamp_data_version(conn: duckdb.DuckDBPyConnection, cfg) -> str:
+	"""Record a new data version so readers know derived tables changed."""
+	version = f"{utc_now_str()}-{uuid.uuid4().hex[:8]}"
+	conn.execute(f"CREATE TABLE IF NOT EXISTS {cfg.paths.meta_table} (key TEXT PRIMARY KEY, value TEXT)")
+	conn.execute(f"INSERT OR REPLACE INTO {cfg.paths.meta_table} VALUES ('data_version', ?)", [version])
+	return version
+
+
+def _create_manifest_table(conn: duckdb.DuckDBPyConnection, manifest_table: str) -> None:
+	conn.execute(
+		f"""
+		CREATE TABLE IF NOT EXISTS {manifest_table} (
+			source_file TEXT PRIMARY KEY,
+			path TEXT,
+			size BIGINT,
+			mtime_ns BIGINT,
+			sha256 TEXT,
+			rows BIGINT,
+			loaded_at TEXT
+		);
+		"""
+	)
+
+
+def plan_incremental(
+	conn: duckdb.DuckDBPyConnection,
+	manifest_table: str,
+	csv_paths: List[str],
+) -> Tuple[List[Tuple[str, os.stat_result, str]], List[str], List[Tuple[str, int]]]:
+	"""Files to (re)load with stat and sha256, manifest keys whose file is gone, and (key, mtime) for touched-only files."""
+	known = {
+		r[0]: r[1:]
+		for r in conn.execute(f"SELECT source_file, size, mtime_ns, sha256 FROM {manifest_table}").fetchall()
+	}
+	changed, touched, seen = [], [], set()
+	for path in csv_paths:
+		key = source_key(path)
+		seen.add(key)
+		st = os.stat(path)
+		prev = known.get(key)
+		if prev is not None and prev[0] == st.st_size and prev[1] == st.st_mtime_ns:
+			continue  # not hashed at all
+		digest = file_hash(path)
+		if prev is not None and prev[2] == digest:
+			touched.append((key, st.st_mtime_ns))
+			continue
+		changed.append((path, st, digest))
+	removed = sorted(set(known) - seen)
+	return changed, removed, touched
+
+
+def _derived_tables_ok(conn: duckdb.DuckDBPyConnection, cfg) -> bool:
+	return all(
+		"source_file" in _table_columns(conn, t)
+		for t in (cfg.paths.clean_table, cfg.paths.features_table, cfg.paths.activity_table)
+	)
+
+
+def _is_up_to_date(path: str, csv_paths: List[str], cfg) -> bool:
+	"""Cheap read-only check that no file changed, so a swap copy can be skipped."""
+	conn = duckdb.connect(path, read_only=True)
+	try:
+		if not _table_columns(conn, cfg.paths.manifest_table) or not _derived_tables_ok(conn, cfg):
+			return False
+		if not _table_columns(conn, cfg.paths.stats_table):
+			return False
+		changed, removed, touched = plan_incremental(conn, cfg.paths.manifest_table, csv_paths)
+		return not (changed or removed or touched)
+	finally:
+		conn.close()
+
+
+def _has_other_readers(path: str) -> bool:
+	"""True when another connection holds ``path`` open, so writing in place would block or fail it."""
+	try:
+		duckdb.connect(path).close()
+	except (duckdb.IOException, duckdb.ConnectionException):
+		return True
+	except duckdb.BinderException:
+		# attached by a read pool in this process ("unique file handle conflict")
+		return True
+	return False
+
+
+def load_csvs_to_duckdb(
+	csv_paths: List[str] | None = None,
+	engine: Optional[str] = None,
+	duckdb_path: Optional[str] = None,
+	full: bool = False,
+	workers: Optional[int] = None,
+	chunk_rows: Optional[int] = None,
+) -> Dict[str, int]:
+	"""Bring the database (and the Parquet lake) in line with the CSV files, reading only new or changed files."""
+	cfg = load_config()
+	target = duckdb_path or cfg.paths.duckdb_path
+	stats = _load_csvs(target, csv_paths, cfg, engine, full, workers, chunk_rows)
+	if cfg.etl.lake_enabled:
+		sync_lake(target, cfg)
+	return stats
+
+
+def _load_csvs(
+	target: str,
+	csv_paths: List[str] | None,
+	cfg,
+	engine: Optional[str],
+	full: bool,
+	workers: Optional[int],
+	chunk_rows: Optional[int],
+) -> Dict[str, int]:
+	if csv_paths is None:
+		csv_paths = sorted(glob.glob(cfg.etl.csv_glob))
+	kwargs = dict(
+		engine=engine or cfg.etl.engine,
+		full=full,
+		workers=workers or cfg.etl.workers,
+		chunk_rows=chunk_rows or cfg.etl.chunk_rows,
+	)
+	if not cfg.etl.swap_database or not os.path.exists(target):
+		return _sync_database(target, csv_paths, cfg, **kwargs)
+	if not full and _is_up_to_date(target, csv_paths, cfg):
+		logger.info(f"No CSV changes; {len(csv_paths)} file(s) up to date")
+		return {"changed": 0, "removed": 0, "unchanged": len(csv_paths), "rows": 0}
+	if not _has_other_readers(target):
+		# nobody to protect from the write lock: update in place, no O(database) copy
+		return _sync_database(target, csv_paths, cfg, **kwargs)
+	work = target + ".etl-tmp"
+	for suffix in ("", ".wal"):
+		if os.path.exists(target + suffix):
+			shutil.copyfile(target + suffix, work + suffix)
+	try:
+		stats = _sync_database(work, csv_paths, cfg, **kwargs)
+		# the copy replayed and checkpointed the old WAL; left in place, DuckDB would
+		# replay it again on top of the new file
+		if os.path.exists(target + ".wal"):
+			os.remove(target + ".wal")
+		os.replace(work, target)
+	finally:
+		for leftover in (work, work + ".wal"):
+			if os.path.exists(leftover):
+				os.remove(leftover)
+	logger.info(f"Swapped updated database into {target}")
+	return stats
+
+
+def _sync_database(
+	db_path: str,
+	csv_paths: List[str],
+	cfg,
+	engine: str,
+	full: bool,
+	workers: int,
+	chunk_rows: int,
+) -> Dict[str, int]:
+	raw, manifest = cfg.paths.raw_table, cfg.paths.manifest_table
+	conn = duckdb.connect(db_path)
+	try:
+		_create_raw_table(conn, raw)
+		_create_manifest_table(conn, manifest)
+
+		derived_ok = _derived_tables_ok(conn, cfg) and bool(_table_columns(conn, cfg.paths.stats_table))
+		if full or not derived_ok:
+			# clear existing to avoid duplicates on reruns
+			conn.execute(f"DELETE FROM {raw}")
+			conn.execute(f"DELETE FROM {manifest}")
+
+		changed, removed, touched = plan_incremental(conn, manifest, csv_paths)
+		for key, mtime_ns in touched:
+			conn.execute(f"UPDATE {manifest} SET mtime_ns = ? WHERE source_file = ?", [mtime_ns, key])
+		stats = {"changed": len(changed), "removed": len(removed), "unchanged": len(csv_paths) - len(changed), "rows": 0}
+		if not changed and not removed and derived_ok and not full:
+			logger.info(f"No CSV changes; {len(csv_paths)} file(s) up to date")
+			return stats
+
+		stale = removed + [source_key(p) for p, _, _ in changed]
+		conn.execute("BEGIN TRANSACTION")
+		try:
+			for key in stale:
+				conn.execute(f"DELETE FROM {raw} WHERE source_file = ?", [key])
+				conn.execute(f"DELETE FROM {manifest} WHERE source_file = ?", [key])
+			loaded_rows = ingest_csvs(conn, raw, [p for p, _, _ in changed], engine, workers, chunk_rows)
+			for path, st, digest in changed:
+				n = loaded_rows[path]
+				stats["rows"] += n
+				conn.execute(
+					f"INSERT INTO {manifest} VALUES (?, ?, ?, ?, ?, ?, ?)",
+					[source_key(path), path, st.st_size, st.st_mtime_ns, digest, n, utc_now_str()],
+				)
+			logger.info(f"Inserted {stats['rows']} raw rows from {len(changed)} file(s); removed {len(removed)} file(s)")
+
+			if full or not derived_ok:
+				_build_clean_table(conn, cfg)
+				_build_features_table(conn, cfg)
+				_build_activity_table(conn, cfg)
+			else:
+				for table in (cfg.paths.clean_table, cfg.paths.features_table, cfg.paths.activity_table):
+					conn.execute(f"DELETE FROM {table} WHERE 1 = 1 {_scope_filter(stale)}")
+				loaded = [source_key(p) for p, _, _ in changed]
+				if loaded:
+					_build_clean_table(conn, cfg, loaded)
+					_build_features_table(conn, cfg, loaded)
+					_build_activity_table(conn, cfg, loaded)
+			_build_stats_table(conn, cfg)
+			logger.info(f"Data version {_stamp_data_version(conn, cfg)}")
+			conn.execute("COMMIT")
+		except Exception:
+			conn.execute("ROLLBACK")
+			raise
+		return stats
 	finally:
 		conn.close()
 
@@ -1,17 +1,32 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
 import duckdb
+import numpy as np
 import pandas as pd
+from scipy import sparse
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, StandardScaler
 
 from .config import load_config
+from .lake import lake_relation
+
+try:
+	import pyarrow.compute as pc
+except Exception:  # pragma: no cover
+	pc = None  # type: ignore
+
+
+CATEGORICAL = ["town", "flat_type", "flat_model"]
+NUMERIC = ["floor_area_sqm", "lease_commence_date", "storey_mid", "year", "month_num"]
 
 
 def build_preprocessor(df: pd.DataFrame) -> ColumnTransformer:
-	categorical = ["town", "flat_type", "flat_model"]
-	numeric = ["floor_area_sqm", "lease_commence_date", "storey_mid", "year", "month_num"]
+	categorical = list(CATEGORICAL)
+	numeric = list(NUMERIC)
 	preprocessor = ColumnTransformer(
 		transformers=[
 			("cat", OneHotEncoder(handle_unknown="ignore"), categorical),
@@ -21,6 +36,18 @@ def build_preprocessor(df: pd.DataFrame) -> ColumnTransformer:
 	return preprocessor
 
 
+def build_ordinal_preprocessor(df: pd.DataFrame) -> ColumnTransformer:
+	"""Integer category codes (first len(CATEGORICAL) columns) plus raw numerics, for models
+	with native categorical support. Unseen categories become NaN, i.e. missing.
+	"""
+	return ColumnTransformer(
+		transformers=[
+			("cat", OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=np.nan), list(CATEGORICAL)),
+			("num", "passthrough", list(NUMERIC)),
+		]
+	)
+
+
 def load_training_dataframe() -> pd.DataFrame:
 	cfg = load_config()
 	con = duckdb.connect(cfg.paths.duckdb_path, read_only=True)
@@ -29,3 +56,147 @@ def load_training_dataframe() -> pd.DataFrame:
 		return df
 	finally:
 		con.close()
+
+
+@dataclass
+class TrainingData:
+	"""Training rows as compact arrays: sorted-dictionary codes for the categoricals,
+	float64 numerics and the target. Row ``i`` of every array is the same transaction.
+	"""
+
+	codes: np.ndarray  # (n, len(CATEGORICAL)) int32, index into ``categories[j]``
+	numeric: np.ndarray  # (n, len(NUMERIC)) float64
+	y: np.ndarray  # (n,) float64
+	categories: List[np.ndarray]  # sorted category labels per categorical column
+
+	def __len__(self) -> int:
+		return len(self.y)
+
+	@classmethod
+	def from_frame(cls, df: pd.DataFrame, y: np.ndarray) -> "TrainingData":
+		encoded = [_sorted_codes(df[col].to_numpy()) for col in CATEGORICAL]
+		return cls(
+			codes=np.column_stack([c for c, _ in encoded]),
+			numeric=df[NUMERIC].to_numpy(dtype=np.float64),
+			y=np.asarray(y, dtype=np.float64),
+			categories=[labels for _, labels in encoded],
+		)
+
+	def frame(self, idx: Optional[np.ndarray] = None) -> pd.DataFrame:
+		"""Rows decoded back into the DataFrame layout the serving pipeline receives."""
+		codes = self.codes if idx is None else self.codes[idx]
+		numeric = self.numeric if idx is None else self.numeric[idx]
+		out = {col: self.categories[j][codes[:, j]] for j, col in enumerate(CATEGORICAL)}
+		out.update({col: numeric[:, j] for j, col in enumerate(NUMERIC)})
+		return pd.DataFrame(out)
+
+
+def _sorted_codes(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+	labels, inv = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+	return inv.astype(np.int32), labels
+
+
+def _dictionary_codes(column) -> Tuple[np.ndarray, np.ndarray]:
+	"""int32 codes into the sorted distinct values of an Arrow string column."""
+	encoded = pc.dictionary_encode(column).combine_chunks()
+	labels = np.asarray(encoded.dictionary.to_pylist(), dtype=object)
+	order = np.argsort(labels)
+	rank = np.empty(len(order), dtype=np.int32)
+	rank[order] = np.arange(len(order), dtype=np.int32)
+	return rank[encoded.indices.to_numpy()], labels[order]
+
+
+def load_training_data() -> TrainingData:
+	"""Only the model columns, fetched as Arrow and dictionary-encoded without building a DataFrame.
+
+	Reads the Parquet lake when ETL exported one, otherwise the DuckDB file.
+	"""
+	cfg = load_config()
+	target = cfg.training.target
+	cols = ", ".join(CATEGORICAL + NUMERIC + [target])
+	relation = lake_relation(cfg.paths.features_table, cfg)
+	if relation is not None:
+		# the Parquet lake, off the database file; row_id restores the table order for the split
+		sql = f"SELECT {cols} FROM {relation} ORDER BY row_id"
+		con = duckdb.connect()
+	else:
+		sql = f"SELECT {cols} FROM {cfg.paths.features_table}"
+		con = duckdb.connect(cfg.paths.duckdb_path, read_only=True)
+	try:
+		if pc is not None:
+			columns = con.execute(sql).fetch_arrow_table()
+			encode = _dictionary_codes
+		else:
+			columns = con.execute(sql).fetchnumpy()
+			encode = _sorted_codes
+	finally:
+		con.close()
+
+	def column(name: str):
+		return columns.column(name) if pc is not None else columns[name]
+
+	n = len(column(target))
+	codes = np.empty((n, len(CATEGORICAL)), dtype=np.int32)
+	categories = []
+	for j, col in enumerate(CATEGORICAL):
+		codes[:, j], labels = encode(column(col))
+		categories.append(labels)
+	numeric = np.empty((n, len(NUMERIC)), dtype=np.float64)
+	for j, col in enumerate(NUMERIC):
+		numeric[:, j] = np.asarray(column(col))
+	y = np.asarray(column(target), dtype=np.float64)
+	return TrainingData(codes=codes, numeric=numeric, y=y, categories=categories)
+
+
+def _category_frame(categories: List[np.ndarray]) -> pd.DataFrame:
+	"""Smallest frame in which every category of every column appears, for fitting encoders."""
+	n = max(len(c) for c in categories)
+	out = {col: np.resize(categories[j], n) for j, col in enumerate(CATEGORICAL)}
+	out.update({col: np.zeros(n) for col in NUMERIC})
+	return pd.DataFrame(out)
+
+
+def onehot_design(
+	data: TrainingData, idx: np.ndarray, preprocessor: Optional[ColumnTransformer] = None
+) -> Tuple[sparse.csc_matrix, ColumnTransformer]:
+	"""Sparse float32 matrix for rows ``idx``, laid out exactly like ``build_preprocessor``'s
+	output, plus that preprocessor fitted to the same categories and scaling for serving.
+
+	Pass the preprocessor returned for the training rows to encode held-out rows with the
+	training scaling. The matrix is CSC, the layout the forest trains on, so it is not copied.
+	"""
+	pre = preprocessor
+	if pre is None:
+		# the encoders only need the category lists; the scaler gets the real training statistics
+		pre = build_preprocessor(None).fit(_category_frame(data.categories))
+		fitted = StandardScaler().fit(data.numeric[idx])
+		scaler = pre.named_transformers_["num"]
+		scaler.mean_, scaler.var_, scaler.scale_ = fitted.mean_, fitted.var_, fitted.scale_
+		scaler.n_samples_seen_ = fitted.n_samples_seen_
+	scaler = pre.named_transformers_["num"]
+
+	n, k = len(idx), len(CATEGORICAL)
+	offsets = np.cumsum([0] + [len(c) for c in data.categories])
+	onehot = sparse.csc_matrix(
+		(np.ones(n * k, dtype=np.float32), (np.repeat(np.arange(n), k), (data.codes[idx] + offsets[:-1]).ravel())),
+		shape=(n, offsets[-1]),
+	)
+	num = ((data.numeric[idx] - scaler.mean_) / scaler.scale_).astype(np.float32)
+	X = sparse.hstack([onehot, sparse.csc_matrix(num)], format="csc", dtype=np.float32)
+	return X, pre
+
+
+def ordinal_design(
+	data: TrainingData, idx: np.ndarray, preprocessor: Optional[ColumnTransformer] = None
+) -> Tuple[np.ndarray, ColumnTransformer]:
+	"""Dense float64 [codes | numerics] for rows ``idx``, plus the fitted ``build_ordinal_preprocessor``.
+
+	float64 like the passthrough numerics at serving time: HistGradientBoosting bins
+	in float64, so float32-rounded training values would put bin edges where
+	serving rows fall on the other side.
+	"""
+	pre = preprocessor or build_ordinal_preprocessor(None).fit(_category_frame(data.categories))
+	X = np.empty((len(idx), len(CATEGORICAL) + len(NUMERIC)), dtype=np.float64)
+	X[:, :len(CATEGORICAL)] = data.codes[idx]
+	X[:, len(CATEGORICAL):] = data.numeric[idx]
+	return X, pre
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import duckdb
+
+from .config import get_config
+from .db import file_signature
+from .utils import get_logger, save_json, utc_now_str
+
+
+logger = get_logger("lake")
+
+PARTITION_BY = ("year", "town")
+# partition values come back from directory names; pin their types instead of sniffing them
+HIVE_TYPES = "{'year': BIGINT, 'town': VARCHAR}"
+POINTER_FILE = "_current.json"
+
+
+def lake_tables(cfg=None) -> List[str]:
+	cfg = cfg or get_config()
+	return [cfg.paths.clean_table, cfg.paths.features_table]
+
+
+def _snapshot_name(version: str) -> str:
+	return "v-" + re.sub(r"[^0-9A-Za-z-]", "", version)
+
+
+def export_lake(conn: duckdb.DuckDBPyConnection, lake_dir: str, tables: List[str], version: str) -> Dict[str, Any]:
+	"""Write ``tables`` as Hive-partitioned Parquet (year=/town=) into a new snapshot directory,
+	then swap the pointer file to it.
+
+	Readers resolve the pointer per query, so they see either the old or the new
+	snapshot, never a half-written one. ``row_id`` keeps the table's row order,
+	which training relies on for a reproducible split. The previous snapshot is
+	kept for queries that started on it; older ones are removed.
+	"""
+	os.makedirs(lake_dir, exist_ok=True)
+	name = _snapshot_name(version)
+	final = os.path.join(lake_dir, name)
+	work = final + ".tmp"
+	shutil.rmtree(work, ignore_errors=True)
+	os.makedirs(work)
+	for table in tables:
+		target = os.path.join(work, table).replace("'", "''")
+		conn.execute(
+			f"COPY (SELECT rowid AS row_id, * FROM {table}) TO '{target}' "
+			f"(FORMAT PARQUET, PARTITION_BY ({', '.join(PARTITION_BY)}))"
+		)
+	shutil.rmtree(final, ignore_errors=True)
+	os.replace(work, final)
+
+	pointer = os.path.join(lake_dir, POINTER_FILE)
+	previous = read_pointer(pointer)
+	meta = {
+		"data_version": version,
+		"snapshot": name,
+		"tables": tables,
+		"partition_by": list(PARTITION_BY),
+		"created_at": utc_now_str(),
+	}
+	save_json(meta, pointer + ".tmp")
+	os.replace(pointer + ".tmp", pointer)
+
+	keep = {name, previous.get("snapshot") if previous else None}
+	for entry in os.listdir(lake_dir):
+		if entry.startswith("v-") and entry not in keep:
+			shutil.rmtree(os.path.join(lake_dir, entry), ignore_errors=True)
+	logger.info(f"Exported {', '.join(tables)} to {final} (partitioned by {', '.join(PARTITION_BY)})")
+	return meta
+
+
+def read_pointer(path: str) -> Optional[Dict[str, Any]]:
+	try:
+		with open(path, "r", encoding="utf-8") as f:
+			return json.load(f)
+	except FileNotFoundError:
+		return None
+
+
+def sync_lake(db_path: str, cfg=None) -> Optional[Dict[str, Any]]:
+	"""Export the lake from ``db_path`` unless it already holds that database's data version."""
+	cfg = cfg or get_config()
+	lake_dir = cfg.paths.lake_dir
+	conn = duckdb.connect(db_path, read_only=True)
+	try:
+		row = conn.execute(f"SELECT value FROM {cfg.paths.meta_table} WHERE key = 'data_version'").fetchone()
+		version = row[0] if row else utc_now_str()
+		current = read_pointer(os.path.join(lake_dir, POINTER_FILE))
+		if current and current.get("data_version") == version:
+			logger.info(f"Parquet lake already at data version {version}")
+			return current
+		return export_lake(conn, lake_dir, lake_tables(cfg), version)
+	finally:
+		conn.close()
+
+
+class LakeCatalog:
+	"""Resolves table names to ``read_parquet`` scans of the current snapshot.
+
+	The pointer file is re-read only when it changes on disk.
+	"""
+
+	def __init__(self, lake_dir: str):
+		self.lake_dir = lake_dir
+		self._sig: Optional[Tuple[int, int, int]] = None
+		self._meta: Optional[Dict[str, Any]] = None
+		self._lock = threading.Lock()
+
+	def current(self) -> Optional[Dict[str, Any]]:
+		pointer = os.path.join(self.lake_dir, POINTER_FILE)
+		sig = file_signature(pointer)
+		if sig != self._sig:
+			with self._lock:
+				if sig != self._sig:
+					self._meta, self._sig = (read_pointer(pointer) if sig is not None else None), sig
+		return self._meta
+
+	def relation(self, table: str) -> Optional[str]:
+		"""SQL table expression for ``table`` in the current snapshot, or None when it is not exported."""
+		meta = self.current()
+		if not meta or table not in meta.get("tables", []):
+			return None
+		glob = os.path.join(self.lake_dir, meta["snapshot"], table, "**", "*.parquet").replace("'", "''")
+		return f"read_parquet('{glob}', hive_partitioning = true, hive_types = {HIVE_TYPES})"
+
+
+_catalog: Optional[LakeCatalog] = None
+_conn: Optional[duckdb.DuckDBPyConnection] = None
+_conn_lock = threading.Lock()
+
+
+def lake_relation(table: str, cfg=None) -> Optional[str]:
+	"""Parquet scan for ``table`` when the lake is enabled and exported; None means use the DuckDB file."""
+	global _catalog
+	cfg = cfg or get_config()
+	if not cfg.etl.lake_enabled:
+		return None
+	if _catalog is None or _catalog.lake_dir != cfg.paths.lake_dir:
+		_catalog = LakeCatalog(cfg.paths.lake_dir)
+	return _catalog.relation(table)
+
+
+@contextmanager
+def lake_cursor() -> Iterator[duckdb.DuckDBPyConnection]:
+	"""Cursor on an in-memory DuckDB that only reads Parquet files, so it never touches the
+	database file ETL writes."""
+	global _conn
+	if _conn is None:
+		with _conn_lock:
+			if _conn is None:
+				_conn = duckdb.connect()
+	cur = _conn.cursor()
+	try:
+		yield cur
+	finally:
+		cur.close()
@@ -1,19 +1,36 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import os
-from typing import Dict, List
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-from .config import load_config
+from .config import LLMConfig, get_config
 from .utils import get_logger
 
 try:
-	from openai import OpenAI
+	from openai import AsyncOpenAI, OpenAI
 except Exception:  # pragma: no cover
+	AsyncOpenAI = None  # type: ignore
 	OpenAI = None  # type: ignore
 
 
 logger = get_logger("llm")
 
+SYSTEM_PROMPT = (
+	"You are an analyst generating brief, factual pricing insights for Singapore HDB BTO. "
+	"Given a town, flat type, and 3 price bands (low/mid/high), write 2-3 sentences on market context, "
+	"avoiding investment advice and speculation."
+)
+
+# (town, flat_type, {"low": .., "mid": .., "high": ..})
+ExplainItem = Tuple[str, str, Dict[str, float]]
+
 
 def _format_currency(x: float) -> str:
 	return f"${x:,.0f}"
@@ -27,37 +44,314 @@ def _fallback_text(town: str, flat_type: str, price_bands: Dict[str, float]) ->
 	)
 
 
-def explain_prices(town: str, flat_type: str, price_bands: Dict[str, float]) -> str:
-	cfg = load_config()
-	api_key = os.getenv("OPENAI_API_KEY")
+def round_bands(price_bands: Dict[str, float], step: float) -> Dict[str, float]:
+	"""Bands rounded to ``step`` dollars, so near-identical predictions share one explanation."""
+	step = step or 1.0
+	return {k: float(round(float(price_bands.get(k, 0.0)) / step) * step) for k in ("low", "mid", "high")}
 
-	prompt = (
-		"You are an analyst generating brief, factual pricing insights for Singapore HDB BTO. "
-		"Given a town, flat type, and 3 price bands (low/mid/high), write 2-3 sentences on market context, "
-		"avoiding investment advice and speculation."
-	)
-	content = (
+
+def build_prompt(town: str, flat_type: str, price_bands: Dict[str, float]) -> str:
+	return (
 		f"Town: {town}\nFlat type: {flat_type}\n"
 		f"Low: {_format_currency(price_bands.get('low', 0))}\n"
 		f"Mid: {_format_currency(price_bands.get('mid', 0))}\n"
 		f"High: {_format_currency(price_bands.get('high', 0))}"
 	)
 
-	if OpenAI is None or not api_key:
-		return _fallback_text(town, flat_type, price_bands)
-
-	try:
-		client = OpenAI(api_key=api_key)
-		resp = client.chat.completions.create(
-			model=cfg.llm.model,
-			messages=[
-				{"role": "system", "content": prompt},
-				{"role": "user", "content": content},
-			],
-			max_tokens=cfg.llm.max_tokens,
-			temperature=cfg.llm.temperature,
-		)
-		return resp.choices[0].message.content or _fallback_text(town, flat_type, price_bands)
-	except Exception as e:  # fallback on any API error
-		logger.warning(f"LLM explain fallback due to error: {e}")
-		return _fallback_text(town, flat_type, price_bands)
+
+def cache_key(model: str, content: str) -> str:
+	h = hashlib.sha256()
+	for part in (model, SYSTEM_PROMPT, content):
+		h.update(part.encode("utf-8"))
+		h.update(b"\0")
+	return h.hexdigest()
+
+
+class ExplanationCache:
+	"""Bounded in-memory LRU in front of an SQLite table, both with TTL expiry.
+
+	SQLite rather than DuckDB: the API and the report CLI may write at the same
+	time, and DuckDB allows a single writer process per file.
+	"""
+
+	def __init__(self, path: Optional[str], max_entries: int = 1024, ttl_s: float = 7 * 86400):
+		self.path = path
+		self.max_entries = max_entries
+		self.ttl_s = ttl_s
+		self._mem: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+		self._lock = threading.Lock()
+		self._db: Optional[sqlite3.Connection] = None
+		self.hits = 0
+		self.misses = 0
+		if path:
+			d = os.path.dirname(path)
+			if d:
+				os.makedirs(d, exist_ok=True)
+			self._db = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+			self._db.execute("PRAGMA journal_mode=WAL")
+			self._db.execute(
+				"CREATE TABLE IF NOT EXISTS llm_explanations (key TEXT PRIMARY KEY, created_at REAL, text TEXT)"
+			)
+			self._db.commit()
+			self.purge_expired()
+
+	def get(self, key: str) -> Optional[str]:
+		now = time.time()
+		with self._lock:
+			entry = self._mem.get(key)
+			if entry is not None and now - entry[0] <= self.ttl_s:
+				self._mem.move_to_end(key)
+				self.hits += 1
+				return entry[1]
+			if entry is not None:
+				del self._mem[key]
+			row = None
+			if self._db is not None:
+				row = self._db.execute(
+					"SELECT created_at, text FROM llm_explanations WHERE key = ?", [key]
+				).fetchone()
+			if row is None or now - row[0] > self.ttl_s:
+				self.misses += 1
+				return None
+			self._remember(key, row[0], row[1])
+			self.hits += 1
+			return row[1]
+
+	def put(self, key: str, text: str) -> None:
+		now = time.time()
+		with self._lock:
+			self._remember(key, now, text)
+			if self._db is not None:
+				self._db.execute(
+					"INSERT OR REPLACE INTO llm_explanations VALUES (?, ?, ?)", [key, now, text]
+				)
+				self._db.commit()
+
+	def _remember(self, key: str, created_at: float, text: str) -> None:
+		self._mem[key] = (created_at, text)
+		self._mem.move_to_end(key)
+		while len(self._mem) > self.max_entries:
+			self._mem.popitem(last=False)
+
+	def purge_expired(self) -> int:
+		"""Drop expired rows from disk. Returns the number removed."""
+		if self._db is None:
+			return 0
+		with self._lock:
+			cur = self._db.execute("DELETE FROM llm_explanations WHERE created_at < ?", [time.time() - self.ttl_s])
+			self._db.commit()
+			return cur.rowcount
+
+	def snapshot(self) -> Dict[str, int]:
+		return {"entries": len(self._mem), "hits": self.hits, "misses": self.misses}
+
+
+class Explainer:
+	"""Price-band explanations through one shared OpenAI client and an explanation cache.
+
+	Only real LLM answers are cached; fallbacks are recomputed so they never
+	mask an API that has come back.
+	"""
+
+	def __init__(self, llm_cfg: LLMConfig, cache: Optional[ExplanationCache] = None, api_key: Optional[str] = None):
+		self.cfg = llm_cfg
+		self.cache = cache
+		self.api_key = api_key if api_key is not None else os.getenv("OPENAI_API_KEY")
+		self._client = None
+		self._client_lock = threading.Lock()
+		# explanations replaced by the template because the LLM failed or was too slow
+		self.fallbacks = 0
+		self._async: Optional[Tuple[Any, Any, asyncio.Semaphore, Dict[str, "asyncio.Task"]]] = None
+
+	@property
+	def enabled(self) -> bool:
+		return OpenAI is not None and bool(self.api_key)
+
+	def _get_client(self):
+		if self._client is None:
+			with self._client_lock:
+				if self._client is None:
+					self._client = OpenAI(
+						api_key=self.api_key,
+						base_url=self.cfg.base_url or None,
+						timeout=self.cfg.timeout_s,
+					)
+		return self._client
+
+	def _request(self, town: str, flat_type: str, bands: Dict[str, float]) -> Tuple[str, str]:
+		content = build_prompt(town, flat_type, round_bands(bands, self.cfg.band_round))
+		return content, cache_key(self.cfg.model, content)
+
+	def _messages(self, content: str) -> List[Dict[str, str]]:
+		return [
+			{"role": "system", "content": SYSTEM_PROMPT},
+			{"role": "user", "content": content},
+		]
+
+	def _complete(self, content: str) -> Optional[str]:
+		try:
+			resp = self._get_client().chat.completions.create(
+				model=self.cfg.model,
+				messages=self._messages(content),
+				max_tokens=self.cfg.max_tokens,
+				temperature=self.cfg.temperature,
+			)
+			return resp.choices[0].message.content or None
+		except Exception as e:  # fallback on any API error
+			logger.warning(f"LLM explain fallback due to error: {e}")
+			return None
+
+	def _lookup(self, items: Sequence[ExplainItem]) -> Tuple[List[Optional[str]], Dict[str, Tuple[str, List[int]]]]:
+		"""Cached texts per item, plus the distinct prompts still to fetch (key -> (content, item indexes))."""
+		out: List[Optional[str]] = [None] * len(items)
+		pending: Dict[str, Tuple[str, List[int]]] = {}
+		for i, (town, ft, bands) in enumerate(items):
+			content, key = self._request(town, ft, bands)
+			cached = self.cache.get(key) if self.cache is not None else None
+			if cached is not None:
+				out[i] = cached
+			elif key in pending:
+				# identical prompts in one call share a single request
+				pending[key][1].append(i)
+			else:
+				pending[key] = (content, [i])
+		return out, pending
+
+	def _store(self, key: str, text: Optional[str]) -> None:
+		if text is not None and self.cache is not None:
+			self.cache.put(key, text)
+
+	def _finish(self, out: List[Optional[str]], items: Sequence[ExplainItem]) -> List[str]:
+		self.fallbacks += sum(1 for text in out if text is None)
+		return [
+			text if text is not None else _fallback_text(town, ft, bands)
+			for text, (town, ft, bands) in zip(out, items)
+		]
+
+	def explain(self, town: str, flat_type: str, price_bands: Dict[str, float]) -> str:
+		return self.explain_many([(town, flat_type, price_bands)])[0]
+
+	def explain_many(self, items: Sequence[ExplainItem]) -> List[str]:
+		"""Explanations for many (town, flat_type, bands); cache misses are fetched concurrently."""
+		if not self.enabled:
+			return [_fallback_text(t, ft, b) for t, ft, b in items]
+
+		out, pending = self._lookup(items)
+		if pending:
+			keys = list(pending)
+			workers = max(1, min(self.cfg.max_concurrency, len(keys)))
+			if workers == 1:
+				texts = [self._complete(pending[k][0]) for k in keys]
+			else:
+				with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm") as pool:
+					texts = list(pool.map(lambda k: self._complete(pending[k][0]), keys))
+			for key, text in zip(keys, texts):
+				self._store(key, text)
+				for i in pending[key][1]:
+					out[i] = text
+		return self._finish(out, items)
+
+	# -- async path for the API: never holds a worker thread while the LLM thinks --
+
+	def _async_state(self) -> Tuple[Any, asyncio.Semaphore, Dict[str, "asyncio.Task"]]:
+		"""AsyncOpenAI client, concurrency limiter and in-flight tasks for the running loop."""
+		loop = asyncio.get_running_loop()
+		state = self._async
+		if state is None or state[0] is not loop:
+			client = AsyncOpenAI(
+				api_key=self.api_key,
+				base_url=self.cfg.base_url or None,
+				timeout=self.cfg.timeout_s,
+			)
+			state = (loop, client, asyncio.Semaphore(max(1, self.cfg.max_concurrency)), {})
+			self._async = state
+		return state[1], state[2], state[3]
+
+	async def _acomplete(self, key: str, content: str) -> Optional[str]:
+		client, limiter, _ = self._async_state()
+		try:
+			async with limiter:
+				resp = await client.chat.completions.create(
+					model=self.cfg.model,
+					messages=self._messages(content),
+					max_tokens=self.cfg.max_tokens,
+					temperature=self.cfg.temperature,
+				)
+			text = resp.choices[0].message.content or None
+		except Exception as e:  # fallback on any API error
+			logger.warning(f"LLM explain fallback due to error: {e}")
+			return None
+		# SQLite commit (busy timeout up to 5 s with another writer) stays off the event loop
+		await asyncio.to_thread(self._store, key, text)
+		return text
+
+	def _task_for(self, key: str, content: str) -> "asyncio.Task":
+		# concurrent requests for the same prompt await one call
+		_, _, inflight = self._async_state()
+		task = inflight.get(key)
+		if task is None:
+			task = asyncio.ensure_future(self._acomplete(key, content))
+			inflight[key] = task
+			task.add_done_callback(lambda _t, k=key: inflight.pop(k, None))
+		return task
+
+	async def explain_many_async(self, items: Sequence[ExplainItem], deadline_s: Optional[float] = None) -> List[str]:
+		"""Async ``explain_many`` bounded by ``llm.max_concurrency`` and a shared deadline.
+
+		Items still pending at the deadline get ``_fallback_text``. Their requests
+		keep running in the background and fill the cache for the next caller.
+		"""
+		if not self.enabled or AsyncOpenAI is None:
+			return [_fallback_text(t, ft, b) for t, ft, b in items]
+
+		out, pending = await asyncio.to_thread(self._lookup, items)
+		if pending:
+			deadline = self.cfg.deadline_s if deadline_s is None else deadline_s
+			tasks = {key: self._task_for(key, content) for key, (content, _) in pending.items()}
+			done, not_done = await asyncio.wait(tasks.values(), timeout=deadline)
+			if not_done:
+				logger.warning(f"LLM deadline of {deadline}s passed for {len(not_done)} explanation(s); using fallback")
+			for key, task in tasks.items():
+				if task in done:
+					for i in pending[key][1]:
+						out[i] = task.result()
+		return self._finish(out, items)
+
+	async def explain_async(
+		self, town: str, flat_type: str, price_bands: Dict[str, float], deadline_s: Optional[float] = None
+	) -> str:
+		return (await self.explain_many_async([(town, flat_type, price_bands)], deadline_s))[0]
+
+
+def default_cache_path(cfg=None) -> str:
+	cfg = cfg or get_config()
+	return cfg.llm.cache_path or os.path.join(os.path.dirname(cfg.paths.duckdb_path), "llm_cache.sqlite")
+
+
+_explainer: Optional[Explainer] = None
+_explainer_lock = threading.Lock()
+
+
+def get_explainer() -> Explainer:
+	global _explainer
+	if _explainer is None:
+		with _explainer_lock:
+			if _explainer is None:
+				cfg = get_config()
+				cache = None
+				if cfg.llm.cache_enabled:
+					cache = ExplanationCache(default_cache_path(cfg), cfg.llm.cache_max_entries, cfg.llm.cache_ttl_s)
+				_explainer = Explainer(cfg.llm, cache)
+	return _explainer
+
+
+def explain_prices(town: str, flat_type: str, price_bands: Dict[str, float]) -> str:
+	return get_explainer().explain(town, flat_type, price_bands)
+
+
+def explain_many(items: Sequence[ExplainItem]) -> List[str]:
+	return get_explainer().explain_many(items)
+
+
+async def explain_many_async(items: Sequence[ExplainItem], deadline_s: Optional[float] = None) -> List[str]:
+	return await get_explainer().explain_many_async(items, deadline_s)
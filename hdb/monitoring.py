@@ -2,13 +2,14 @@ from __future__ import annotations
 
 import hashlib
 import os
-from typing import Dict
+import sys
+from typing import Dict, Optional
 
-import duckdb
 import joblib
 import pandas as pd
 
 from .config import load_config
+from .db import read_cursor
 
 
 def file_hash(path: str) -> str:
@@ -19,21 +20,46 @@ def file_hash(path: str) -> str:
 	return sha.hexdigest()
 
 
+def process_memory() -> Dict:
+	"""Memory of this process in MB. On Linux, PSS splits shared pages (e.g. a mapped
+	model) across the processes mapping them; elsewhere only peak RSS is available.
+	"""
+	out: Dict = {"pid": os.getpid()}
+	try:
+		with open("/proc/self/smaps_rollup", "r", encoding="utf-8") as f:
+			fields = dict(line.split()[:2] for line in f if line.endswith("kB\n"))
+
+		def kb(*names: str) -> float:
+			return sum(int(fields.get(n + ":", 0)) for n in names) / 1024.0
+
+		out.update({
+			"rss_mb": kb("Rss"),
+			"pss_mb": kb("Pss"),
+			"shared_mb": kb("Shared_Clean", "Shared_Dirty"),
+			"private_mb": kb("Private_Clean", "Private_Dirty"),
+		})
+	except OSError:
+		try:
+			import resource
+		except ImportError:  # Windows
+			return out
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		out["max_rss_mb"] = peak / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0)
+	return out
+
+
 def latest_data_snapshot() -> Dict:
 	cfg = load_config()
-	con = duckdb.connect(cfg.paths.duckdb_path, read_only=True)
-	try:
+	with read_cursor() as con:
 		row = con.execute(
 			f"SELECT COUNT(*) AS n, MIN(year) AS min_year, MAX(year) AS max_year FROM {cfg.paths.clean_table}"
 		).fetchone()
-		return {"rows": row[0], "min_year": row[1], "max_year": row[2]}
-	finally:
-		con.close()
+	return {"rows": row[0], "min_year": row[1], "max_year": row[2]}
 
 
-def model_fingerprint() -> Dict:
-	cfg = load_config()
-	path = os.path.join(cfg.paths.model_dir, "rf_pipeline.joblib")
+def model_fingerprint(path: Optional[str] = None) -> Dict:
+	if path is None:
+		path = load_config().paths.model_path
 	if not os.path.exists(path):
 		return {"exists": False}
 	return {"exists": True, "sha256": file_hash(path)}
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import glob
+import json
+import os
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .config import get_config
+from .db import file_signature
+from .utils import get_logger, save_json, utc_now_str
+
+
+logger = get_logger("price_grid")
+
+# feature values bto_analysis and the report use for every synthetic row
+GRID_DEFAULTS: Dict[str, Any] = {
+	"flat_model": "Improved",
+	"lease_commence_date": 1990,
+	"year": 2023,
+	"month_num": 6,
+}
+
+
+def storey_grid(start: float, stop: float, step: float) -> np.ndarray:
+	n = int(round((stop - start) / step)) + 1
+	return start + step * np.arange(n, dtype=np.float64)
+
+
+def grid_frame(pairs: List[Tuple[str, str, float]], storeys: np.ndarray) -> pd.DataFrame:
+	"""Model input rows for every (town, flat_type, area) pair at every storey, pair-major."""
+	n = len(storeys)
+	return pd.DataFrame({
+		"town": np.repeat([p[0] for p in pairs], n),
+		"flat_type": np.repeat([p[1] for p in pairs], n),
+		"flat_model": GRID_DEFAULTS["flat_model"],
+		"floor_area_sqm": np.repeat([float(p[2]) for p in pairs], n),
+		"lease_commence_date": GRID_DEFAULTS["lease_commence_date"],
+		"storey_mid": np.tile(storeys, len(pairs)),
+		"year": GRID_DEFAULTS["year"],
+		"month_num": GRID_DEFAULTS["month_num"],
+	})
+
+
+class PriceGrid:
+	"""Predicted resale prices for every town x flat_type (at its median area) x storey.
+
+	``prices`` is a (pairs, storeys) float32 matrix, memory-mapped read-only when
+	loaded from disk. Rows that match a grid pair, the default features and a grid
+	storey exactly are answered by lookup; a forest is piecewise-constant in
+	storey, so in-between storeys are left to the model rather than interpolated.
+	"""
+
+	def __init__(self, meta: Dict[str, Any], prices: np.ndarray):
+		self.meta = meta
+		self.prices = prices
+		self.model_sha256: Optional[str] = meta.get("model_sha256")
+		self.storey_start = float(meta["storey_start"])
+		self.storey_step = float(meta["storey_step"])
+		self.n_storeys = int(prices.shape[1])
+		self._pairs = {(t, ft): (i, float(a)) for i, (t, ft, a) in enumerate(meta["pairs"])}
+
+	def __len__(self) -> int:
+		return int(self.prices.size)
+
+	def predict(self, df: pd.DataFrame) -> np.ndarray:
+		"""Grid prices, NaN for rows the grid cannot answer."""
+		n = len(df)
+		out = np.full(n, np.nan)
+		on_grid = np.ones(n, dtype=bool)
+		for col, value in GRID_DEFAULTS.items():
+			on_grid &= (df[col] == value).to_numpy()
+		hits = [self._pairs.get(k, (-1, np.nan)) for k in zip(df["town"].tolist(), df["flat_type"].tolist())]
+		rows = np.fromiter((h[0] for h in hits), dtype=np.int64, count=n)
+		areas = np.fromiter((h[1] for h in hits), dtype=np.float64, count=n)
+		pos = (df["storey_mid"].to_numpy(dtype=np.float64) - self.storey_start) / self.storey_step
+		col = np.rint(pos)
+		on_grid &= (rows >= 0) & np.isclose(df["floor_area_sqm"].to_numpy(dtype=np.float64), areas)
+		on_grid &= (col >= 0) & (col < self.n_storeys) & np.isclose(pos, col, rtol=0.0, atol=1e-9)
+		if not on_grid.any():
+			return out
+		out[on_grid] = self.prices[rows[on_grid], col[on_grid].astype(np.int64)]
+		return out
+
+
+def build_price_grid(
+	pipeline: Any,
+	pairs: List[Tuple[str, str, float]],
+	storeys: np.ndarray,
+	model_sha256: Optional[str],
+	data_version: Optional[str] = None,
+) -> PriceGrid:
+	df = grid_frame(pairs, storeys)
+	prices = np.asarray(pipeline.predict(df), dtype=np.float32).reshape(len(pairs), len(storeys))
+	meta = {
+		"model_sha256": model_sha256,
+		"data_version": data_version,
+		"created_at": utc_now_str(),
+		"storey_start": float(storeys[0]),
+		"storey_step": float(storeys[1] - storeys[0]) if len(storeys) > 1 else 1.0,
+		"defaults": GRID_DEFAULTS,
+		"pairs": [[t, ft, float(a)] for t, ft, a in pairs],
+	}
+	return PriceGrid(meta, prices)
+
+
+def save_price_grid(grid: PriceGrid, path: str) -> None:
+	"""Write the matrix under a fresh name, then swap the JSON that points at it.
+
+	Readers always see a matching (meta, matrix) pair; superseded matrices are
+	removed afterwards (a reader that still maps one keeps its open file).
+	"""
+	base = os.path.splitext(path)[0]
+	npy_path = f"{base}-{uuid.uuid4().hex[:8]}.npy"
+	np.save(npy_path, np.ascontiguousarray(grid.prices, dtype=np.float32))
+	meta = {**grid.meta, "prices_file": os.path.basename(npy_path), "shape": list(grid.prices.shape)}
+	save_json(meta, path + ".tmp")
+	os.replace(path + ".tmp", path)
+	for old in glob.glob(f"{base}-*.npy"):
+		if os.path.abspath(old) != os.path.abspath(npy_path):
+			try:
+				os.remove(old)
+			except OSError:
+				pass
+
+
+def load_price_grid(path: str) -> PriceGrid:
+	with open(path, "r", encoding="utf-8") as f:
+		meta = json.load(f)
+	prices = np.load(os.path.join(os.path.dirname(path), meta["prices_file"]), mmap_mode="r")
+	if list(prices.shape) != list(meta["shape"]):
+		raise ValueError(f"Price grid matrix shape {prices.shape} does not match {meta['shape']}")
+	return PriceGrid(meta, prices)
+
+
+class PriceGridStore:
+	"""Loads the grid file on first use and again whenever it is replaced on disk."""
+
+	def __init__(self, path: str):
+		self.path = path
+		self._sig: Optional[Tuple[Any, ...]] = None
+		self._grid: Optional[PriceGrid] = None
+		self._lock = threading.Lock()
+
+	def get(self, model_sha256: Optional[str]) -> Optional[PriceGrid]:
+		"""The grid when it was built from ``model_sha256``; otherwise None."""
+		sig = file_signature(self.path)
+		if sig != self._sig:
+			with self._lock:
+				if sig != self._sig:
+					grid = None
+					if sig is not None:
+						try:
+							grid = load_price_grid(self.path)
+							logger.info(f"Loaded price grid: {len(grid)} prices for model {str(grid.model_sha256)[:12]}")
+						except Exception as e:
+							logger.warning(f"Could not load price grid: {e}")
+					self._grid, self._sig = grid, sig
+		grid = self._grid
+		if grid is None or model_sha256 is None or grid.model_sha256 != model_sha256:
+			return None
+		return grid
+
+
+def predict_with_grid(pipeline: Any, df: pd.DataFrame, grid: Optional[PriceGrid]) -> np.ndarray:
+	"""Grid lookups where possible; the model scores only the remaining rows."""
+	if grid is None:
+		return np.asarray(pipeline.predict(df), dtype=np.float64)
+	preds = grid.predict(df)
+	miss = np.isnan(preds)
+	if miss.any():
+		preds[miss] = pipeline.predict(df[miss])
+	return preds
+
+
+def precompute_price_grid(path: Optional[str] = None) -> PriceGrid:
+	"""Score the live model over every known town x flat_type x storey and save the grid."""
+	from .db import data_version
+	from .registry import get_registry
+	from .stats import get_stats_index
+
+	cfg = get_config()
+	registry = get_registry()
+	registry.refresh()
+	pipeline, sha = registry.get(), registry.version()
+	stats = get_stats_index()
+	pairs = [(town, ft, stats.median_area(town, ft)) for town, ft in stats.pairs()]
+	s = cfg.serving
+	storeys = storey_grid(s.price_grid_storey_start, s.price_grid_storey_stop, s.price_grid_storey_step)
+	grid = build_price_grid(pipeline, pairs, storeys, sha, data_version())
+	save_price_grid(grid, path or cfg.paths.price_grid_path)
+	logger.info(f"Price grid saved: {len(pairs)} town/flat-type pairs x {len(storeys)} storeys")
+	return grid
+
+
+_store: Optional[PriceGridStore] = None
+
+
+def get_price_grid(model_sha256: Optional[str]) -> Optional[PriceGrid]:
+	global _store
+	cfg = get_config()
+	if not cfg.serving.price_grid_enabled:
+		return None
+	if _store is None:
+		_store = PriceGridStore(cfg.paths.price_grid_path)
+	return _store.get(model_sha256)
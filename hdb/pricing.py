@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+# band multipliers applied to the discount: low band is discounted a bit more, high a bit less
+BAND_DISCOUNT_FACTORS = {"low": 1.1, "mid": 1.0, "high": 0.9}
+
+
+def income_needed(price, ratio: float = 0.3, years: int = 5):
+	"""Monthly household income needed for ``price``; works on scalars and arrays."""
+	return price / (years * 12 * ratio)
+
+
+def bto_bands(
+	resale: np.ndarray, discount_rate: float, interval: Optional[Tuple[np.ndarray, np.ndarray]] = None
+) -> Dict[str, np.ndarray]:
+	"""BTO low/mid/high prices for an array of predicted resale prices.
+
+	With ``interval`` (low, high resale arrays, e.g. per-tree quantiles of the forest)
+	the low/high bands are those resale bounds at the flat discount instead of the
+	fixed band factors.
+	"""
+	resale = np.asarray(resale, dtype=float)
+	if interval is not None:
+		low, high = (np.asarray(a, dtype=float) for a in interval)
+		return {label: price * (1 - discount_rate) for label, price in (("low", low), ("mid", resale), ("high", high))}
+	return {
+		label: resale * (1 - discount_rate * factor)
+		for label, factor in BAND_DISCOUNT_FACTORS.items()
+	}
+
+
+def price_columns(
+	resale: np.ndarray, discount_rate: float, interval: Optional[Tuple[np.ndarray, np.ndarray]] = None
+) -> Dict[str, np.ndarray]:
+	"""All response columns (resale, BTO bands, incomes) for a batch, computed column-wise.
+
+	``interval`` switches the bands to the model's range and adds ``predicted_resale_low/high``.
+	"""
+	bands = bto_bands(resale, discount_rate, interval)
+	cols = {"predicted_resale_price": np.asarray(resale, dtype=float)}
+	if interval is not None:
+		cols["predicted_resale_low"] = np.asarray(interval[0], dtype=float)
+		cols["predicted_resale_high"] = np.asarray(interval[1], dtype=float)
+	for label, price in bands.items():
+		cols[f"bto_price_{label}"] = price
+	for label, price in bands.items():
+		cols[f"income_{label}"] = income_needed(price)
+	return cols
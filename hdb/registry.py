@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import joblib
+
+from .compiled import load_compiled
+from .config import load_config
+from .monitoring import model_fingerprint
+from .utils import get_logger, utc_now_str
+
+
+logger = get_logger("registry")
+
+
+class ModelRegistry:
+	"""Keeps the trained pipeline resident and hot-swaps it when the artifact changes.
+
+	The artifact is stat-ed at most once per ``check_interval_s``; only when its
+	size/mtime/inode change is it re-hashed and re-loaded. The live model and its
+	metadata are replaced with a single reference assignment, so readers never
+	observe a half-swapped state.
+	"""
+
+	def __init__(
+		self,
+		path: str,
+		check_interval_s: float = 5.0,
+		compiled_path: Optional[str] = None,
+		mmap_model: bool = True,
+	):
+		self.path = path
+		self.compiled_path = compiled_path
+		self.mmap_model = mmap_model
+		self.check_interval_s = check_interval_s
+		self._current: Optional[Tuple[Any, Dict[str, Any]]] = None
+		self._stat_key: Optional[Tuple[Any, ...]] = None
+		self._last_check = 0.0
+		self._reload_lock = threading.Lock()
+
+	@staticmethod
+	def _file_key(path: Optional[str]) -> Optional[Tuple[int, int, int]]:
+		if not path:
+			return None
+		try:
+			st = os.stat(path)
+		except FileNotFoundError:
+			return None
+		return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+	def _stat(self) -> Optional[Tuple[Any, ...]]:
+		key = self._file_key(self.path)
+		if key is None:
+			return None
+		return key + (self._file_key(self.compiled_path),)
+
+	def refresh(self, force: bool = False) -> bool:
+		"""Reload the artifact if it changed on disk. Returns True when a new model went live."""
+		with self._reload_lock:
+			self._last_check = time.monotonic()
+			key = self._stat()
+			if key is None:
+				return False
+			if not force and key == self._stat_key and self._current is not None:
+				return False
+			fp = model_fingerprint(self.path)
+			current = self._current
+			compiled_changed = self._stat_key is None or key[3] != self._stat_key[3]
+			if not force and not compiled_changed and current is not None and current[1].get("sha256") == fp.get("sha256"):
+				# touched but unchanged content; keep the resident model
+				self._stat_key = key
+				return False
+			try:
+				model, kind = self._load(fp.get("sha256"))
+			except Exception as e:  # half-written artifact, keep serving the old one
+				logger.warning(f"Model reload failed, keeping current version: {e}")
+				return False
+			info = {
+				"path": self.path,
+				"sha256": fp.get("sha256"),
+				"size_bytes": key[1],
+				"predictor": kind,
+				"mmap": kind == "compiled_forest" and self.mmap_model,
+				"loaded_at": utc_now_str(),
+			}
+			self._current = (model, info)
+			self._stat_key = key
+			logger.info(f"Model {info['sha256'][:12]} is live")
+			return True
+
+	def _load(self, sha256: Optional[str]) -> Tuple[Any, str]:
+		# prefer the array-backed export when it was built from this exact pipeline
+		if self.compiled_path and os.path.exists(self.compiled_path):
+			try:
+				compiled = load_compiled(self.compiled_path, mmap=self.mmap_model)
+				if compiled.source_sha256 == sha256:
+					return compiled, "compiled_forest"
+				logger.info("Compiled forest is stale for this pipeline; using sklearn")
+			except Exception as e:
+				logger.warning(f"Could not load compiled forest: {e}")
+		return joblib.load(self.path), "sklearn_pipeline"
+
+	def _maybe_refresh(self) -> None:
+		if self._current is None or time.monotonic() - self._last_check >= self.check_interval_s:
+			self.refresh()
+
+	def get(self) -> Any:
+		self._maybe_refresh()
+		current = self._current
+		if current is None:
+			raise FileNotFoundError("Model not trained yet. Run training first.")
+		return current[0]
+
+	def version(self) -> Optional[str]:
+		self._maybe_refresh()
+		current = self._current
+		return current[1]["sha256"] if current is not None else None
+
+	def info(self) -> Dict[str, Any]:
+		self._maybe_refresh()
+		current = self._current
+		if current is None:
+			return {"loaded": False, "path": self.path}
+		return {"loaded": True, **current[1]}
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+	global _registry
+	if _registry is None:
+		with _registry_lock:
+			if _registry is None:
+				cfg = load_config()
+				_registry = ModelRegistry(
+					cfg.paths.model_path,
+					check_interval_s=cfg.serving.model_check_interval_s,
+					compiled_path=cfg.paths.compiled_model_path if cfg.serving.use_compiled_forest else None,
+					mmap_model=cfg.serving.mmap_model,
+				)
+	return _registry
@@ -1,17 +1,28 @@
 from __future__ import annotations
 
+import asyncio
 import os
-from typing import List, Dict, Tuple
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Dict, Optional, Sequence, Tuple
 
-import duckdb
-import joblib
-import numpy as np
 import pandas as pd
 
+from .analysis import BandAnalysis, analyze_bands
 from .config import load_config
-from .llm import explain_prices
+from .llm import explain_many, get_explainer
+from .price_grid import get_price_grid
+from .registry import get_registry
+from .stats import get_stats_index, recommend_towns
 from .utils import get_logger, utc_now_str
 
+try:
+	import pyarrow as pa
+except Exception:  # pragma: no cover
+	pa = None  # type: ignore
+
 
 logger = get_logger("report")
 
@@ -20,51 +31,134 @@ def _fmt_currency(x: float) -> str:
 	return f"${x:,.0f}"
 
 
-def _income_needed(price: float, ratio: float = 0.3) -> float:
-	years = 5
-	return price / (years * 12 * ratio)
+def _recommend_towns(limit: int, flat_types: List[str]) -> List[str]:
+	return [town for town, _ in recommend_towns(limit, flat_types)]
 
 
-def _default_area(flat_type: str) -> float:
-	ft = (flat_type or "").upper().strip()
-	if ft == "3 ROOM":
-		return 65.0
-	if ft == "4 ROOM":
-		return 95.0
-	return 80.0
+REPORT_FORMATS = ("md", "csv", "parquet")
 
 
-def _load_pipeline(path: str):
-	if not os.path.exists(path):
-		raise FileNotFoundError("Model not trained yet. Run training first.")
-	return joblib.load(path)
+def _render_town(town: str, flat_types: List[str], notes: Dict, quantiles: Tuple[float, float]) -> List[str]:
+	lines = [f"## {town}"]
+	for ft in flat_types:
+		if (town, ft) not in notes:
+			continue
+		r, expl = notes[(town, ft)]
+		bands, inc, ranges = r["bto_prices"], r["income"], r.get("bto_price_ranges")
+		lines.append(f"- {ft}")
+		lines.append(
+			f"  - Prices: low {_fmt_currency(bands.get('low', 0))}, mid {_fmt_currency(bands.get('mid', 0))}, high {_fmt_currency(bands.get('high', 0))}"
+		)
+		if ranges:
+			lines.append(
+				f"  - Model range (P{quantiles[0] * 100:.0f}-P{quantiles[1] * 100:.0f} across trees): "
+				+ ", ".join(f"{b} {_fmt_currency(lo)}-{_fmt_currency(hi)}" for b, (lo, hi) in ranges.items())
+			)
+		lines.append(
+			f"  - Incomes: low {_fmt_currency(inc.get('low', 0))}/mo, mid {_fmt_currency(inc.get('mid', 0))}/mo, high {_fmt_currency(inc.get('high', 0))}/mo"
+		)
+		lines.append(f"  - Note: {expl}")
+	lines.append("")
+	return lines
 
 
-def _recommend_towns(limit: int, flat_types: List[str]) -> List[str]:
+def _tmp_path(path: str) -> str:
+	# unique per writer, so concurrent reports to the same file never share a temp file
+	return f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+
+
+def save_report(text: str, path: str) -> str:
+	"""Write via a unique temp file and rename, so readers never see a partial report."""
+	os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+	tmp_path = _tmp_path(path)
+	with open(tmp_path, "w", encoding="utf-8") as f:
+		f.write(text)
+	os.replace(tmp_path, path)
+	return path
+
+
+def _write_table(df: pd.DataFrame, path: str, fmt: str) -> str:
+	tmp_path = _tmp_path(path)
+	if fmt == "csv":
+		df.to_csv(tmp_path, index=False)
+	else:
+		df.to_parquet(tmp_path, index=False)
+	os.replace(tmp_path, path)
+	return path
+
+
+def report_path(reports_dir: Optional[str] = None) -> str:
+	"""Fresh Markdown path under ``paths.reports_dir`` for one API-generated report."""
+	stamp = utc_now_str().replace("-", "").replace(":", "")
+	return os.path.join(reports_dir or load_config().paths.reports_dir, f"bto_report-{stamp}-{uuid.uuid4().hex[:8]}.md")
+
+
+def _report_header(discount_rate: float) -> List[str]:
+	return [
+		"# BTO Recommendations and Price Analysis",
+		"",
+		f"Generated: {utc_now_str()}",
+		"",
+		f"Discount rate applied to resale predictions: {int(discount_rate*100)}%",
+		"",
+	]
+
+
+@dataclass
+class ReportPlan:
+	"""Everything the report needs before the LLM notes: the resolved towns and flat types and their prices."""
+
+	towns: List[str]
+	flat_types: List[str]
+	analysis: BandAnalysis
+
+
+def plan_report(
+	towns: List[str] | None = None,
+	flat_types: List[str] | None = None,
+	low_floor: float = 5,
+	mid_floor: float = 12,
+	high_floor: float = 25,
+	limit_if_recommend: int = 5,
+	interval: bool = False,
+	all_towns: bool = False,
+) -> ReportPlan:
+	"""Resolve the towns and flat types, then score every pair x band in one model pass.
+
+	Blocking (stats, model load, scoring); any error surfaces here, before a
+	caller has started streaming.
+	"""
 	cfg = load_config()
-	con = duckdb.connect(cfg.paths.duckdb_path, read_only=True)
-	try:
-		rows = con.execute(
-			f"""
-			WITH recent AS (
-				SELECT town, flat_type, COUNT(*) AS n
-				FROM {cfg.paths.clean_table}
-				WHERE year >= 2017
-				GROUP BY town, flat_type
-			), ranked AS (
-				SELECT town, SUM(n) AS total_recent
-				FROM recent
-				WHERE flat_type IN ({', '.join(['?' for _ in flat_types])})
-				GROUP BY town
-				ORDER BY total_recent ASC NULLS FIRST
-			)
-			SELECT town FROM ranked LIMIT ?
-			""",
-			flat_types + [limit],
-		).fetchall()
-		return [r[0] for r in rows]
-	finally:
-		con.close()
+	floors = {"low": low_floor, "mid": mid_floor, "high": high_floor}
+	stats = get_stats_index()
+	if all_towns:
+		keys = stats.pairs()
+		towns = list(dict.fromkeys(town for town, _ in keys))
+		flat_types = sorted({ft for _, ft in keys})
+	else:
+		flat_types = flat_types or ["3 ROOM", "4 ROOM"]
+		if towns is None or len(towns) == 0:
+			towns = _recommend_towns(limit_if_recommend, flat_types)
+			logger.info(f"Auto-selected towns: {towns}")
+		towns = list(dict.fromkeys(towns))
+		keys = list(dict.fromkeys((town, ft) for town in towns for ft in flat_types))
+
+	registry = get_registry()
+	pipe = registry.get()
+	# median area per pair, precomputed by ETL
+	analysis = analyze_bands(
+		pipe,
+		[(town, ft, stats.median_area(town, ft)) for town, ft in keys],
+		floors,
+		cfg.training.discount_rate,
+		grid=get_price_grid(registry.version()),
+		interval_quantiles=_quantiles(cfg) if interval else None,
+	)
+	return ReportPlan(towns, flat_types, analysis)
+
+
+def _quantiles(cfg) -> Tuple[float, float]:
+	return (cfg.serving.interval_low_quantile, cfg.serving.interval_high_quantile)
 
 
 def generate_bto_report(
@@ -74,96 +168,94 @@ def generate_bto_report(
 	mid_floor: float = 12,
 	high_floor: float = 25,
 	limit_if_recommend: int = 5,
-	output_path: str = "artifacts/bto_report.md",
+	output_path: Optional[str] = "artifacts/bto_report.md",
+	interval: bool = False,
+	all_towns: bool = False,
+	formats: Sequence[str] = ("md",),
 ) -> str:
-	cfg = load_config()
-	flat_types = flat_types or ["3 ROOM", "4 ROOM"]
-	if towns is None or len(towns) == 0:
-		towns = _recommend_towns(limit_if_recommend, flat_types)
-		logger.info(f"Auto-selected towns: {towns}")
-
-	pipe = _load_pipeline(os.path.join(cfg.paths.model_dir, "rf_pipeline.joblib"))
+	"""Markdown report; ``interval`` adds each band's range across the forest's trees.
 
-	# Load median areas
-	con = duckdb.connect(cfg.paths.duckdb_path, read_only=True)
-	try:
-		areas = con.execute(
-			f"""
-			SELECT town, flat_type, median(floor_area_sqm) AS med_area
-			FROM {cfg.paths.features_table}
-			GROUP BY town, flat_type
-			"""
-		).df()
-	finally:
-		con.close()
+	``all_towns`` covers every town x flat type with transactions (``towns`` and
+	``flat_types`` are ignored). ``formats`` picks the files written next to
+	``output_path``: the Markdown itself, and a long table of every pair x band as
+	CSV and/or Parquet. Nothing is written when ``output_path`` is None. The
+	Markdown is returned either way.
+	"""
+	cfg = load_config()
+	formats = list(dict.fromkeys(formats)) if output_path else []
+	unknown = [f for f in formats if f not in REPORT_FORMATS]
+	if unknown:
+		raise ValueError(f"Unknown report formats {unknown}; expected some of {REPORT_FORMATS}")
+	if "parquet" in formats and pa is None:
+		raise ValueError("Parquet output needs pyarrow; install it or drop 'parquet' from formats")
+	t0 = time.perf_counter()
+	plan = plan_report(towns, flat_types, low_floor, mid_floor, high_floor, limit_if_recommend, interval, all_towns)
+	towns, flat_types, analysis = plan.towns, plan.flat_types, plan.analysis
+	sections = analysis.records()
 
-	rows: List[Dict] = []
-	for town in towns:
-		for ft in flat_types:
-			# choose area
-			match = areas[(areas["town"] == town) & (areas["flat_type"] == ft)]
-			if match.empty:
-				area = _default_area(ft)
-			else:
-				val = match["med_area"].iloc[0]
-				med = float(val) if pd.notna(val) else float("nan")
-				area = med if not np.isnan(med) else _default_area(ft)
-
-			for label, floor in [("low", low_floor), ("mid", mid_floor), ("high", high_floor)]:
-				rows.append({
-					"town": town,
-					"flat_type": ft,
-					"flat_model": "Improved",
-					"floor_area_sqm": float(area),
-					"lease_commence_date": 1990,
-					"storey_mid": float(floor),
-					"year": 2023,
-					"month_num": 6,
-					"_band": label,
-				})
-
-	df = pd.DataFrame(rows)
-	preds = pipe.predict(df.drop(columns=["_band"]))
-	df["predicted_resale_price"] = preds
-	disc = cfg.training.discount_rate
-	df["bto_price"] = df["predicted_resale_price"] * (1 - disc)
-	df["income"] = df["bto_price"].map(lambda x: _income_needed(float(x)))
-
-	# Build markdown
-	lines: List[str] = []
-	lines.append("# BTO Recommendations and Price Analysis")
-	lines.append("")
-	lines.append(f"Generated: {utc_now_str()}")
-	lines.append("")
-	lines.append(f"Discount rate applied to resale predictions: {int(disc*100)}%")
-	lines.append("")
+	tables = [f for f in formats if f != "md"]
+	written: List[str] = []
+	with ThreadPoolExecutor(max_workers=max(1, len(tables)), thread_name_prefix="report") as pool:
+		# the tables carry no LLM notes, so they are written while the notes are fetched
+		if tables:
+			base = os.path.splitext(output_path)[0]
+			os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+			table = analysis.frame()
+			writes = [pool.submit(_write_table, table, f"{base}.{fmt}", fmt) for fmt in tables]
+		# one concurrent, cached fan-out instead of a round trip per section
+		expls = explain_many([(r["town"], r["flat_type"], r["bto_prices"]) for r in sections])
+		if tables:
+			written = [w.result() for w in writes]
+	notes = {(r["town"], r["flat_type"]): (r, expl) for r, expl in zip(sections, expls)}
 
+	lines = _report_header(cfg.training.discount_rate)
 	for town in towns:
-		lines.append(f"## {town}")
-		for ft in flat_types:
-			g = df[(df["town"] == town) & (df["flat_type"] == ft)]
-			if g.empty:
-				continue
-			bands = {r["_band"]: float(r["bto_price"]) for _, r in g.iterrows()}
-			inc = {r["_band"]: float(r["income"]) for _, r in g.iterrows()}
-			expl = explain_prices(town, ft, {
-				"low": bands.get("low", 0.0),
-				"mid": bands.get("mid", 0.0),
-				"high": bands.get("high", 0.0),
-			})
-			lines.append(f"- {ft}")
-			lines.append(
-				f"  - Prices: low {_fmt_currency(bands.get('low', 0))}, mid {_fmt_currency(bands.get('mid', 0))}, high {_fmt_currency(bands.get('high', 0))}"
-			)
-			lines.append(
-				f"  - Incomes: low {_fmt_currency(inc.get('low', 0))}/mo, mid {_fmt_currency(inc.get('mid', 0))}/mo, high {_fmt_currency(inc.get('high', 0))}/mo"
-			)
-			lines.append(f"  - Note: {expl}")
-		lines.append("")
-
+		lines.extend(_render_town(town, flat_types, notes, _quantiles(cfg)))
 	md = "\n".join(lines)
-	os.makedirs(os.path.dirname(output_path), exist_ok=True)
-	with open(output_path, "w", encoding="utf-8") as f:
-		f.write(md)
-	logger.info(f"Report written to {output_path}")
+	if "md" in formats:
+		written.insert(0, save_report(md, output_path))
+	logger.info(
+		f"Report for {len(sections)} town/flat-type pairs x {len(analysis.bands)} bands "
+		f"in {time.perf_counter() - t0:.2f}s: {', '.join(written) or 'nothing written'}"
+	)
 	return md
+
+
+async def stream_bto_report(plan: ReportPlan, output_path: Optional[str] = None) -> AsyncIterator[str]:
+	"""Yield the report for ``plan`` as Markdown chunks: the header, then each town as soon as its notes are in.
+
+	Planning happens beforehand (``plan_report``) so a server can still answer
+	with an error status; only rendering and the LLM notes are streamed.
+	Explanations for every town are requested up front (bounded by
+	``llm.max_concurrency``, each town under the ``llm.deadline_s`` budget), so
+	town N streams while later towns are still waiting on the LLM. With
+	``output_path`` the full document is written atomically once the last town is sent.
+	"""
+	cfg = load_config()
+	towns, flat_types, analysis = plan.towns, plan.flat_types, plan.analysis
+	header = "\n".join(_report_header(cfg.training.discount_rate)) + "\n"
+	yield header
+	chunks = [header]
+
+	by_town: Dict[str, List[Dict]] = {}
+	for r in analysis.records():
+		by_town.setdefault(r["town"], []).append(r)
+	explainer = get_explainer()
+	pending = [
+		asyncio.ensure_future(explainer.explain_many_async([(r["town"], r["flat_type"], r["bto_prices"]) for r in by_town.get(town, [])]))
+		for town in towns
+	]
+	try:
+		for town, task in zip(towns, pending):
+			rows = by_town.get(town, [])
+			notes = {(r["town"], r["flat_type"]): (r, expl) for r, expl in zip(rows, await task)}
+			chunk = "\n".join(_render_town(town, flat_types, notes, _quantiles(cfg))) + "\n"
+			chunks.append(chunk)
+			yield chunk
+	finally:
+		# a client that disconnects early leaves nothing waiting on its towns
+		for task in pending:
+			task.cancel()
+	if output_path:
+		await asyncio.to_thread(save_report, "".join(chunks), output_path)
+		logger.info(f"Streamed report written to {output_path}")
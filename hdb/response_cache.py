@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from .utils import get_logger
+
+
+logger = get_logger("response_cache")
+
+_MISSING = object()
+
+
+def normalize_params(params: Dict[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+	"""Hashable, order-independent form of request parameters (lists become tuples, numbers floats)."""
+	out = []
+	for name in sorted(params):
+		value = params[name]
+		if isinstance(value, (list, tuple)):
+			value = tuple(v.strip() if isinstance(v, str) else v for v in value)
+		elif isinstance(value, bool) or value is None:
+			pass
+		elif isinstance(value, (int, float)):
+			value = float(value)
+		elif isinstance(value, str):
+			value = value.strip()
+		out.append((name, value))
+	return tuple(out)
+
+
+class ResponseCache:
+	"""Size-bounded LRU of endpoint responses for one generation, e.g. (model sha256, data version).
+
+	Callers pass the current generation on every lookup; when it differs from
+	the one the entries were computed under (retrain or re-ETL), the cache is
+	emptied before answering, so stale responses are never served.
+	"""
+
+	def __init__(self, max_entries: int = 256):
+		self.max_entries = max_entries
+		self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+		self._generation: Optional[Hashable] = None
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		self.invalidations = 0
+
+	def _sync(self, generation: Hashable) -> None:
+		if generation != self._generation:
+			if self._generation is not None:
+				self.invalidations += 1
+				logger.info(f"Model or data changed; dropping {len(self._entries)} cached responses")
+			self._entries.clear()
+			self._generation = generation
+
+	def get(self, generation: Hashable, key: Hashable) -> Any:
+		"""Cached value or ``None``."""
+		with self._lock:
+			self._sync(generation)
+			value = self._entries.get(key, _MISSING)
+			if value is _MISSING:
+				self.misses += 1
+				return None
+			self._entries.move_to_end(key)
+			self.hits += 1
+			return value
+
+	def put(self, generation: Hashable, key: Hashable, value: Any) -> None:
+		if self.max_entries <= 0:
+			return
+		with self._lock:
+			self._sync(generation)
+			self._entries[key] = value
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.max_entries:
+				self._entries.popitem(last=False)
+
+	def clear(self) -> None:
+		with self._lock:
+			self._entries.clear()
+
+	def snapshot(self) -> Dict[str, Any]:
+		total = self.hits + self.misses
+		return {
+			"entries": len(self._entries),
+			"max_entries": self.max_entries,
+			"hits": self.hits,
+			"misses": self.misses,
+			"hit_rate": (self.hits / total) if total else 0.0,
+			"invalidations": self.invalidations,
+		}
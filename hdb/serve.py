@@ -1,18 +1,36 @@
 from __future__ import annotations
 
+import io
 import os
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 
-import duckdb
-import joblib
 import numpy as np
-from fastapi import FastAPI, HTTPException, Query
+import pandas as pd
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from .analysis import analyze_bands
+from .batching import MicroBatcher
+from .compiled import predict_interval, supports_interval
 from .config import load_config
-from .llm import explain_prices
+from .db import data_version
+from .llm import explain_many_async, get_explainer
+from .monitoring import process_memory
+from .price_grid import get_price_grid
+from .pricing import price_columns
+from .registry import get_registry
+from .response_cache import ResponseCache, normalize_params
+from .stats import get_stats_index, recent_transactions, recommend_towns
 from .utils import get_logger
-from .report import generate_bto_report
+from .report import generate_bto_report, plan_report, report_path, save_report, stream_bto_report
+
+try:
+	import pyarrow as pa
+	import pyarrow.ipc  # noqa: F401
+except Exception:  # pragma: no cover
+	pa = None  # type: ignore
 
 
 logger = get_logger("api")
@@ -20,15 +38,6 @@ app = FastAPI(title="HDB BTO Pricing API", version="0.1.0")
 _cfg = load_config()
 
 
-def _default_area(flat_type: str) -> float:
-	ft = (flat_type or "").upper().strip()
-	if ft == "3 ROOM":
-		return 65.0
-	if ft == "4 ROOM":
-		return 95.0
-	return 80.0
-
-
 class PredictRequest(BaseModel):
 	town: str
 	flat_type: str
@@ -48,7 +57,17 @@ class PredictResponse(BaseModel):
 	income_low: float
 	income_mid: float
 	income_high: float
-	explanation: str
+	predicted_resale_low: Optional[float] = None
+	predicted_resale_high: Optional[float] = None
+	explanation: Optional[str] = None
+
+
+class ExplainRequest(BaseModel):
+	town: str
+	flat_type: str
+	bto_price_low: float
+	bto_price_mid: float
+	bto_price_high: float
 
 
 class BTOAnalysisRequest(BaseModel):
@@ -58,20 +77,80 @@ class BTOAnalysisRequest(BaseModel):
 	mid_floor: float = 12
 	high_floor: float = 25
 	floor_area_sqm: Optional[float] = None  # if None, use town+type median area
+	interval: bool = False  # add each band's range across the forest's trees
 
 
-MODEL_PATH = os.path.join(_cfg.paths.model_dir, "rf_pipeline.joblib")
+MODEL_PATH = _cfg.paths.model_path
+_registry = get_registry()
+_stats = get_stats_index()
 
 
 def _load_pipeline():
-	if not os.path.exists(MODEL_PATH):
-		raise FileNotFoundError("Model not trained yet. Run training first.")
-	return joblib.load(MODEL_PATH)
+	return _registry.get()
+
+
+def _predict_frame(df):
+	return _load_pipeline().predict(df)
+
+
+def _interval_quantiles():
+	return (_cfg.serving.interval_low_quantile, _cfg.serving.interval_high_quantile)
+
+
+def _predict_interval_frame(df):
+	# (n, 3): forest mean, low and high quantile of the per-tree predictions
+	return predict_interval(_load_pipeline(), df, _interval_quantiles())
+
+
+async def _check_interval(interval: bool) -> None:
+	"""422 before any work when interval mode is asked of a model without per-tree predictions."""
+	if not interval:
+		return
+	try:
+		pipe = await run_in_threadpool(_load_pipeline)
+	except FileNotFoundError as e:
+		raise HTTPException(status_code=503, detail=str(e))
+	if not supports_interval(pipe):
+		model = getattr(pipe, "named_steps", {}).get("model", pipe)
+		raise HTTPException(
+			status_code=422, detail=f"interval unavailable: {type(model).__name__} has no per-tree predictions"
+		)
 
 
-def _income_needed(price: float, ratio: float = 0.3) -> float:
-	years = 5
-	return price / (years * 12 * ratio)
+_responses = ResponseCache(_cfg.serving.response_cache_size if _cfg.serving.response_cache_enabled else 0)
+# /recommend reads only the activity table, so a retrain must not flush it
+_data_responses = ResponseCache(_cfg.serving.response_cache_size if _cfg.serving.response_cache_enabled else 0)
+
+
+def _cache_generation():
+	"""Retrain changes the sha256, re-ETL changes the data version; either empties the cache.
+
+	May hash and load a new model or reopen the database, so async handlers call it
+	through ``run_in_threadpool``.
+	"""
+	return (_registry.version(), data_version())
+
+
+_batcher = MicroBatcher(
+	_predict_frame,
+	max_batch_size=_cfg.serving.batch_max_size,
+	max_wait_ms=_cfg.serving.batch_max_wait_ms,
+)
+_interval_batcher = MicroBatcher(
+	_predict_interval_frame,
+	max_batch_size=_cfg.serving.batch_max_size,
+	max_wait_ms=_cfg.serving.batch_max_wait_ms,
+)
+
+
+@app.on_event("startup")
+def _warm_model():
+	if not _registry.refresh():
+		logger.warning(f"No model loaded at startup ({MODEL_PATH}); train first")
+	try:
+		_stats.refresh()
+	except Exception as e:
+		logger.warning(f"Stats index not loaded at startup: {e}")
 
 
 @app.get("/health")
@@ -79,6 +158,46 @@ def health():
 	return {"status": "ok"}
 
 
+@app.get("/admin/model")
+def admin_model():
+	return _registry.info()
+
+
+@app.get("/admin/memory")
+def admin_memory():
+	"""Memory of the worker that answered; call repeatedly to sample each worker."""
+	return {**process_memory(), "model": _registry.info()}
+
+
+@app.get("/admin/batching")
+def admin_batching():
+	return {
+		"enabled": _cfg.serving.batching_enabled,
+		"max_batch_size": _batcher.max_batch_size,
+		"max_wait_ms": _batcher.max_wait_s * 1000.0,
+		**_batcher.stats.snapshot(),
+	}
+
+
+@app.get("/admin/cache")
+def admin_cache():
+	expl_cache = get_explainer().cache
+	return {
+		"responses": _responses.snapshot(),
+		"data_responses": _data_responses.snapshot(),
+		"llm": {
+			**(expl_cache.snapshot() if expl_cache is not None else {}),
+			"fallbacks": get_explainer().fallbacks,
+		},
+	}
+
+
+@app.post("/admin/model/reload")
+def admin_model_reload(force: bool = False):
+	swapped = _registry.refresh(force=force)
+	return {"swapped": swapped, **_registry.info()}
+
+
 @app.get("/metrics")
 def metrics():
 	try:
@@ -90,8 +209,11 @@ def metrics():
 
 
 @app.post("/predict", response_model=PredictResponse)
-def predict(req: PredictRequest):
-	pipe = _load_pipeline()
+async def predict(
+	req: PredictRequest,
+	explain: bool = Query(True, description="Include the LLM explanation; false returns the numbers only (see /explain)"),
+	interval: bool = Query(False, description="Take the low/high bands from the spread of the forest's trees instead of fixed discount factors"),
+):
 	row = {
 		"town": req.town,
 		"flat_type": req.flat_type,
@@ -102,164 +224,345 @@ def predict(req: PredictRequest):
 		"year": req.year or 2023,
 		"month_num": req.month_num or 6,
 	}
-	import pandas as pd
-	df = pd.DataFrame([row])
-	pred = float(pipe.predict(df)[0])
-
+	await _check_interval(interval)
+	bounds = None
+	try:
+		if interval:
+			if _cfg.serving.batching_enabled:
+				pred, low, high = await _interval_batcher.submit(row)
+			else:
+				pred, low, high = (await run_in_threadpool(_predict_interval_frame, pd.DataFrame([row])))[0]
+			bounds = (np.array([low]), np.array([high]))
+		elif _cfg.serving.batching_enabled:
+			pred = await _batcher.submit(row)
+		else:
+			pred = float((await run_in_threadpool(_predict_frame, pd.DataFrame([row])))[0])
+	except FileNotFoundError as e:
+		raise HTTPException(status_code=503, detail=str(e))
+
+	cols = {k: float(v[0]) for k, v in price_columns(np.array([pred]), _cfg.training.discount_rate, bounds).items()}
+	bands = {"low": cols["bto_price_low"], "mid": cols["bto_price_mid"], "high": cols["bto_price_high"]}
+
+	if not explain:
+		return PredictResponse(**cols)
+	expl = await get_explainer().explain_async(req.town, req.flat_type, bands)
+	return PredictResponse(**cols, explanation=expl)
+
+
+@app.post("/explain")
+async def explain(req: ExplainRequest):
+	"""Explanation for a /predict result fetched with ``explain=false``."""
+	bands = {"low": req.bto_price_low, "mid": req.bto_price_mid, "high": req.bto_price_high}
+	return {"explanation": await get_explainer().explain_async(req.town, req.flat_type, bands)}
+
+
+NDJSON = "application/x-ndjson"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+# columns sent back from /predict_batch, in order; an input "id" column is echoed first
+BATCH_OUTPUT_COLUMNS = [
+	"predicted_resale_price",
+	"bto_price_low",
+	"bto_price_mid",
+	"bto_price_high",
+	"income_low",
+	"income_mid",
+	"income_high",
+]
+
+
+def _batch_frame(df: pd.DataFrame) -> pd.DataFrame:
+	"""Validate and default a columnar batch against PredictRequest's schema without per-row models."""
+	fields = PredictRequest.model_fields
+	missing = [name for name, f in fields.items() if f.is_required() and name not in df.columns]
+	if missing:
+		raise HTTPException(422, detail=f"missing required columns: {missing}")
+	out = pd.DataFrame(index=df.index)
+	for name in ("town", "flat_type", "flat_model"):
+		out[name] = df[name].astype(object) if name in df.columns else None
+	for name in ("floor_area_sqm", "storey_mid", "lease_commence_date", "year", "month_num"):
+		out[name] = pd.to_numeric(df[name], errors="coerce") if name in df.columns else np.nan
+	if out[["town", "flat_type"]].isna().any().any() or out[["floor_area_sqm", "storey_mid"]].isna().any().any():
+		raise HTTPException(422, detail="town, flat_type, floor_area_sqm and storey_mid must be set on every row")
+	# same defaults as /predict (falsy values fall back, mirroring `x or default`)
+	out["flat_model"] = out["flat_model"].where(out["flat_model"].notna() & (out["flat_model"] != ""), "Improved")
+	out["lease_commence_date"] = out["lease_commence_date"].replace(0, np.nan).fillna(1990)
+	out["year"] = out["year"].replace(0, np.nan).fillna(fields["year"].default)
+	out["month_num"] = out["month_num"].replace(0, np.nan).fillna(fields["month_num"].default)
+	if "id" in df.columns:
+		out.insert(0, "id", df["id"])
+	return out
+
+
+async def _read_batch(request: Request) -> pd.DataFrame:
+	ctype = (request.headers.get("content-type") or "application/json").split(";")[0].strip().lower()
+	body = await request.body()
+	if ctype == ARROW_STREAM:
+		if pa is None:
+			raise HTTPException(415, detail="pyarrow is not installed; send JSON or NDJSON")
+		return pa.ipc.open_stream(body).read_pandas()
+	if ctype == NDJSON:
+		return pd.read_json(io.BytesIO(body), lines=True, dtype=False) if body.strip() else pd.DataFrame()
+	import json
+	payload = json.loads(body or b"[]")
+	rows = payload.get("rows", []) if isinstance(payload, dict) else payload
+	return pd.DataFrame.from_records(rows)
+
+
+def _score_chunks(df: pd.DataFrame, chunk_rows: int) -> Iterator[pd.DataFrame]:
+	pipe = _load_pipeline()
 	disc = _cfg.training.discount_rate
-	low = pred * (1 - disc * 1.1)
-	mid = pred * (1 - disc)
-	high = pred * (1 - disc * 0.9)
-
-	income_low = _income_needed(low)
-	income_mid = _income_needed(mid)
-	income_high = _income_needed(high)
-
-	expl = explain_prices(req.town, req.flat_type, {"low": low, "mid": mid, "high": high})
-
-	return PredictResponse(
-		predicted_resale_price=pred,
-		bto_price_low=low,
-		bto_price_mid=mid,
-		bto_price_high=high,
-		income_low=income_low,
-		income_mid=income_mid,
-		income_high=income_high,
-		explanation=expl,
-	)
+	features = [c for c in df.columns if c != "id"]
+	for start in range(0, len(df), chunk_rows):
+		chunk = df.iloc[start:start + chunk_rows]
+		cols = price_columns(pipe.predict(chunk[features]), disc)
+		out = pd.DataFrame(cols, index=chunk.index)[BATCH_OUTPUT_COLUMNS]
+		if "id" in chunk.columns:
+			out.insert(0, "id", chunk["id"].to_numpy())
+		yield out
+
+
+def _ndjson_stream(df: pd.DataFrame, chunk_rows: int) -> Iterator[bytes]:
+	for out in _score_chunks(df, chunk_rows):
+		if not out.empty:
+			yield (out.to_json(orient="records", lines=True).rstrip("\n") + "\n").encode("utf-8")
+
+
+def _arrow_stream(df: pd.DataFrame, chunk_rows: int) -> Iterator[bytes]:
+	sink = io.BytesIO()
+	writer = None
+	for out in _score_chunks(df, chunk_rows):
+		batch = pa.RecordBatch.from_pandas(out, preserve_index=False)
+		if writer is None:
+			writer = pa.ipc.new_stream(sink, batch.schema)
+		writer.write_batch(batch)
+		yield sink.getvalue()
+		sink.seek(0)
+		sink.truncate()
+	if writer is not None:
+		writer.close()
+		yield sink.getvalue()
+
+
+@app.post("/predict_batch")
+async def predict_batch(request: Request, format: Optional[str] = Query(None, description="ndjson or arrow; defaults to the Accept header, then ndjson")):
+	fmt = (format or "").lower()
+	if not fmt:
+		fmt = "arrow" if ARROW_STREAM in (request.headers.get("accept") or "") else "ndjson"
+	if fmt not in ("ndjson", "arrow"):
+		raise HTTPException(422, detail="format must be ndjson or arrow")
+	if fmt == "arrow" and pa is None:
+		raise HTTPException(415, detail="pyarrow is not installed; use format=ndjson")
+	try:
+		df = _batch_frame(await _read_batch(request))
+	except HTTPException:
+		raise
+	except Exception as e:
+		raise HTTPException(422, detail=f"could not parse batch: {e}")
+	try:
+		await run_in_threadpool(_load_pipeline)
+	except FileNotFoundError as e:
+		raise HTTPException(status_code=503, detail=str(e))
+	chunk_rows = _cfg.serving.predict_batch_chunk_rows
+	if fmt == "arrow":
+		return StreamingResponse(_arrow_stream(df, chunk_rows), media_type=ARROW_STREAM)
+	return StreamingResponse(_ndjson_stream(df, chunk_rows), media_type=NDJSON)
 
 
 @app.get("/recommend")
 def recommend(
 	limit: int = Query(5, ge=1, le=20),
 	flat_types: List[str] = Query(["3 ROOM", "4 ROOM"]),
+	window_months: Optional[int] = Query(None, ge=1, description="Rolling window; defaults to serving.recommend_window_months"),
 ):
-	con = duckdb.connect(_cfg.paths.duckdb_path, read_only=True)
-	try:
-		result = con.execute(
-			f"""
-			WITH recent AS (
-				SELECT town, flat_type, COUNT(*) AS n
-				FROM {_cfg.paths.clean_table}
-				WHERE year >= 2017
-				GROUP BY town, flat_type
-			), ranked AS (
-				SELECT town, SUM(n) AS total_recent
-				FROM recent
-				WHERE flat_type IN ({', '.join(['?' for _ in flat_types])})
-				GROUP BY town
-				ORDER BY total_recent ASC NULLS FIRST
-			)
-			SELECT town, total_recent FROM ranked LIMIT ?
-			""",
-			flat_types + [limit],
-		).fetchall()
-	finally:
-		con.close()
-
-	return {"limit": limit, "flat_types": flat_types, "towns": result}
+	window = window_months or _cfg.serving.recommend_window_months
+	gen = data_version()
+	key = ("recommend", normalize_params({"limit": limit, "flat_types": flat_types, "window_months": window}))
+	cached = _data_responses.get(gen, key)
+	if cached is not None:
+		return cached
+	result = recommend_towns(limit, flat_types, window)
+	resp = {"limit": limit, "flat_types": flat_types, "window_months": window, "towns": result}
+	_data_responses.put(gen, key, resp)
+	return resp
+
+
+@app.get("/transactions")
+def transactions(
+	town: str = Query(..., description="Town name, e.g. TAMPINES"),
+	flat_type: Optional[str] = Query(None),
+	since_year: Optional[int] = Query(None, ge=1990, description="Only transactions from this year on"),
+	limit: int = Query(50, ge=1, le=1000),
+):
+	source, rows = recent_transactions(town, flat_type, since_year, limit)
+	return {"town": town, "source": source, "count": len(rows), "rows": rows}
+
+
+def _bto_results(req: BTOAnalysisRequest) -> List[Dict]:
+	pipe = _load_pipeline()
+	# sorted unique pairs: the response is ordered by town, then flat type
+	pairs = [
+		(town, ft, float(req.floor_area_sqm if req.floor_area_sqm is not None else _stats.median_area(town, ft)))
+		for town, ft in sorted({(t, ft) for t in req.towns for ft in req.flat_types})
+	]
+	analysis = analyze_bands(
+		pipe,
+		pairs,
+		{"low": req.low_floor, "mid": req.mid_floor, "high": req.high_floor},
+		_cfg.training.discount_rate,
+		grid=get_price_grid(_registry.version()),
+		interval_quantiles=_interval_quantiles() if req.interval else None,
+	)
+	return analysis.records()
 
 
 @app.post("/bto_analysis")
-def bto_analysis(req: BTOAnalysisRequest):
+async def bto_analysis(
+	req: BTOAnalysisRequest,
+	explain: bool = Query(True, description="Include LLM explanations"),
+):
+	await _check_interval(req.interval)
 	try:
-		pipe = _load_pipeline()
-		import pandas as pd
-		con = duckdb.connect(_cfg.paths.duckdb_path, read_only=True)
-		try:
-			areas = con.execute(
-				f"""
-				SELECT town, flat_type, median(floor_area_sqm) AS med_area
-				FROM {_cfg.paths.features_table}
-				GROUP BY town, flat_type
-				"""
-			).df()
-		finally:
-			con.close()
-
-		rows = []
-		for town in req.towns:
-			for ft in req.flat_types:
-				area = req.floor_area_sqm
-				if area is None:
-					match = areas[(areas["town"] == town) & (areas["flat_type"] == ft)]
-					if match.empty:
-						area = _default_area(ft)
-					else:
-						med = float(match["med_area"].iloc[0]) if match["med_area"].notna().iloc[0] else float("nan")
-						area = med if not np.isnan(med) else _default_area(ft)
-
-				for label, floor in [("low", req.low_floor), ("mid", req.mid_floor), ("high", req.high_floor)]:
-					row = {
-						"town": town,
-						"flat_type": ft,
-						"flat_model": "Improved",
-						"floor_area_sqm": float(area),
-						"lease_commence_date": 1990,
-						"storey_mid": float(floor),
-						"year": 2023,
-						"month_num": 6,
-						"_band": label,
-					}
-					rows.append(row)
-
-		df = pd.DataFrame(rows)
-		preds = pipe.predict(df.drop(columns=["_band"]))
-		df["predicted_resale_price"] = preds
-		disc = _cfg.training.discount_rate
-		df["bto_price"] = df["predicted_resale_price"] * (1 - disc)
-		df["income"] = df["bto_price"].map(lambda x: _income_needed(float(x)))
-
-		# aggregate by town+flat_type
-		out = []
-		for (town, ft), g in df.groupby(["town", "flat_type"]):
-			bands = {r["_band"]: float(r["bto_price"]) for _, r in g.iterrows()}
-			expl = explain_prices(town, ft, {
-				"low": bands.get("low", 0.0),
-				"mid": bands.get("mid", 0.0),
-				"high": bands.get("high", 0.0),
-			})
-			out.append({
-				"town": town,
-				"flat_type": ft,
-				"bto_prices": bands,
-				"income": {
-					"low": float(g[g["_band"] == "low"]["income"].iloc[0]),
-					"mid": float(g[g["_band"] == "mid"]["income"].iloc[0]),
-					"high": float(g[g["_band"] == "high"]["income"].iloc[0]),
-				},
-				"explanation": expl,
-			})
-
-		return {"results": out}
+		gen = await run_in_threadpool(_cache_generation)
+		params = dict(req)
+		# results come back grouped and sorted, so request order does not matter
+		params["towns"] = sorted(set(req.towns))
+		params["flat_types"] = sorted(set(req.flat_types))
+		key = ("bto_analysis", normalize_params({**params, "explain": explain}))
+		cached = _responses.get(gen, key)
+		if cached is not None:
+			return cached
+
+		explainer = get_explainer()
+		fallbacks = explainer.fallbacks
+		out = await run_in_threadpool(_bto_results, req)
+		if explain:
+			expls = await explain_many_async([
+				(r["town"], r["flat_type"], {b: r["bto_prices"].get(b, 0.0) for b in ("low", "mid", "high")})
+				for r in out
+			])
+			for r, expl in zip(out, expls):
+				r["explanation"] = expl
+		resp = {"results": out}
+		if req.interval:
+			resp["interval_quantiles"] = list(_interval_quantiles())
+		# don't pin template text from an LLM outage until the next retrain
+		if explainer.fallbacks == fallbacks:
+			_responses.put(gen, key, resp)
+		return resp
 	except Exception as e:
 		logger.exception("bto_analysis failed")
 		raise HTTPException(status_code=500, detail=f"bto_analysis error: {e}")
 
 
 @app.get("/report_md")
-
-def report_md(
+async def report_md(
 	towns: Optional[str] = Query(None, description="Comma-separated towns; if omitted, auto-recommend"),
 	flat_types: str = Query("3 ROOM,4 ROOM"),
 	low_floor: float = 5,
 	mid_floor: float = 12,
 	high_floor: float = 25,
 	limit: int = 5,
+	interval: bool = Query(False, description="Add each band's range across the forest's trees"),
+	save: bool = Query(False, description="Also write the report to a new file under paths.reports_dir"),
 ):
+	await _check_interval(interval)
 	try:
 		town_list = [t.strip() for t in towns.split(",")] if towns else None
 		ft_list = [t.strip() for t in flat_types.split(",")]
-		md = generate_bto_report(
+		gen = await run_in_threadpool(_cache_generation)
+		key = ("report_md", normalize_params({
+			"towns": town_list or [],
+			"flat_types": ft_list,
+			"low_floor": low_floor,
+			"mid_floor": mid_floor,
+			"high_floor": high_floor,
+			"limit": limit if not town_list else 0,
+			"interval": interval,
+		}))
+		cached = _responses.get(gen, key)
+		if cached is not None:
+			if not save:
+				return cached
+			path = await run_in_threadpool(save_report, cached["markdown"], report_path())
+			return {**cached, "path": path}
+
+		explainer = get_explainer()
+		fallbacks = explainer.fallbacks
+		path = report_path() if save else None
+		md = await run_in_threadpool(
+			generate_bto_report,
 			towns=town_list,
 			flat_types=ft_list,
 			low_floor=low_floor,
 			mid_floor=mid_floor,
 			high_floor=high_floor,
 			limit_if_recommend=limit,
-			output_path="artifacts/bto_report.md",
+			output_path=path,
+			interval=interval,
 		)
-		return {"markdown": md}
+		resp = {"markdown": md}
+		if explainer.fallbacks == fallbacks:
+			_responses.put(gen, key, resp)
+		return {**resp, "path": path} if path else resp
 	except Exception as e:
 		logger.exception("report_md failed")
 		raise HTTPException(status_code=500, detail=f"report_md error: {e}")
+
+
+SSE = "text/event-stream"
+
+
+async def _sse_events(chunks, path: Optional[str]):
+	async for chunk in chunks:
+		yield "event: section\n" + "".join(f"data: {line}\n" for line in chunk.rstrip("\n").split("\n")) + "\n"
+	yield f"event: done\ndata: {path or ''}\n\n"
+
+
+@app.get("/report_md/stream")
+async def report_md_stream(
+	request: Request,
+	towns: Optional[str] = Query(None, description="Comma-separated towns; if omitted, auto-recommend"),
+	flat_types: str = Query("3 ROOM,4 ROOM"),
+	low_floor: float = 5,
+	mid_floor: float = 12,
+	high_floor: float = 25,
+	limit: int = 5,
+	interval: bool = Query(False, description="Add each band's range across the forest's trees"),
+	save: bool = Query(False, description="Also write the report to a new file under paths.reports_dir"),
+	format: Optional[str] = Query(None, description="markdown (chunked) or sse; defaults to the Accept header"),
+):
+	"""The /report_md document sent town by town as each town's notes arrive.
+
+	Chunked ``text/markdown`` by default; server-sent events (one ``section`` event per
+	chunk, then ``done`` with the saved path) for ``format=sse`` or ``Accept: text/event-stream``.
+	"""
+	fmt = (format or ("sse" if SSE in (request.headers.get("accept") or "") else "markdown")).lower()
+	if fmt not in ("markdown", "sse"):
+		raise HTTPException(422, detail="format must be markdown or sse")
+	await _check_interval(interval)
+	try:
+		# planned before the response starts: once streaming begins the status code can no longer change
+		plan = await run_in_threadpool(
+			plan_report,
+			towns=[t.strip() for t in towns.split(",")] if towns else None,
+			flat_types=[t.strip() for t in flat_types.split(",")],
+			low_floor=low_floor,
+			mid_floor=mid_floor,
+			high_floor=high_floor,
+			limit_if_recommend=limit,
+			interval=interval,
+		)
+	except FileNotFoundError as e:
+		raise HTTPException(status_code=503, detail=str(e))
+	except Exception as e:
+		logger.exception("report_md/stream failed")
+		raise HTTPException(status_code=500, detail=f"report_md error: {e}")
+
+	path = report_path() if save else None
+	chunks = stream_bto_report(plan, output_path=path)
+	headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+	if path:
+		headers["X-Report-Path"] = path
+	if fmt == "sse":
+		return StreamingResponse(_sse_events(chunks, path), media_type=SSE, headers=headers)
+	return StreamingResponse(chunks, media_type="text/markdown; charset=utf-8", headers=headers)
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import math
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import duckdb
+
+from .config import get_config
+from .db import data_version, read_cursor
+from .lake import lake_cursor, lake_relation
+from .utils import get_logger
+
+
+logger = get_logger("stats")
+
+STATS_COLUMNS = ["n", "med_area", "price_p25", "price_p50", "price_p75", "min_year", "max_year"]
+
+
+def default_area(flat_type: str) -> float:
+	ft = (flat_type or "").upper().strip()
+	if ft == "3 ROOM":
+		return 65.0
+	if ft == "4 ROOM":
+		return 95.0
+	return 80.0
+
+
+class TownStatsIndex:
+	"""In-memory (town, flat_type) -> stats dict built from ETL's stats table.
+
+	Reloaded only when the ETL data version changes, so per-request lookups are
+	plain dict gets instead of a median GROUP BY over the features table.
+	"""
+
+	def __init__(self):
+		self._version: Optional[str] = None
+		self._stats: Dict[Tuple[str, str], Dict[str, Any]] = {}
+		self._lock = threading.Lock()
+
+	def _load(self) -> Dict[Tuple[str, str], Dict[str, Any]]:
+		cfg = get_config()
+		cols = ", ".join(STATS_COLUMNS)
+		with read_cursor() as con:
+			try:
+				rows = con.execute(f"SELECT town, flat_type, {cols} FROM {cfg.paths.stats_table}").fetchall()
+			except duckdb.CatalogException:
+				# database predates the stats table: aggregate once for this data version
+				logger.warning(f"{cfg.paths.stats_table} missing; re-run ETL. Aggregating features once instead.")
+				rows = con.execute(
+					f"""
+					SELECT town, flat_type, COUNT(*), median(floor_area_sqm),
+					       quantile_cont(resale_price, 0.25), median(resale_price), quantile_cont(resale_price, 0.75),
+					       MIN(year), MAX(year)
+					FROM {cfg.paths.features_table}
+					GROUP BY town, flat_type
+					"""
+				).fetchall()
+		return {(r[0], r[1]): dict(zip(STATS_COLUMNS, r[2:])) for r in rows}
+
+	def refresh(self) -> bool:
+		version = data_version()
+		if version == self._version:
+			return False
+		with self._lock:
+			if version == self._version:
+				return False
+			self._stats = self._load()
+			self._version = version
+			logger.info(f"Loaded stats for {len(self._stats)} town/flat-type pairs (data version {version})")
+			return True
+
+	@property
+	def version(self) -> Optional[str]:
+		return self._version
+
+	def get(self, town: str, flat_type: str) -> Optional[Dict[str, Any]]:
+		self.refresh()
+		return self._stats.get((town, flat_type))
+
+	def median_area(self, town: str, flat_type: str) -> float:
+		"""Median floor area for the pair, or the flat-type default when unknown."""
+		row = self.get(town, flat_type)
+		med = row.get("med_area") if row else None
+		if med is None or (isinstance(med, float) and math.isnan(med)):
+			return default_area(flat_type)
+		return float(med)
+
+	def pairs(self) -> List[Tuple[str, str]]:
+		self.refresh()
+		return sorted(self._stats)
+
+	def towns(self) -> List[str]:
+		self.refresh()
+		return sorted({town for town, _ in self._stats})
+
+
+def recommend_towns(
+	limit: int,
+	flat_types: List[str],
+	window_months: Optional[int] = None,
+) -> List[Tuple[str, int]]:
+	"""Towns with the fewest transactions of ``flat_types`` over the last ``window_months`` of data.
+
+	Runs against ETL's monthly activity rollup (a few thousand rows), so the
+	cost does not grow with the transaction table. The window ends at the latest
+	month present in the data.
+	"""
+	cfg = get_config()
+	window = window_months or cfg.serving.recommend_window_months
+	table = cfg.paths.activity_table
+	with read_cursor() as con:
+		return con.execute(
+			f"""
+			WITH bounds AS (
+				SELECT MAX(year * 12 + month_num) AS last_idx FROM {table}
+			), recent AS (
+				SELECT town, SUM(n) AS total_recent
+				FROM {table}, bounds
+				WHERE year * 12 + month_num > last_idx - ?
+				  AND flat_type IN ({', '.join(['?' for _ in flat_types])})
+				GROUP BY town
+			)
+			SELECT town, CAST(total_recent AS BIGINT) FROM recent
+			ORDER BY total_recent ASC NULLS FIRST, town
+			LIMIT ?
+			""",
+			[window] + flat_types + [limit],
+		).fetchall()
+
+
+TRANSACTION_COLUMNS = [
+	"month", "town", "flat_type", "flat_model", "storey_range", "block", "street_name",
+	"floor_area_sqm", "lease_commence_date", "resale_price",
+]
+
+
+def recent_transactions(
+	town: str,
+	flat_type: Optional[str] = None,
+	since_year: Optional[int] = None,
+	limit: int = 50,
+) -> Tuple[str, List[Dict[str, Any]]]:
+	"""Latest cleaned transactions in ``town``, newest first; returns (source, rows).
+
+	Served from the Parquet lake when it is exported: the town and year filters
+	prune whole partition directories, and the query never opens the DuckDB file
+	ETL writes. Falls back to the clean table otherwise.
+	"""
+	cfg = get_config()
+	where, params = ["town = ?"], [town]
+	if since_year is not None:
+		where.append("year >= ?")
+		params.append(since_year)
+	if flat_type is not None:
+		where.append("flat_type = ?")
+		params.append(flat_type)
+	relation = lake_relation(cfg.paths.clean_table)
+	source = "lake" if relation is not None else "duckdb"
+	sql = (
+		f"SELECT {', '.join(TRANSACTION_COLUMNS)} FROM {relation or cfg.paths.clean_table} "
+		f"WHERE {' AND '.join(where)} ORDER BY txn_date DESC, resale_price DESC LIMIT ?"
+	)
+	with (lake_cursor() if relation is not None else read_cursor()) as con:
+		rows = con.execute(sql, params + [limit]).fetchall()
+	return source, [dict(zip(TRANSACTION_COLUMNS, r)) for r in rows]
+
+
+_index: Optional[TownStatsIndex] = None
+
+
+def get_stats_index() -> TownStatsIndex:
+	global _index
+	if _index is None:
+		_index = TownStatsIndex()
+	return _index
@@ -1,67 +1,252 @@
 from __future__ import annotations
 
+import itertools
 import os
-from typing import Dict, Tuple
+import tempfile
+import time
+from dataclasses import replace
+from typing import Any, Dict, List, Optional, Tuple
 
 import joblib
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
 from sklearn.metrics import mean_absolute_error, r2_score
 from sklearn.model_selection import train_test_split
 from sklearn.pipeline import Pipeline
 
-from .config import load_config
-from .features import build_preprocessor, load_training_dataframe
+from .bench import serving_cost
+from .compiled import compile_pipeline, save_compiled
+from .config import ProjectConfig, load_config
+from .features import (
+	CATEGORICAL,
+	TrainingData,
+	load_training_data,
+	onehot_design,
+	ordinal_design,
+)
+from .monitoring import file_hash
 from .utils import get_logger, save_json, utc_now_str
 
 
 logger = get_logger("train")
 
+# rows used to time single-row latency and batch throughput
+_PROBE_ROWS = 1000
 
-def train_model() -> Tuple[str, Dict]:
-	cfg = load_config()
-	df = load_training_dataframe()
-	y = df[cfg.training.target].values
-	X = df.drop(columns=[cfg.training.target])
 
-	preprocessor = build_preprocessor(df)
+MODEL_TYPES = ("RandomForestRegressor", "HistGradientBoostingRegressor")
+
+
+def _model_params(cfg: ProjectConfig, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+	t = cfg.training
+	if t.model_type == "HistGradientBoostingRegressor":
+		out = {
+			"max_iter": t.hgb_max_iter,
+			"learning_rate": t.hgb_learning_rate,
+			"max_leaf_nodes": t.hgb_max_leaf_nodes,
+		}
+	else:
+		out = {
+			"n_estimators": t.n_estimators,
+			"max_depth": t.max_depth,
+			"min_samples_leaf": t.min_samples_leaf,
+		}
+	out.update(params or {})
+	return out
+
 
+def _build_model(cfg: ProjectConfig, params: Dict[str, Any]):
 	if cfg.training.model_type == "RandomForestRegressor":
-		model = RandomForestRegressor(
-			n_estimators=cfg.training.n_estimators,
-			max_depth=cfg.training.max_depth,
+		return RandomForestRegressor(
+			**params,
 			random_state=cfg.training.random_state,
 			n_jobs=-1,
 		)
-	else:
-		raise ValueError("Unsupported model_type")
+	if cfg.training.model_type == "HistGradientBoostingRegressor":
+		# categories stay single integer columns and are split natively, no one-hot expansion
+		return HistGradientBoostingRegressor(
+			**params,
+			categorical_features=list(range(len(CATEGORICAL))),
+			random_state=cfg.training.random_state,
+		)
+	raise ValueError(f"Unsupported model_type {cfg.training.model_type!r}; expected one of {MODEL_TYPES}")
 
-	pipeline = Pipeline(steps=[("preprocess", preprocessor), ("model", model)])
 
-	X_train, X_test, y_train, y_test = train_test_split(
-		X, y, test_size=cfg.training.test_size, random_state=cfg.training.random_state
+def _design(cfg: ProjectConfig):
+	return onehot_design if cfg.training.model_type == "RandomForestRegressor" else ordinal_design
+
+
+def _fit_pipeline(
+	cfg: ProjectConfig, data: TrainingData, train_idx: np.ndarray, params: Dict[str, Any]
+) -> Tuple[Pipeline, float]:
+	"""Fit the model on the compact design matrix of ``train_idx``; returns the serving pipeline
+	(fitted preprocessor + model) and the model fit time in seconds."""
+	model = _build_model(cfg, params)
+	X, preprocessor = _design(cfg)(data, train_idx)
+	t0 = time.perf_counter()
+	model.fit(X, data.y[train_idx])
+	fit_s = time.perf_counter() - t0
+	return Pipeline(steps=[("preprocess", preprocessor), ("model", model)]), fit_s
+
+
+def _predict_rows(cfg: ProjectConfig, pipeline: Pipeline, data: TrainingData, idx: np.ndarray) -> np.ndarray:
+	X, _ = _design(cfg)(data, idx, pipeline.named_steps["preprocess"])
+	return pipeline.named_steps["model"].predict(X)
+
+
+def _split(cfg: ProjectConfig, data: TrainingData) -> Tuple[np.ndarray, np.ndarray]:
+	"""Train/test row indices (the same partition ``train_test_split`` gives on the full frame)."""
+	return train_test_split(
+		np.arange(len(data)), test_size=cfg.training.test_size, random_state=cfg.training.random_state
 	)
-	pipeline.fit(X_train, y_train)
 
-	preds = pipeline.predict(X_test)
+
+def train_model(params: Optional[Dict[str, Any]] = None, extra_metrics: Optional[Dict[str, Any]] = None) -> Tuple[str, Dict]:
+	"""Fit, evaluate and save the serving model. ``params`` overrides the model settings from config."""
+	cfg = load_config()
+	data = load_training_data()
+	params = _model_params(cfg, params)
+	train_idx, test_idx = _split(cfg, data)
+	pipeline, fit_s = _fit_pipeline(cfg, data, train_idx, params)
+
+	y_test = data.y[test_idx]
+	preds = _predict_rows(cfg, pipeline, data, test_idx)
 	mae = float(mean_absolute_error(y_test, preds))
 	r2 = float(r2_score(y_test, preds))
+	with tempfile.TemporaryDirectory() as workdir:
+		cost = serving_cost(pipeline, data.frame(test_idx[:_PROBE_ROWS]), workdir)
 	metrics = {
 		"timestamp": utc_now_str(),
-		"n_train": int(len(X_train)),
-		"n_test": int(len(X_test)),
+		"n_train": int(len(train_idx)),
+		"n_test": int(len(test_idx)),
 		"mae": mae,
 		"r2": r2,
+		"params": params,
+		"fit_s": fit_s,
+		"serving": cost,
+		**(extra_metrics or {}),
 	}
 
 	# persist
 	os.makedirs(cfg.paths.model_dir, exist_ok=True)
-	model_path = os.path.join(cfg.paths.model_dir, "rf_pipeline.joblib")
-	joblib.dump(pipeline, model_path)
+	model_path = cfg.paths.model_path
+	# write then rename so a serving process never loads a half-written artifact
+	tmp_path = model_path + ".tmp"
+	joblib.dump(pipeline, tmp_path)
+	if isinstance(pipeline.named_steps["model"], RandomForestRegressor):
+		# export the array-backed forest first so it is in place when the new pipeline appears
+		compiled = compile_pipeline(pipeline, source_sha256=file_hash(tmp_path))
+		save_compiled(compiled, cfg.paths.compiled_model_path)
+		logger.info(f"Saved compiled forest to {cfg.paths.compiled_model_path}")
+	elif os.path.exists(cfg.paths.compiled_model_path):
+		# an export of the previous forest would only be rejected as stale at load time
+		os.remove(cfg.paths.compiled_model_path)
+	os.replace(tmp_path, model_path)
 	save_json(metrics, cfg.paths.metrics_path)
 	logger.info(f"Saved model to {model_path}; metrics: MAE={mae:.2f}, R2={r2:.3f}")
 	return model_path, metrics
 
 
+def sweep_grid(cfg: ProjectConfig) -> List[Dict[str, Any]]:
+	t = cfg.training
+	return [
+		{"n_estimators": n, "max_depth": d, "min_samples_leaf": leaf}
+		for n, d, leaf in itertools.product(t.sweep_n_estimators, t.sweep_max_depth, t.sweep_min_samples_leaf)
+	]
+
+
+def evaluate_candidates(
+	cfg: ProjectConfig,
+	grid: List[Dict[str, Any]],
+	data: TrainingData,
+	train_idx: np.ndarray,
+	test_idx: np.ndarray,
+) -> List[Dict[str, Any]]:
+	"""Fit every parameter set and record accuracy next to its serving cost."""
+	results = []
+	y_test = data.y[test_idx]
+	probe = data.frame(test_idx[:_PROBE_ROWS])
+	with tempfile.TemporaryDirectory() as workdir:
+		for params in grid:
+			pipeline, fit_s = _fit_pipeline(cfg, data, train_idx, params)
+			preds = _predict_rows(cfg, pipeline, data, test_idx)
+			row = {
+				"params": params,
+				"mae": float(mean_absolute_error(y_test, preds)),
+				"r2": float(r2_score(y_test, preds)),
+				"fit_s": fit_s,
+				**serving_cost(pipeline, probe, workdir),
+			}
+			logger.info(
+				f"{params}: MAE={row['mae']:.0f} size={row['serving_bytes'] / 1e6:.1f}MB "
+				f"p50={row['single_row_p50_ms']:.2f}ms"
+			)
+			results.append(row)
+	return results
+
+
+def select_candidate(results: List[Dict[str, Any]], mae_tolerance: float) -> Dict[str, Any]:
+	"""Smallest serving artifact whose MAE is within ``mae_tolerance`` (relative) of the best MAE."""
+	best_mae = min(r["mae"] for r in results)
+	eligible = [r for r in results if r["mae"] <= best_mae * (1.0 + mae_tolerance)]
+	return min(eligible, key=lambda r: (r["serving_bytes"], r["single_row_p50_ms"], r["mae"]))
+
+
+def sweep_models() -> Tuple[str, Dict]:
+	"""Grid-search forest size on a training sample, then train the selected settings on all data.
+
+	The sweep table and the selection rule are stored under ``sweep`` in metrics.json.
+	"""
+	cfg = load_config()
+	if cfg.training.model_type != "RandomForestRegressor":
+		raise ValueError("--sweep searches RandomForestRegressor settings; set training.model_type accordingly")
+	data = load_training_data()
+	train_idx, test_idx = _split(cfg, data)
+	n = cfg.training.sweep_train_rows
+	if n and n < len(train_idx):
+		idx = np.random.default_rng(cfg.training.random_state).choice(len(train_idx), size=n, replace=False)
+		train_idx = train_idx[idx]
+	grid = sweep_grid(cfg)
+	logger.info(f"Sweeping {len(grid)} forest settings on {len(train_idx)} training rows")
+	results = evaluate_candidates(cfg, grid, data, train_idx, test_idx)
+	selected = select_candidate(results, cfg.training.sweep_mae_tolerance)
+	logger.info(f"Selected {selected['params']} (MAE={selected['mae']:.0f}, {selected['serving_bytes'] / 1e6:.1f}MB)")
+	sweep = {
+		"train_rows": int(len(train_idx)),
+		"mae_tolerance": cfg.training.sweep_mae_tolerance,
+		"best_mae": min(r["mae"] for r in results),
+		"selected": selected["params"],
+		"candidates": results,
+	}
+	return train_model(params=selected["params"], extra_metrics={"sweep": sweep})
+
+
+def compare_model_types(model_types: List[str]) -> List[Dict[str, Any]]:
+	"""Fit each model type with its configured settings on the same split; nothing is saved."""
+	cfg = load_config()
+	data = load_training_data()
+	train_idx, test_idx = _split(cfg, data)
+	y_test = data.y[test_idx]
+	probe = data.frame(test_idx[:_PROBE_ROWS])
+	out = []
+	with tempfile.TemporaryDirectory() as workdir:
+		for model_type in model_types:
+			mcfg = replace(cfg, training=replace(cfg.training, model_type=model_type))
+			params = _model_params(mcfg)
+			pipeline, fit_s = _fit_pipeline(mcfg, data, train_idx, params)
+			preds = _predict_rows(mcfg, pipeline, data, test_idx)
+			out.append({
+				"model_type": model_type,
+				"params": params,
+				"n_train": int(len(train_idx)),
+				"fit_s": fit_s,
+				"mae": float(mean_absolute_error(y_test, preds)),
+				"r2": float(r2_score(y_test, preds)),
+				**serving_cost(pipeline, probe, workdir),
+			})
+			logger.info(f"{model_type}: fit {fit_s:.1f}s, MAE={out[-1]['mae']:.0f}")
+	return out
+
+
 if __name__ == "__main__":
 	train_model()
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pytest
+import yaml
+
+from hdb.config import get_config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOWNS = ["ANG MO KIO", "BEDOK", "YISHUN"]
+CSV_HEADER = "month,town,flat_type,block,street_name,storey_range,floor_area_sqm,flat_model,lease_commence_date,resale_price\n"
+
+
+def write_transactions_csv(path, n=240, seed=0, years=(2015, 2016)):
+	"""Synthetic HDB resale export: three towns, 3/4 ROOM, monthly rows over ``years``."""
+	rng = np.random.default_rng(seed)
+	lines = [CSV_HEADER]
+	for i in range(n):
+		town = TOWNS[i % len(TOWNS)]
+		ft = "4 ROOM" if i % 2 else "3 ROOM"
+		year = years[i % len(years)]
+		lo = int(rng.choice([1, 4, 7, 10, 13]))
+		area = (95 if ft == "4 ROOM" else 67) + int(rng.integers(-5, 6))
+		price = 250_000 + area * 2_500 + lo * 3_000 + TOWNS.index(town) * 20_000 + int(rng.integers(-5_000, 5_000))
+		lines.append(
+			f"{year}-{i % 12 + 1:02d},{town},{ft},{i % 50},ST {i % 7},{lo:02d} TO {lo + 2:02d},"
+			f"{area},Improved,{1980 + i % 20},\"{price:,}\"\n"
+		)
+	with open(path, "w") as f:
+		f.write("".join(lines))
+
+
+def reset_singletons(monkeypatch):
+	"""Drop the process-wide registry, stats index, read pools and caches so they reopen from cwd."""
+	import hdb.db
+	import hdb.lake
+	import hdb.llm
+	import hdb.price_grid
+	import hdb.registry
+	import hdb.stats
+
+	get_config.cache_clear()
+	monkeypatch.setattr(hdb.db, "_pools", {})
+	for module, name in [
+		(hdb.registry, "_registry"),
+		(hdb.stats, "_index"),
+		(hdb.price_grid, "_store"),
+		(hdb.lake, "_catalog"),
+		(hdb.llm, "_explainer"),
+	]:
+		monkeypatch.setattr(module, name, None)
+
+
+@pytest.fixture
+def served_project(tmp_path, monkeypatch):
+	"""A small ETL'd database and trained forest under tmp_path, as cwd, with fresh singletons."""
+	import hdb.db
+	from hdb.etl import load_csvs_to_duckdb
+	from hdb.train import train_model
+
+	with open(os.path.join(ROOT, "config.yaml")) as f:
+		cfg = yaml.safe_load(f)
+	cfg["training"].update(n_estimators=10, max_depth=6)
+	cfg["serving"]["price_grid_enabled"] = False
+	with open(tmp_path / "config.yaml", "w") as f:
+		yaml.safe_dump(cfg, f)
+	write_transactions_csv(tmp_path / "resale.csv")
+	monkeypatch.chdir(tmp_path)
+	monkeypatch.setenv("OPENAI_API_KEY", "")
+	reset_singletons(monkeypatch)
+	load_csvs_to_duckdb()
+	train_model()
+	yield tmp_path
+	for pool in list(hdb.db._pools.values()):
+		pool.close()
+	get_config.cache_clear()
+
+
+@pytest.fixture
+def api_client(served_project, monkeypatch):
+	"""TestClient on the app, wired to the fixture project's model and stats."""
+	from fastapi.testclient import TestClient
+
+	import hdb.serve
+	from hdb.registry import get_registry
+	from hdb.response_cache import ResponseCache
+	from hdb.stats import get_stats_index
+
+	monkeypatch.setattr(hdb.serve, "_cfg", get_config())
+	monkeypatch.setattr(hdb.serve, "_registry", get_registry())
+	monkeypatch.setattr(hdb.serve, "_stats", get_stats_index())
+	monkeypatch.setattr(hdb.serve, "_responses", ResponseCache(64))
+	monkeypatch.setattr(hdb.serve, "_data_responses", ResponseCache(64))
+	return TestClient(hdb.serve.app)
@@ -0,0 +1,221 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from hdb.config import LLMConfig
+from hdb.llm import ExplanationCache, Explainer, _fallback_text
+
+
+class _FakeLLM:
+	"""Minimal OpenAI-compatible chat completions server on localhost."""
+
+	def __init__(self, delay_s: float = 0.0, fail: bool = False):
+		self.delay_s = delay_s
+		self.fail = fail
+		self.requests = 0
+		self.in_flight = 0
+		self.max_in_flight = 0
+		self._lock = threading.Lock()
+		fake = self
+
+		class Handler(BaseHTTPRequestHandler):
+			def log_message(self, *args):
+				pass
+
+			def do_POST(self):
+				body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+				with fake._lock:
+					fake.requests += 1
+					fake.in_flight += 1
+					fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+				time.sleep(fake.delay_s)
+				with fake._lock:
+					fake.in_flight -= 1
+				if fake.fail:
+					self.send_response(500)
+					self.end_headers()
+					return
+				town = body["messages"][1]["content"].splitlines()[0]
+				payload = json.dumps({
+					"id": "cmpl-test",
+					"object": "chat.completion",
+					"created": 0,
+					"model": body["model"],
+					"choices": [{
+						"index": 0,
+						"finish_reason": "stop",
+						"message": {"role": "assistant", "content": f"explained {town}"},
+					}],
+				}).encode()
+				self.send_response(200)
+				self.send_header("Content-Type", "application/json")
+				self.send_header("Content-Length", str(len(payload)))
+				self.end_headers()
+				self.wfile.write(payload)
+
+		self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+		self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+	def close(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+
+@pytest.fixture
+def fake_llm():
+	server = _FakeLLM(delay_s=0.2)
+	yield server
+	server.close()
+
+
+def _explainer(base_url, cache):
+	cfg = LLMConfig(
+		provider="openai", model="test-model", max_tokens=50, temperature=0.0,
+		base_url=base_url, timeout_s=5.0, max_concurrency=8, band_round=1000,
+	)
+	return Explainer(cfg, cache, api_key="test-key")
+
+
+BANDS = {"low": 300_100.0, "mid": 350_200.0, "high": 400_300.0}
+
+
+def test_explanations_fan_out_and_persist(fake_llm, tmp_path):
+	path = str(tmp_path / "llm_cache.sqlite")
+	items = [(f"TOWN {i}", "4 ROOM", BANDS) for i in range(8)]
+
+	exp = _explainer(fake_llm.base_url, ExplanationCache(path))
+	t0 = time.perf_counter()
+	texts = exp.explain_many(items)
+	elapsed = time.perf_counter() - t0
+	assert texts == [f"explained Town: TOWN {i}" for i in range(8)]
+	assert fake_llm.requests == 8
+	assert fake_llm.max_in_flight > 1 and elapsed < 8 * 0.2
+
+	# nearby bands round to the same prompt and hit the in-memory LRU
+	assert exp.explain("TOWN 0", "4 ROOM", {k: v + 150 for k, v in BANDS.items()}) == texts[0]
+	assert fake_llm.requests == 8
+
+	# a fresh process-equivalent reads the answers back from disk
+	exp2 = _explainer(fake_llm.base_url, ExplanationCache(path))
+	assert exp2.explain_many(items) == texts
+	assert fake_llm.requests == 8
+
+
+def test_cache_ttl_and_fallbacks(tmp_path):
+	cache = ExplanationCache(str(tmp_path / "c.sqlite"), max_entries=2, ttl_s=0.05)
+	cache.put("a", "x")
+	assert cache.get("a") == "x"
+	time.sleep(0.1)
+	assert cache.get("a") is None
+	assert cache.purge_expired() == 1
+
+	server = _FakeLLM(fail=True)
+	try:
+		exp = _explainer(server.base_url, cache)
+		exp.cfg.timeout_s = 1.0
+		assert exp.explain("BEDOK", "3 ROOM", BANDS) == _fallback_text("BEDOK", "3 ROOM", BANDS)
+	finally:
+		server.close()
+	# failures are never cached
+	assert cache.snapshot()["entries"] == 0
+
+
+def test_async_deadline_falls_back_and_late_answer_warms_cache(tmp_path):
+	import asyncio
+
+	server = _FakeLLM(delay_s=0.3)
+	try:
+		exp = _explainer(server.base_url, ExplanationCache(str(tmp_path / "c.sqlite")))
+		exp.cfg.max_concurrency = 2
+		items = [(f"TOWN {i}", "4 ROOM", BANDS) for i in range(4)]
+
+		async def run():
+			t0 = time.perf_counter()
+			first = await exp.explain_many_async(items, deadline_s=0.05)
+			elapsed = time.perf_counter() - t0
+			await asyncio.sleep(1.0)  # let the background requests land
+			return first, elapsed, await exp.explain_many_async(items, deadline_s=0.05)
+
+		first, elapsed, second = asyncio.run(run())
+	finally:
+		server.close()
+	assert elapsed < 0.25
+	assert first == [_fallback_text(t, ft, b) for t, ft, b in items]
+	assert second == [f"explained Town: TOWN {i}" for i in range(4)]
+	assert server.requests == 4 and server.max_in_flight <= 2
+
+
+def test_streamed_report_sends_towns_in_order_and_saves_atomically(served_project, tmp_path, monkeypatch):
+	import asyncio
+
+	import hdb.llm
+	from hdb.report import plan_report, stream_bto_report
+
+	server = _FakeLLM(delay_s=0.1)
+	try:
+		monkeypatch.setattr(hdb.llm, "_explainer", _explainer(server.base_url, None))
+		path = str(tmp_path / "reports" / "r.md")
+
+		async def run():
+			plan = await asyncio.to_thread(plan_report, towns=["BEDOK", "ANG MO KIO"], flat_types=["4 ROOM"])
+			return [chunk async for chunk in stream_bto_report(plan, output_path=path)]
+
+		chunks = asyncio.run(run())
+	finally:
+		server.close()
+	assert chunks[0].startswith("# BTO Recommendations")
+	assert chunks[1].startswith("## BEDOK") and chunks[2].startswith("## ANG MO KIO")
+	assert "explained Town: ANG MO KIO" in chunks[2]
+	with open(path, encoding="utf-8") as f:
+		assert f.read() == "".join(chunks)
+	assert os.listdir(tmp_path / "reports") == ["r.md"]
+
+	# planning errors get a status code instead of a truncated 200 stream
+	from fastapi.testclient import TestClient
+
+	import hdb.serve
+
+	def broken_plan(**kwargs):
+		raise ValueError("no stats for town")
+
+	monkeypatch.setattr(hdb.serve, "plan_report", broken_plan)
+	resp = TestClient(hdb.serve.app).get("/report_md/stream", params={"towns": "NOWHERE"})
+	assert resp.status_code == 500 and "no stats for town" in resp.json()["detail"]
+
+
+def test_predict_without_explanation_skips_llm_and_explain_fills_in(api_client, tmp_path, monkeypatch):
+	import hdb.llm
+
+	server = _FakeLLM()
+	try:
+		monkeypatch.setattr(hdb.llm, "_explainer", _explainer(server.base_url, ExplanationCache(str(tmp_path / "c.sqlite"))))
+		row = {"town": "BEDOK", "flat_type": "4 ROOM", "floor_area_sqm": 95, "storey_mid": 8}
+		resp = api_client.post("/predict?explain=false", json=row)
+		assert resp.status_code == 200 and resp.json()["explanation"] is None
+		assert server.requests == 0
+
+		bands = {k: resp.json()[f"bto_price_{k}"] for k in ("low", "mid", "high")}
+		body = {"town": "BEDOK", "flat_type": "4 ROOM", **{f"bto_price_{k}": v for k, v in bands.items()}}
+		assert api_client.post("/explain", json=body).json() == {"explanation": "explained Town: BEDOK"}
+		assert api_client.post("/explain", json=body).json() == {"explanation": "explained Town: BEDOK"}
+		assert server.requests == 1  # second call is served from the cache
+	finally:
+		server.close()
+
+	# an unreachable LLM gives the templated fallback, not an error
+	failing = _FakeLLM(fail=True)
+	try:
+		exp = _explainer(failing.base_url, None)
+		exp.cfg.timeout_s = 1.0
+		monkeypatch.setattr(hdb.llm, "_explainer", exp)
+		body["town"] = "YISHUN"
+		resp = api_client.post("/explain", json=body)
+		assert resp.status_code == 200
+		assert resp.json() == {"explanation": _fallback_text("YISHUN", "4 ROOM", bands)}
+	finally:
+		failing.close()
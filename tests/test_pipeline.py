@@ -13,3 +13,637 @@ def test_artifacts_exist():
 	with open(metrics_path, "r", encoding="utf-8") as f:
 		m = json.load(f)
 		assert "mae" in m and "r2" in m
+
+
+def test_micro_batcher_coalesces_concurrent_rows():
+	import asyncio
+
+	import numpy as np
+
+	from hdb.batching import MicroBatcher
+
+	calls = []
+
+	def fake_predict(df):
+		calls.append(len(df))
+		return np.asarray(df["x"], dtype=float) * 2
+
+	async def run():
+		batcher = MicroBatcher(fake_predict, max_batch_size=8, max_wait_ms=20)
+		return await asyncio.gather(*[batcher.submit({"x": i}) for i in range(20)]), batcher
+
+	results, batcher = asyncio.run(run())
+	assert results == [i * 2.0 for i in range(20)]
+	assert max(calls) <= 8 and sum(calls) == 20 and len(calls) < 20
+	assert batcher.stats.snapshot()["rows"] == 20
+
+
+def _synthetic_features(n=400, seed=0):
+	import numpy as np
+	import pandas as pd
+
+	rng = np.random.default_rng(seed)
+	df = pd.DataFrame({
+		"town": rng.choice(["ANG MO KIO", "BEDOK", "QUEENSTOWN"], n),
+		"flat_type": rng.choice(["3 ROOM", "4 ROOM"], n),
+		"flat_model": rng.choice(["Improved", "New Generation"], n),
+		"floor_area_sqm": rng.uniform(60, 110, n),
+		"lease_commence_date": rng.integers(1975, 2010, n),
+		"storey_mid": rng.choice([2.0, 5.0, 8.0, 11.0, 14.0], n),
+		"year": rng.integers(2012, 2017, n),
+		"month_num": rng.integers(1, 13, n),
+	})
+	y = df["floor_area_sqm"] * 4000 + df["storey_mid"] * 3000 + (df["town"] == "QUEENSTOWN") * 80000
+	return df, y.to_numpy()
+
+
+def test_compiled_forest_matches_sklearn(tmp_path):
+	import numpy as np
+	from sklearn.ensemble import RandomForestRegressor
+	from sklearn.pipeline import Pipeline
+
+	from hdb.compiled import compile_pipeline, load_compiled, save_compiled
+	from hdb.features import build_preprocessor
+
+	df, y = _synthetic_features()
+	pipe = Pipeline([
+		("preprocess", build_preprocessor(df)),
+		("model", RandomForestRegressor(n_estimators=10, max_depth=6, random_state=0)),
+	]).fit(df, y)
+	probe = df.head(50).copy()
+	probe.loc[0, "town"] = "UNSEEN TOWN"
+	np.testing.assert_allclose(compile_pipeline(pipe).predict(probe), pipe.predict(probe), rtol=1e-9)
+
+	# the saved export maps its node arrays read-only instead of copying them
+	path = save_compiled(compile_pipeline(pipe), str(tmp_path / "rf_compiled.joblib"))
+	mapped = load_compiled(path)
+	assert isinstance(mapped.arrays["threshold"], np.memmap)
+	np.testing.assert_allclose(mapped.predict(probe), pipe.predict(probe), rtol=1e-9)
+
+
+def test_forest_interval_comes_from_per_tree_predictions():
+	import numpy as np
+	from sklearn.ensemble import RandomForestRegressor
+	from sklearn.pipeline import Pipeline
+
+	from hdb.compiled import compile_pipeline, predict_interval
+	from hdb.features import build_preprocessor
+	from hdb.pricing import price_columns
+
+	df, y = _synthetic_features()
+	pipe = Pipeline([
+		("preprocess", build_preprocessor(df)),
+		("model", RandomForestRegressor(n_estimators=20, max_depth=6, random_state=0)),
+	]).fit(df, y)
+	probe = df.head(30)
+	compiled = compile_pipeline(pipe)
+	est = predict_interval(compiled, probe, (0.1, 0.9))
+	per_tree = compiled.leaf_values(compiled.transform(probe))
+	np.testing.assert_allclose(est[:, 0], pipe.predict(probe), rtol=1e-9)
+	np.testing.assert_allclose(est[:, 1:], np.quantile(per_tree, [0.1, 0.9], axis=1).T, rtol=1e-9)
+	np.testing.assert_allclose(predict_interval(pipe, probe, (0.1, 0.9)), est, rtol=1e-9)
+	assert (est[:, 1] <= est[:, 2]).all()
+
+	cols = price_columns(est[:, 0], 0.2, (est[:, 1], est[:, 2]))
+	np.testing.assert_allclose(cols["bto_price_low"], est[:, 1] * 0.8)
+	np.testing.assert_allclose(cols["predicted_resale_high"], est[:, 2])
+
+
+def test_band_analysis_pivots_pairs_by_reshape():
+	import numpy as np
+
+	from hdb.analysis import analyze_bands
+
+	class AreaModel:
+		def predict(self, df):
+			return df["floor_area_sqm"].to_numpy() * 1000 + df["storey_mid"].to_numpy()
+
+	pairs = [("BEDOK", "3 ROOM", 60.0), ("BEDOK", "4 ROOM", 90.0), ("YISHUN", "3 ROOM", 65.0)]
+	analysis = analyze_bands(AreaModel(), pairs, {"low": 5, "mid": 12, "high": 25}, 0.2)
+	assert analysis.bto.shape == (3, 3)
+	records = analysis.records()
+	assert [(r["town"], r["flat_type"]) for r in records] == [p[:2] for p in pairs]
+	assert records[1]["bto_prices"] == {"low": 90005 * 0.8, "mid": 90012 * 0.8, "high": 90025 * 0.8}
+	np.testing.assert_allclose(records[2]["income"]["mid"], 65012 * 0.8 / (5 * 12 * 0.3))
+	assert "bto_price_ranges" not in records[0]
+	# long table for the batch report's CSV/Parquet output: pair-major, band-minor
+	table = analysis.frame()
+	assert len(table) == 9 and table["band"].tolist()[:3] == ["low", "mid", "high"]
+	assert table.loc[4, "bto_price"] == records[1]["bto_prices"]["mid"] and table.loc[4, "storey_mid"] == 12
+
+
+def _scratch_project(tmp_path, monkeypatch, n_files=2):
+	import shutil
+
+	root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	shutil.copy(os.path.join(root, "config.yaml"), tmp_path / "config.yaml")
+	header = "month,town,flat_type,block,street_name,storey_range,floor_area_sqm,flat_model,lease_commence_date,resale_price\n"
+	for i in range(n_files):
+		rows = [
+			f"201{i}-0{m},BEDOK,{ft},1,ST,{lo:02d} TO {lo + 2:02d},{area},Improved,1985,\"{price:,}\"\n"
+			for m, ft, lo, area, price in [(1, "3 ROOM", 1, 65, 300000), (2, "4 ROOM", 7, 95, 420000), (3, "4 ROOM", 10, 90, 5000)]
+		]
+		(tmp_path / f"y{i}.csv").write_text(header + "".join(rows))
+	monkeypatch.chdir(tmp_path)
+	return tmp_path
+
+
+def test_incremental_etl_skips_unchanged_files(tmp_path, monkeypatch):
+	import duckdb
+
+	from hdb.etl import load_csvs_to_duckdb
+
+	_scratch_project(tmp_path, monkeypatch)
+	first = load_csvs_to_duckdb()
+	assert first["changed"] == 2 and first["rows"] == 6
+	assert load_csvs_to_duckdb()["changed"] == 0
+
+	with open(tmp_path / "y1.csv", "a") as f:
+		f.write("2011-04,BEDOK,3 ROOM,2,ST,04 TO 06,68,Improved,1990,\"310,000\"\n")
+	third = load_csvs_to_duckdb()
+	assert third == {"changed": 1, "removed": 0, "unchanged": 1, "rows": 4}
+
+	con = duckdb.connect("data/hdb.duckdb", read_only=True)
+	try:
+		counts = [con.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("transactions_raw", "transactions_clean", "features")]
+		version = con.execute("SELECT value FROM etl_meta WHERE key = 'data_version'").fetchone()[0]
+	finally:
+		con.close()
+	# the 5000 price row is dropped from features only
+	assert counts == [7, 7, 5]
+
+	# the Parquet lake follows the database, partitioned by year then town
+	from hdb.lake import LakeCatalog
+
+	catalog = LakeCatalog("data/lake")
+	assert catalog.current()["data_version"] == version
+	assert os.path.isdir(os.path.join("data/lake", catalog.current()["snapshot"], "features", "year=2011", "town=BEDOK"))
+	con = duckdb.connect()
+	lake_counts = [con.execute(f"SELECT COUNT(*) FROM {catalog.relation(t)}").fetchone()[0] for t in ("transactions_clean", "features")]
+	assert lake_counts == [7, 5]
+	assert con.execute(f"SELECT COUNT(*) FROM {catalog.relation('features')} WHERE year = 2010").fetchone()[0] == 2
+
+
+def test_incremental_etl_keys_files_by_path_not_name(tmp_path, monkeypatch):
+	import duckdb
+
+	from hdb.etl import load_csvs_to_duckdb
+
+	_scratch_project(tmp_path, monkeypatch)
+	paths = []
+	for i, sub in enumerate(("a", "b")):
+		os.makedirs(sub)
+		os.replace(f"y{i}.csv", os.path.join(sub, "resale.csv"))
+		paths.append(os.path.join(sub, "resale.csv"))
+	assert load_csvs_to_duckdb(paths)["rows"] == 6
+	assert load_csvs_to_duckdb(paths)["changed"] == 0
+
+	with open(paths[1], "a") as f:
+		f.write("2011-04,BEDOK,3 ROOM,2,ST,04 TO 06,68,Improved,1990,\"310,000\"\n")
+	assert load_csvs_to_duckdb(paths) == {"changed": 1, "removed": 0, "unchanged": 1, "rows": 4}
+	assert load_csvs_to_duckdb(paths[:1]) == {"changed": 0, "removed": 1, "unchanged": 1, "rows": 0}
+
+	con = duckdb.connect("data/hdb.duckdb", read_only=True)
+	try:
+		sources = con.execute("SELECT DISTINCT source_file FROM transactions_raw").fetchall()
+		count = con.execute("SELECT COUNT(*) FROM transactions_clean").fetchone()[0]
+	finally:
+		con.close()
+	# dropping b/resale.csv leaves a/resale.csv's rows in place
+	assert sources == [(os.path.realpath(paths[0]),)] and count == 3
+
+
+def test_read_pool_survives_file_swaps_while_borrowing(tmp_path):
+	import shutil
+	import threading
+	import time
+
+	import duckdb
+
+	from hdb.db import ReadPool
+
+	for name in ("a", "b"):
+		con = duckdb.connect(str(tmp_path / f"{name}.duckdb"))
+		con.execute("CREATE TABLE etl_meta AS SELECT 'data_version' AS key, ? AS value", [name])
+		con.close()
+	path = str(tmp_path / "live.duckdb")
+	shutil.copy(tmp_path / "a.duckdb", path)
+	pool = ReadPool(path, size=2, check_interval_s=0.0)
+	latest, errors, stop = [None], [], threading.Event()
+
+	def borrow():
+		try:
+			while not stop.is_set():
+				with pool.cursor() as cur:
+					latest[0] = cur.execute("SELECT value FROM etl_meta").fetchone()[0]
+		except Exception as e:  # pragma: no cover - surfaced by the assert below
+			errors.append(e)
+
+	threads = [threading.Thread(target=borrow, daemon=True) for _ in range(8)]
+	for t in threads:
+		t.start()
+	for i in range(20):
+		name = "ba"[i % 2]
+		shutil.copy(tmp_path / f"{name}.duckdb", path + ".tmp")
+		os.replace(path + ".tmp", path)
+		# every swap is picked up, not served from the replaced file
+		deadline = time.monotonic() + 10
+		while latest[0] != name and time.monotonic() < deadline and not errors:
+			time.sleep(0.001)
+		assert latest[0] == name
+	stop.set()
+	for t in threads:
+		t.join(timeout=10)
+	# a borrower that raced a swap used to wait forever on a closed generation's queue
+	assert not any(t.is_alive() for t in threads)
+	assert not errors
+	pool.close()
+
+
+def test_etl_swaps_instead_of_writing_under_an_in_process_read_pool(tmp_path, monkeypatch):
+	import duckdb
+
+	from hdb.db import ReadPool
+	from hdb.etl import _has_other_readers, load_csvs_to_duckdb
+
+	_scratch_project(tmp_path, monkeypatch)
+	load_csvs_to_duckdb()
+	path = "data/hdb.duckdb"
+	pool = ReadPool(path, size=1, check_interval_s=0.0)
+	before = pool.data_version()
+	assert _has_other_readers(path)
+	with open(tmp_path / "y1.csv", "a") as f:
+		f.write("2011-04,BEDOK,3 ROOM,2,ST,04 TO 06,68,Improved,1990,\"310,000\"\n")
+	assert load_csvs_to_duckdb()["rows"] == 4
+	assert pool.data_version() != before
+	with pool.cursor() as cur:
+		assert cur.execute("SELECT COUNT(*) FROM transactions_raw").fetchone()[0] == 7
+	pool.close()
+	assert not _has_other_readers(path)
+	duckdb.connect(path).close()
+
+
+def test_storey_mid_sql_matches_python_parser():
+	import math
+
+	import duckdb
+
+	from hdb.etl import parse_storey_midpoint, storey_mid_sql
+
+	cases = ["07 TO 09", " 10 to 12 ", "5", "10-12", "1-2-3", "-5", "", "abc", "1.5 TO 3", "+4 TO 6", "10 TO", None]
+	con = duckdb.connect()
+	for value in cases:
+		got = con.execute(f"SELECT {storey_mid_sql('x')} FROM (SELECT ?::VARCHAR AS x)", [value]).fetchone()[0]
+		expected = parse_storey_midpoint(value)
+		assert (got is None and math.isnan(expected)) or got == expected, value
+
+
+def test_response_cache_lru_and_generation_invalidation():
+	from hdb.response_cache import ResponseCache, normalize_params
+
+	cache = ResponseCache(max_entries=2)
+	gen = ("sha-a", "data-1")
+	k1 = normalize_params({"towns": [" BEDOK "], "limit": 5})
+	assert k1 == normalize_params({"limit": 5.0, "towns": ["BEDOK"]})
+	assert cache.get(gen, k1) is None
+	cache.put(gen, k1, {"r": 1})
+	cache.put(gen, "k2", {"r": 2})
+	assert cache.get(gen, k1) == {"r": 1}
+	cache.put(gen, "k3", {"r": 3})  # evicts k2, the least recently used
+	assert cache.get(gen, "k2") is None and cache.get(gen, "k3") == {"r": 3}
+	# a retrain (new sha) empties the cache
+	assert cache.get(("sha-b", "data-1"), k1) is None
+	snap = cache.snapshot()
+	assert (snap["hits"], snap["misses"], snap["invalidations"], snap["entries"]) == (2, 3, 1, 0)
+
+
+def test_price_grid_answers_grid_points_and_falls_back(tmp_path):
+	import numpy as np
+
+	from hdb.price_grid import build_price_grid, grid_frame, load_price_grid, predict_with_grid, save_price_grid, storey_grid
+
+	class StepModel:
+		"""Piecewise-constant in storey, like a forest: interpolating between grid points is wrong."""
+
+		calls = 0
+
+		def predict(self, df):
+			StepModel.calls += len(df)
+			return 1000.0 * np.floor(df["storey_mid"].to_numpy() / 3) + df["floor_area_sqm"].to_numpy()
+
+	model = StepModel()
+	pairs = [("BEDOK", "3 ROOM", 65.0), ("BEDOK", "4 ROOM", 92.5)]
+	grid = build_price_grid(model, pairs, storey_grid(1, 40, 1), model_sha256="abc")
+	path = str(tmp_path / "price_grid.json")
+	save_price_grid(grid, path)
+	save_price_grid(grid, path)  # a rebuild replaces the matrix file
+	assert len(list(tmp_path.glob("price_grid-*.npy"))) == 1
+	grid = load_price_grid(path)
+	assert isinstance(grid.prices, np.memmap)
+
+	df = grid_frame(pairs, np.array([5.0, 12.5, 39.0]))
+	df.loc[5, "floor_area_sqm"] = 100.0  # off-grid area -> model
+	StepModel.calls = 0
+	preds = predict_with_grid(model, df, grid)
+	np.testing.assert_allclose(preds, model.predict(df), rtol=1e-6)
+	# storey 12.5 (both pairs) and the off-grid area go to the model, then the reference call
+	assert StepModel.calls == 3 + len(df)
+	assert np.isnan(grid.predict(df)).tolist() == [False, True, False, False, True, True]
+
+
+def test_compact_design_matches_dataframe_preprocessor():
+	import numpy as np
+
+	from hdb.features import TrainingData, build_preprocessor, onehot_design, ordinal_design
+
+	df, y = _synthetic_features()
+	data = TrainingData.from_frame(df, y)
+	idx = np.arange(300)
+	X, pre = onehot_design(data, idx)
+	reference = build_preprocessor(df).fit(df.iloc[idx])
+	assert X.dtype == np.float32 and X.format == "csc"
+	assert np.allclose(X.toarray(), reference.transform(df.iloc[idx]), atol=1e-6)
+	# held-out rows are scaled with the training statistics, and decoding round-trips
+	X_test, _ = onehot_design(data, np.arange(300, 400), pre)
+	assert np.allclose(X_test.toarray(), reference.transform(df.iloc[300:]), atol=1e-6)
+	assert np.allclose(pre.transform(data.frame(np.arange(300, 400))), X_test.toarray(), atol=1e-6)
+	X_ord, pre_ord = ordinal_design(data, idx)
+	assert X_ord.shape == (300, 8) and np.allclose(pre_ord.transform(df.head(300)), X_ord)
+
+
+def test_sweep_records_serving_cost_and_picks_smallest_within_tolerance():
+	import numpy as np
+
+	from hdb.features import TrainingData
+	from hdb.train import evaluate_candidates, select_candidate
+
+	cfg = load_config()
+	df, y = _synthetic_features(n=600)
+	grid = [
+		{"n_estimators": 5, "max_depth": 4, "min_samples_leaf": 5},
+		{"n_estimators": 20, "max_depth": None, "min_samples_leaf": 1},
+	]
+	data = TrainingData.from_frame(df, y)
+	results = evaluate_candidates(cfg, grid, data, np.arange(500), np.arange(500, 600))
+	for r in results:
+		assert r["predictor"] == "compiled_forest"
+		assert r["serving_bytes"] > 0 and r["single_row_p50_ms"] > 0 and r["batch_rows_per_s"] > 0
+	small, big = results
+	assert small["serving_bytes"] < big["serving_bytes"]
+	assert select_candidate(results, mae_tolerance=100.0) is small
+	assert select_candidate(results, mae_tolerance=0.0)["mae"] == min(small["mae"], big["mae"])
+
+
+def test_hist_gradient_boosting_backend_uses_native_categoricals(tmp_path, monkeypatch):
+	from dataclasses import replace
+
+	import duckdb
+	import joblib
+	import numpy as np
+
+	from hdb.features import load_training_data
+	from hdb.train import _fit_pipeline, _model_params, _predict_rows
+
+	_scratch_project(tmp_path, monkeypatch, n_files=0)
+	df, y = _synthetic_features(n=600)
+	os.makedirs("data")
+	con = duckdb.connect("data/hdb.duckdb")
+	con.register("synthetic", df.assign(resale_price=y))
+	con.execute("CREATE TABLE features AS SELECT * FROM synthetic")
+	con.close()
+
+	cfg = load_config()
+	cfg = replace(cfg, training=replace(cfg.training, model_type="HistGradientBoostingRegressor", hgb_max_iter=50))
+	# the training path: Arrow-encoded codes from DuckDB, fitted without a DataFrame
+	data = load_training_data()
+	idx = np.arange(len(data))
+	pipe, _ = _fit_pipeline(cfg, data, idx, _model_params(cfg))
+	joblib.dump(pipe, "pipe.joblib")
+	saved = joblib.load("pipe.joblib")
+	# one column per feature: categoricals are integer codes, not one-hot blocks
+	assert saved.named_steps["preprocess"].transform(df.head()).shape == (5, 8)
+	assert saved.named_steps["model"].is_categorical_.tolist() == [True] * 3 + [False] * 5
+	# serving scores DataFrame rows exactly as the code matrix was scored in training
+	np.testing.assert_allclose(saved.predict(df), _predict_rows(cfg, pipe, data, idx), rtol=1e-9)
+	probe = df.head(3).copy()
+	probe.loc[0, "town"] = "UNSEEN TOWN"
+	assert np.isfinite(saved.predict(probe)).all()
+	assert np.mean(np.abs(saved.predict(df) - y)) < 0.05 * np.mean(y)
+
+
+def test_interval_422_only_for_models_without_trees(api_client, monkeypatch):
+	import hdb.serve
+
+	class NoTrees:
+		def predict(self, df):
+			raise TypeError("bug in the model path")
+
+	monkeypatch.setattr(hdb.serve, "_load_pipeline", lambda: NoTrees())
+	row = {"town": "BEDOK", "flat_type": "4 ROOM", "floor_area_sqm": 95, "storey_mid": 8}
+	resp = api_client.post("/predict?explain=false&interval=true", json=row)
+	assert resp.status_code == 422 and "NoTrees" in resp.json()["detail"]
+	body = {"towns": ["BEDOK"], "flat_types": ["4 ROOM"], "interval": True}
+	assert api_client.post("/bto_analysis?explain=false", json=body).status_code == 422
+	# without interval, a TypeError is a server bug, not a client error
+	body["interval"] = False
+	resp = api_client.post("/bto_analysis?explain=false", json=body)
+	assert resp.status_code == 500 and "bug in the model path" in resp.json()["detail"]
+
+
+def test_predict_batch_formats_ids_and_chunking(api_client, monkeypatch):
+	import io
+
+	import numpy as np
+	import pyarrow as pa
+	import pyarrow.ipc  # noqa: F401
+
+	import hdb.serve
+
+	monkeypatch.setattr(hdb.serve._cfg.serving, "predict_batch_chunk_rows", 2)
+	rows = [
+		{"id": f"r{i}", "town": town, "flat_type": ft, "floor_area_sqm": area, "storey_mid": storey}
+		for i, (town, ft, area, storey) in enumerate(
+			[("BEDOK", "4 ROOM", 95, 8), ("YISHUN", "3 ROOM", 67, 2), ("ANG MO KIO", "4 ROOM", 92, 14), ("BEDOK", "3 ROOM", 65, 5), ("YISHUN", "4 ROOM", 98, 11)]
+		)
+	]
+	expected = [
+		api_client.post("/predict?explain=false", json={k: v for k, v in r.items() if k != "id"}).json()["predicted_resale_price"]
+		for r in rows
+	]
+
+	def ndjson(resp):
+		assert resp.status_code == 200 and resp.headers["content-type"].startswith(hdb.serve.NDJSON)
+		return [json.loads(line) for line in resp.text.splitlines()]
+
+	for out in (
+		ndjson(api_client.post("/predict_batch", json={"rows": rows})),
+		ndjson(api_client.post("/predict_batch", json=rows)),
+		ndjson(api_client.post(
+			"/predict_batch",
+			content="".join(json.dumps(r) + "\n" for r in rows),
+			headers={"Content-Type": hdb.serve.NDJSON},
+		)),
+	):
+		assert [o["id"] for o in out] == [r["id"] for r in rows]
+		assert list(out[0]) == ["id"] + hdb.serve.BATCH_OUTPUT_COLUMNS
+		np.testing.assert_allclose([o["predicted_resale_price"] for o in out], expected, rtol=1e-6)
+
+	# Arrow IPC in, Arrow out, chosen by query or Accept header; one record batch per chunk
+	sink = io.BytesIO()
+	table = pa.Table.from_pylist(rows)
+	with pa.ipc.new_stream(sink, table.schema) as writer:
+		writer.write_table(table)
+	for url, accept in (("/predict_batch?format=arrow", None), ("/predict_batch", hdb.serve.ARROW_STREAM)):
+		headers = {"Content-Type": hdb.serve.ARROW_STREAM}
+		if accept:
+			headers["Accept"] = accept
+		resp = api_client.post(url, content=sink.getvalue(), headers=headers)
+		assert resp.status_code == 200 and resp.headers["content-type"] == hdb.serve.ARROW_STREAM
+		batches = list(pa.ipc.open_stream(resp.content))
+		assert [b.num_rows for b in batches] == [2, 2, 1]
+		out = pa.Table.from_batches(batches)
+		assert out.column("id").to_pylist() == [r["id"] for r in rows]
+		np.testing.assert_allclose(out.column("predicted_resale_price").to_numpy(), expected, rtol=1e-6)
+
+	for body in ({"rows": []}, []):
+		assert api_client.post("/predict_batch", json=body).status_code == 422
+	assert api_client.post("/predict_batch", content=b"", headers={"Content-Type": hdb.serve.NDJSON}).status_code == 422
+
+
+def test_etl_engines_and_workers_build_identical_tables(tmp_path, monkeypatch):
+	import duckdb
+	import pandas as pd
+	import yaml
+
+	from conftest import ROOT, write_transactions_csv
+	from hdb.config import get_config
+	from hdb.etl import load_csvs_to_duckdb
+
+	with open(os.path.join(ROOT, "config.yaml")) as f:
+		cfg = yaml.safe_load(f)
+	cfg["etl"]["lake_enabled"] = False
+	with open(tmp_path / "config.yaml", "w") as f:
+		yaml.safe_dump(cfg, f)
+	monkeypatch.chdir(tmp_path)
+	get_config.cache_clear()
+	for seed, years in enumerate([(2015, 2016), (2017,)]):
+		write_transactions_csv(tmp_path / f"part{seed}.csv", n=120, seed=seed, years=years)
+	with open(tmp_path / "part1.csv", "a") as f:
+		# a blank area and a bad storey range go through each engine's cleaning
+		f.write("2017-05,BEDOK,4 ROOM,9,ST 1,07 TO 09,,Improved,1990,\"410,000\"\n")
+		f.write("2017-06,YISHUN,3 ROOM,9,ST 1,?? TO 03,67,Improved,1990,\"300,000\"\n")
+
+	tables = {}
+	# workers=2 runs the spawn pool: worker functions live in hdb.etl, nothing is pickled from __main__
+	for engine, workers in [("duckdb", 1), ("pandas", 1), ("streaming", 1), ("duckdb", 2), ("pandas", 2)]:
+		path = f"{engine}-{workers}.duckdb"
+		stats = load_csvs_to_duckdb(engine=engine, duckdb_path=path, workers=workers, chunk_rows=50)
+		assert stats["changed"] == 2 and stats["rows"] == 242
+		con = duckdb.connect(path, read_only=True)
+		try:
+			tables[engine, workers] = {
+				t: con.execute(f"SELECT * FROM {t} ORDER BY rowid").df()
+				for t in ("transactions_raw", "transactions_clean", "features")
+			}
+		finally:
+			con.close()
+	reference = tables["duckdb", 1]
+	for key, got in tables.items():
+		for t, df in got.items():
+			pd.testing.assert_frame_equal(df, reference[t], obj=f"{t} ({key[0]}, workers={key[1]})")
+	get_config.cache_clear()
+
+
+def test_stats_index_follows_data_version_and_recommend_window_ends_at_latest_month(served_project, monkeypatch):
+	import pandas as pd
+
+	from conftest import write_transactions_csv
+	from hdb.db import data_version, get_read_pool
+	from hdb.etl import load_csvs_to_duckdb
+	from hdb.stats import get_stats_index, recommend_towns
+
+	# see the swapped-in file at once rather than after db_check_interval_s
+	monkeypatch.setattr(get_read_pool(), "check_interval_s", 0.0)
+	index = get_stats_index()
+	before = index.get("BEDOK", "4 ROOM")["n"]
+	first = index.version
+	assert first == data_version() and not index.refresh()
+
+	write_transactions_csv(served_project / "late.csv", n=30, seed=1, years=(2020,))
+	load_csvs_to_duckdb()
+	late = pd.read_csv(served_project / "late.csv")
+	assert data_version() != first
+	assert index.get("BEDOK", "4 ROOM")["n"] == before + len(late[(late.town == "BEDOK") & (late.flat_type == "4 ROOM")])
+	assert index.version == data_version() != first
+
+	# a one-month window is 2020-12, the newest month on file, not the current date
+	last = late[(late.month == "2020-12") & (late.flat_type == "4 ROOM")].groupby("town").size()
+	assert not last.empty
+	assert recommend_towns(5, ["4 ROOM"], window_months=1) == sorted(last.items(), key=lambda kv: (kv[1], kv[0]))
+	year = late[late.flat_type == "4 ROOM"].groupby("town").size()
+	assert recommend_towns(5, ["4 ROOM"], window_months=12) == sorted(year.items(), key=lambda kv: (kv[1], kv[0]))
+
+
+def test_registry_hot_swaps_new_artifact_after_check_interval_and_on_reload(api_client):
+	import shutil
+
+	import joblib
+
+	import hdb.serve
+	from hdb.monitoring import file_hash
+
+	registry, path = hdb.serve._registry, hdb.serve._cfg.paths.model_path
+	row = {"town": "BEDOK", "flat_type": "4 ROOM", "floor_area_sqm": 95, "storey_mid": 8}
+
+	def predicted():
+		return api_client.post("/predict?explain=false", json=row).json()["predicted_resale_price"]
+
+	first, before = registry.version(), predicted()
+	assert first == file_hash(path)
+	shutil.copy(path, "original.joblib")
+
+	# a different forest (half the trees), written the way training does: temp file, then rename
+	pipe = joblib.load(path)
+	forest = pipe.named_steps["model"]
+	forest.estimators_, forest.n_estimators = forest.estimators_[:5], 5
+	joblib.dump(pipe, path + ".tmp")
+	os.replace(path + ".tmp", path)
+	assert registry.version() == first  # not re-checked inside check_interval_s
+
+	registry._last_check -= registry.check_interval_s + 1
+	second = registry.version()
+	assert second == file_hash(path) != first
+	assert predicted() != before
+	assert registry.info()["predictor"] == "sklearn_pipeline"  # the compiled export is for the old pipeline
+
+	# /admin/model/reload picks up a new artifact without waiting for the interval
+	os.replace("original.joblib", path)
+	assert registry.version() == second
+	resp = api_client.post("/admin/model/reload").json()
+	assert resp["swapped"] and resp["sha256"] == first == registry.version()
+	assert resp["predictor"] == "compiled_forest"
+	assert predicted() == before
+	assert api_client.post("/admin/model/reload").json()["swapped"] is False
+
+
+def test_recommend_cache_survives_retrain_and_follows_data_version(api_client, served_project, monkeypatch):
+	import hdb.serve
+	from conftest import write_transactions_csv
+	from hdb.db import get_read_pool
+	from hdb.etl import load_csvs_to_duckdb
+
+	class NoModel:
+		def version(self):
+			raise AssertionError("/recommend must not look at the model")
+
+	monkeypatch.setattr(get_read_pool(), "check_interval_s", 0.0)
+	params = {"limit": 3, "flat_types": ["4 ROOM"], "window_months": 1}
+	first = api_client.get("/recommend", params=params).json()
+	monkeypatch.setattr(hdb.serve, "_registry", NoModel())
+	assert api_client.get("/recommend", params=params).json() == first
+	assert hdb.serve._data_responses.snapshot()["hits"] == 1
+
+	write_transactions_csv(served_project / "late.csv", n=30, seed=1, years=(2020,))
+	load_csvs_to_duckdb()
+	assert api_client.get("/recommend", params=params).json() != first
+	assert hdb.serve._data_responses.snapshot()["invalidations"] == 1